@@ -24,6 +24,27 @@ from .stateful import Txn
 from .stateful import Watcher
 from .stateful import Lease
 from .stateful import Lock
+from .stateful import CallbackExecutor
+from .stateful import Overflow
+from .stateful import WatchReactor
+from .stateful import ProcessDispatcher
+from .stateful import ReplayBuffer
+from .stateful import KVCache
+from .stateful import Informer
+from .stateful import Replica
+from .stateful import LeaseKeeper
+from .stateful import LeasePool
+from .stateful import Session
+from .stateful import Mutex
+from .stateful import RWLock
+from .stateful import Semaphore
+from .stateful import Election
+from .stateful import AioLease
+from .stateful import AioLeaseKeeper
+from .stateful import AioSession
+from .stateful import AioLock
+from .stateful import AioRWLock
+from .stateful import AioElection
 
 from .stateful.watch import EventType
 
@@ -32,6 +53,27 @@ __all__.extend([
     'Watcher',
     'Lease',
     'Lock',
+    'CallbackExecutor',
+    'Overflow',
+    'WatchReactor',
+    'ProcessDispatcher',
+    'ReplayBuffer',
+    'KVCache',
+    'Informer',
+    'Replica',
+    'LeaseKeeper',
+    'LeasePool',
+    'Session',
+    'Mutex',
+    'RWLock',
+    'Semaphore',
+    'Election',
+    'AioLease',
+    'AioLeaseKeeper',
+    'AioSession',
+    'AioLock',
+    'AioRWLock',
+    'AioElection',
     'EventType'
 ])
 
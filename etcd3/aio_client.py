@@ -10,12 +10,19 @@ import aiohttp
 import six
 from aiohttp.client import _RequestContextManager
 
+from .apis.kv import ChildScan
 from .baseclient import BaseClient
 from .baseclient import BaseModelizedStreamResponse
 from .baseclient import DEFAULT_VERSION
 from .errors import Etcd3Exception
 from .errors import Etcd3StreamError
 from .errors import get_client_error
+from .stateful.aio_election import AioElection
+from .stateful.aio_lease import AioLease
+from .stateful.aio_lease import AioLeaseKeeper
+from .stateful.aio_lease import AioSession
+from .stateful.aio_lock import AioLock
+from .stateful.aio_lock import AioRWLock
 from .utils import iter_json_string, Etcd3Warning, cached_property
 
 
@@ -139,6 +146,31 @@ class ResponseIter(object):
     __anext__ = next
 
 
+class ChildIter(object):
+    """
+    async iterator of the children of a prefix
+
+    :param client: AioClient
+    :param scan: ChildScan
+    """
+
+    def __init__(self, client, scan):
+        self.client = client
+        self.scan = scan
+        self.ready = []
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self.ready:
+            req = self.scan.request()
+            if req is None:
+                raise StopAsyncIteration
+            self.ready.extend(self.scan.feed(await self.client.range(**req)))
+        return self.ready.pop(0)
+
+
 class AioClient(BaseClient):
     def __init__(self, host='127.0.0.1', port=2379, protocol='http',
                  cert=(), verify=None,
@@ -184,6 +216,7 @@ class AioClient(BaseClient):
         """
         close all connections in connection pool
         """
+        await self.close_sessions(revoke=False)
         await self.session.close()
 
     async def __aenter__(self):
@@ -271,6 +304,115 @@ class AioClient(BaseClient):
                 resp.close()
         return self._modelizeResponse(method, resp)
 
+    def ls(self, prefix, delimiter='/'):
+        """
+        List the immediate children of a prefix and the number of keys under each
+
+        >>> async for child, count in client.ls('/a/'):
+        ...     print(child, count)
+
+        :type prefix: str or bytes
+        :param prefix: the key prefix, usually ends with the delimiter
+        :type delimiter: str or bytes
+        :param delimiter: the delimiter of the path [default: '/']
+        :return: async iterator of (child, count), see KVAPI.ls
+        """
+        return ChildIter(self, ChildScan(prefix, delimiter))
+
+    def Lease(self, ttl, ID=0, new=True):
+        """
+        Initialize an AioLease, whose keepalive runs as an asyncio task
+
+        :type ID: int
+        :param ID: ID is the requested ID for the lease. If ID is set to 0, the lessor chooses an ID.
+        :type new: bool
+        :param new: whether grant a new lease or maintain a exist lease by its id [default: True]
+        """
+        return AioLease(self, ttl=ttl, ID=ID, new=new)
+
+    def Lock(self, lock_name, lock_ttl=60, session=None, lock_prefix='_mutex', timeout=None):
+        """
+        Initialize an AioLock, a fair lock whose waiters wait without threads
+
+        :type lock_name: str
+        :param lock_name: the name of the lock
+        :type lock_ttl: int
+        :param lock_ttl: the TTL of the shared session of the client, ignored if session is given [default: 60]
+        :type session: AioSession
+        :param session: the session to attach the key to, None means the shared session of the client
+            with the lock_ttl [default: None]
+        :type lock_prefix: str
+        :param lock_prefix: the prefix of the lock keys [default: '_mutex']
+        :type timeout: float
+        :param timeout: the timeout of acquiring the lock by `async with` [default: None]
+        :return: AioLock
+        """
+        return AioLock(self, lock_name, ttl=lock_ttl, session=session, lock_prefix=lock_prefix, timeout=timeout)
+
+    def RWLock(self, name, ttl=60, session=None, lock_prefix='_rwlock', timeout=None):
+        """
+        Initialize an AioRWLock, a read-write lock whose readers hold the lock concurrently
+
+        :return: AioRWLock, see BaseClient.RWLock for the params
+        """
+        return AioRWLock(self, name, ttl=ttl, session=session, lock_prefix=lock_prefix, timeout=timeout)
+
+    def Election(self, name, ttl=60, session=None):
+        """
+        Initialize an AioElection, a leader election on the election service of etcd server
+
+        :return: AioElection, see BaseClient.Election for the params
+        """
+        return AioElection(self, name, ttl=ttl, session=session)
+
+    def Session(self, ttl=60, keeper=None):
+        """
+        Initialize an AioSession, a lease granted on the first use and kept alive by its keepalive task
+        or an AioLeaseKeeper
+
+        :type ttl: int
+        :param ttl: the TTL of the lease [default: 60]
+        :type keeper: AioLeaseKeeper
+        :param keeper: keep the lease alive by this keeper, None means a keepalive task of the lease
+            [default: None]
+        :return: AioSession
+        """
+        return AioSession(self, ttl=ttl, keeper=keeper)
+
+    def shared_session(self, ttl=60):
+        """
+        Get the AioSession of the TTL shared by the AioLocks of the client, see BaseClient.shared_session
+
+        :type ttl: int
+        :param ttl: the TTL of the lease [default: 60]
+        :return: AioSession
+        """
+        session = self._sessions.get(ttl)
+        if session is None or session.closed:
+            session = self._sessions[ttl] = AioSession(self, ttl=ttl)
+        return session
+
+    async def close_sessions(self, revoke=True):
+        """
+        Close the shared sessions
+
+        :type revoke: bool
+        :param revoke: revoke the leases of the sessions, which releases the locks [default: True]
+        """
+        sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            await session.close(revoke=revoke)
+
+    def LeaseKeeper(self, fraction=1 / 3.0, jitter=0.1, batch_window=0.05, max_batch=500, on_expire=None,
+                    retry_interval=0.5):
+        """
+        Initialize an AioLeaseKeeper, which keeps many leases alive from one asyncio task
+
+        :return: AioLeaseKeeper, see BaseClient.LeaseKeeper for the params
+        """
+        return AioLeaseKeeper(self, fraction=fraction, jitter=jitter, batch_window=batch_window, max_batch=max_batch,
+                              on_expire=on_expire, retry_interval=retry_interval)
+
     async def auth(self, username=None, password=None):
         """
         call auth.authenticate and save the token
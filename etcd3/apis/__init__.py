@@ -2,6 +2,7 @@
 from .auth import AuthAPI
 from .base import BaseAPI
 from .cluster import ClusterAPI
+from .election import ElectionAPI
 from .extra import ExtraAPI
 from .kv import KVAPI
 from .lease import LeaseAPI
@@ -18,5 +19,6 @@ __all__ = [
     'MaintenanceAPI',
     'LeaseAPI',
     'BaseAPI',
-    'LockAPI'
+    'LockAPI',
+    'ElectionAPI'
 ]
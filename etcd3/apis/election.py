@@ -0,0 +1,89 @@
+from .base import BaseAPI
+
+
+class ElectionAPI(BaseAPI):
+    def campaign(self, name, lease=0, value=None, **kwargs):
+        """
+        Campaign waits to acquire leadership in an election, returning a LeaderKey
+        representing the leadership if successful. The LeaderKey can then be used
+        to issue new values on the election, transactionally guard API requests on
+        leadership still being held, and resign from the election.
+
+        :type name: str or bytes
+        :param name: name is the election's identifier for the campaign.
+        :type lease: int
+        :param lease: lease is the ID of the lease attached to leadership of the election. If the
+            lease expires or is revoked before resigning leadership, then the
+            leadership is transferred to the next campaigner, if any.
+        :type value: str or bytes
+        :param value: value is the initial proclaimed value set when the campaigner wins the
+            election.
+        :param kwargs: additional params to pass to the http request, like timeout
+        """
+        method = '/election/campaign'
+        data = {
+            "name": name,
+            "lease": lease,
+            "value": value
+        }
+        return self.call_rpc(method, data=data, **kwargs)
+
+    def proclaim(self, leader, value):
+        """
+        Proclaim updates the leader's posted value with a new value.
+
+        :type leader: dict
+        :param leader: leader is the leadership hold on the election,
+            the LeaderKey of name, key, rev and lease returned by campaign.
+        :type value: str or bytes
+        :param value: value is an update meant to overwrite the leader's current value.
+        """
+        method = '/election/proclaim'
+        data = {
+            "leader": leader,
+            "value": value
+        }
+        return self.call_rpc(method, data=data)
+
+    def leader(self, name):
+        """
+        Leader returns the current election proclamation, if any.
+
+        :type name: str or bytes
+        :param name: name is the election identifier for the leadership information.
+        """
+        method = '/election/leader'
+        data = {
+            "name": name
+        }
+        return self.call_rpc(method, data=data)
+
+    def observe(self, name, **kwargs):
+        """
+        Observe streams election proclamations in-order as made by the election's
+        elected leaders.
+
+        :type name: str or bytes
+        :param name: name is the election identifier for the leadership information.
+        :param kwargs: additional params to pass to the http request, like timeout
+        """
+        method = '/election/observe'
+        data = {
+            "name": name
+        }
+        return self.call_rpc(method, data=data, stream=True, **kwargs)
+
+    def resign(self, leader):
+        """
+        Resign releases election leadership so other campaigners may acquire
+        leadership on the election.
+
+        :type leader: dict
+        :param leader: leader is the leadership to relinquish by resignation,
+            the LeaderKey of name, key, rev and lease returned by campaign.
+        """
+        method = '/election/resign'
+        data = {
+            "leader": leader
+        }
+        return self.call_rpc(method, data=data)
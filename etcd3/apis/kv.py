@@ -1,10 +1,85 @@
 from .base import BaseAPI
 from ..models import RangeRequestSortOrder
 from ..models import RangeRequestSortTarget
+from ..utils import bytes_types
 from ..utils import check_param
 from ..utils import incr_last_byte
 
 
+def _to_bytes(s):
+    return s if isinstance(s, bytes_types) else s.encode('utf-8')
+
+
+def _prefix_end(prefix):
+    """
+    the range_end of a prefix, None if no key is after the prefix
+    """
+    prefix = prefix.rstrip(b'\xff')
+    return incr_last_byte(prefix) if prefix else None
+
+
+class ChildScan(object):
+    """
+    Skip-scan over the immediate children of a prefix
+
+    Every probe is a keys_only range with limit=1, the first key found names a child (a leaf key, or a
+    "directory" ends with the delimiter), then the range start jumps past the subtree of the child.
+    The count of a probe is the number of keys from its start to the end of the prefix, so the count
+    of a child is the difference between two probes. All probes read the revision of the first one.
+
+    The scan only builds the requests and consumes the responses, so the sync and async clients
+    can drive it the same way.
+    """
+
+    def __init__(self, prefix, delimiter='/'):
+        self.prefix = _to_bytes(prefix)
+        self.delimiter = _to_bytes(delimiter)
+        if self.prefix:
+            self.start, self.end = self.prefix, _prefix_end(self.prefix) or b'\0'
+        else:
+            self.start = self.end = b'\0'
+        self.revision = None
+        self._pending = None  # (child, count from its start)
+
+    def request(self):
+        """
+        :return: the kwargs of the next range probe, None if the scan is done
+        """
+        if self.start is None:
+            return
+        return dict(key=self.start, range_end=self.end, keys_only=True, limit=1, revision=self.revision)
+
+    def feed(self, r):
+        """
+        Consume the response of the last probe
+
+        :return: list of (child, count), the children are done by the probe
+        """
+        count = int(r.count or 0)
+        if self.revision is None:
+            self.revision = r.header.revision
+        done = []
+        if self._pending is not None:
+            child, before = self._pending
+            done.append((child, before - count))
+            self._pending = None
+        if not r.kvs:
+            self.start = None
+            return done
+        key = r.kvs[0].key
+        i = key.find(self.delimiter, len(self.prefix))
+        if i == -1:
+            child, self.start = key, key + b'\0'
+        else:
+            child = key[:i + len(self.delimiter)]
+            self.start = _prefix_end(child)
+        if self.start is None:  # nothing can be after the child
+            done.append((child, count))
+        else:
+            self._pending = (child, count)
+        return done
+
+
 class KVAPI(BaseAPI):
     def compact(self, revision, physical=False):
         """
@@ -24,6 +99,9 @@ class KVAPI(BaseAPI):
             "revision": revision,
             "physical": physical
         }
+        history_cache = getattr(self, 'history_cache', None)
+        if history_cache is not None:
+            history_cache.compacted(revision)
         return self.call_rpc(method, data=data)
 
     @check_param(at_least_one_of=['key', 'all'], at_most_one_of=['range_end', 'prefix', 'all'])
@@ -228,6 +306,27 @@ class KVAPI(BaseAPI):
         }
         return self.call_rpc(method, data=data)
 
+    def ls(self, prefix, delimiter='/'):
+        """
+        List the immediate children of a prefix and the number of keys under each,
+        by skip-scanning instead of transferring every key of the prefix
+
+        >>> list(client.ls('/a/'))
+        [(b'/a/b/', 2), (b'/a/c', 1)]
+
+        :type prefix: str or bytes
+        :param prefix: the key prefix, usually ends with the delimiter
+        :type delimiter: str or bytes
+        :param delimiter: the delimiter of the path [default: '/']
+        :return: generator of (child, count) in key order, a child ends with the delimiter
+            is a "directory" of count keys, otherwise it's a key (count 1)
+        """
+        scan = ChildScan(prefix, delimiter)
+        req = scan.request()
+        while req is not None:
+            for child in scan.feed(self.range(**req)):
+                yield child
+            req = scan.request()
 
     # Convenience functions that mostly wrap range() to make it a bit more user-friendly
 
@@ -33,7 +33,7 @@ class WatchAPI(BaseAPI):
 
     @check_param(at_least_one_of=['key', 'all'], at_most_one_of=['range_end', 'prefix', 'all'])
     def watch_create(self, key=None, range_end=None, start_revision=None, progress_notify=None, prev_kv=None,
-                     prefix=False, all=False, no_put=False, no_delete=False, **kwargs):
+                     prefix=False, all=False, no_put=False, no_delete=False, create_request_obj=False, **kwargs):
         """
         WatchCreate creates a watch stream on given key or key_range
 
@@ -63,6 +63,8 @@ class WatchAPI(BaseAPI):
         :param no_put: filter out the put events at server side before it sends back to the watcher. [default: False]
         :type no_delete: bool
         :param no_delete: filter out the delete events at server side before it sends back to the watcher. [default: False]
+        :type create_request_obj: bool
+        :param create_request_obj: return dict of the create_request instead of call the api
         """
         if all:
             key = range_end = '\0'
@@ -82,6 +84,8 @@ class WatchAPI(BaseAPI):
             "prev_kv": prev_kv
         }
         data = {k: v for k, v in data.items() if v is not None}
+        if create_request_obj:
+            return data
         return self.watch(create_request=data, **kwargs)
 
     def watch_cancel(self, watch_id, **kwargs):  # pragma: no cover
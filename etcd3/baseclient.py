@@ -3,6 +3,7 @@ synchronous client
 """
 
 import abc
+import threading
 import warnings
 
 import semantic_version as sem
@@ -10,6 +11,7 @@ from six.moves import urllib_parse
 
 from .apis import AuthAPI
 from .apis import ClusterAPI
+from .apis import ElectionAPI
 from .apis import ExtraAPI
 from .apis import KVAPI
 from .apis import LeaseAPI
@@ -17,10 +19,30 @@ from .apis import LockAPI
 from .apis import MaintenanceAPI
 from .apis import WatchAPI
 from .errors import UnsupportedServerVersion
+from .stateful import Election
+from .stateful import Informer
+from .stateful import KVCache
 from .stateful import Lease
+from .stateful import LeaseKeeper
+from .stateful import LeasePool
 from .stateful import Lock
+from .stateful import Mutex
+from .stateful import ReplayBuffer
+from .stateful import Replica
+from .stateful import RWLock
+from .stateful import Semaphore
+from .stateful import Session
 from .stateful import Txn
 from .stateful import Watcher
+from .stateful import WatchReactor
+from .stateful.changes import DEFAULT_IDLE_TIMEOUT
+from .stateful.changes import iter_changes
+from .stateful.diff import iter_diff
+from .stateful.history import HistoryCache
+from .stateful.history import RevisionView
+from .stateful.snapshot import DEFAULT_MAX_WORKERS
+from .stateful.snapshot import DEFAULT_PAGE_SIZE
+from .stateful.snapshot import snapshot_read
 from .swagger_helper import SwaggerSpec
 from .swaggerdefs import get_spec
 from .utils import Etcd3Warning
@@ -49,7 +71,7 @@ DEFAULT_VERSION = '3.3.0'
 
 
 class BaseClient(AuthAPI, ClusterAPI, KVAPI, LeaseAPI, MaintenanceAPI,
-                 WatchAPI, ExtraAPI, LockAPI):
+                 WatchAPI, ExtraAPI, LockAPI, ElectionAPI):
     def __init__(self, host='127.0.0.1', port=2379, protocol='http',
                  cert=(), verify=None,
                  timeout=None, headers=None, user_agent=None, pool_size=30,
@@ -75,6 +97,10 @@ class BaseClient(AuthAPI, ClusterAPI, KVAPI, LeaseAPI, MaintenanceAPI,
         self.cluster_version = cluster_version
         self.api_spec = None
         self.api_prefix = '/v3alpha'
+        self.history_cache = HistoryCache()
+        self._sessions = {}  # ttl -> the Session shared by the locks
+        self._sessions_keeper = None
+        self._sessions_lock = threading.Lock()
         self._retrieve_version()
         self._verify_version()
         self._get_prefix()
@@ -241,7 +267,8 @@ class BaseClient(AuthAPI, ClusterAPI, KVAPI, LeaseAPI, MaintenanceAPI,
         return Lease(self, ttl=ttl, ID=ID, new=new)
 
     def Watcher(self, key=None, range_end=None, max_retries=-1, start_revision=None, progress_notify=None,
-                prev_kv=None, prefix=None, all=None, no_put=False, no_delete=False):
+                prev_kv=None, prefix=None, all=None, no_put=False, no_delete=False, executor=None,
+                coalesce_ms=None, pushdown=False, probe_interval=None):
         """
         Initialize a Watcher
 
@@ -273,12 +300,350 @@ class BaseClient(AuthAPI, ClusterAPI, KVAPI, LeaseAPI, MaintenanceAPI,
         :param no_put: filter out the put events at server side before it sends back to the watcher. [default: False]
         :type no_delete: bool
         :param no_delete: filter out the delete events at server side before it sends back to the watcher. [default: False]
+        :type executor: CallbackExecutor
+        :param executor: run the callbacks in the thread pool of the executor instead of the stream-reading thread
+        :type coalesce_ms: int
+        :param coalesce_ms: if set, events are buffered for a window of this milliseconds
+            and only the newest event of each key in the window is delivered to the callbacks
+        :type pushdown: bool
+        :param pushdown: narrow the watch request by the filters of the callbacks
+        :type probe_interval: float
+        :param probe_interval: seconds between the head revision probes that measure the delivery lag
         :return: Watcher
         """
         return Watcher(client=self, key=key, range_end=range_end, max_retries=max_retries,
                        start_revision=start_revision,
                        progress_notify=progress_notify, prev_kv=prev_kv, prefix=prefix, all=all, no_put=no_put,
-                       no_delete=no_delete)
+                       no_delete=no_delete, executor=executor, coalesce_ms=coalesce_ms,
+                       pushdown=pushdown, probe_interval=probe_interval)
 
-    def Lock(self, lock_name, lock_ttl=Lock.DEFAULT_LOCK_TTL, reentrant=None, lock_prefix='_locks'):
-        return Lock(self, lock_name=lock_name, lock_ttl=lock_ttl, reentrant=reentrant, lock_prefix=lock_prefix)
+    def WatchReactor(self, executor=None):
+        """
+        Initialize a WatchReactor, which runs many watchers on one thread
+
+        :type executor: CallbackExecutor
+        :param executor: run the callbacks of the watchers that have no executor in its thread pool
+        :return: WatchReactor
+        """
+        return WatchReactor(self, executor=executor)
+
+    def ReplayBuffer(self, key=None, range_end=None, prefix=None, all=None, maxlen=10000, max_retries=-1):
+        """
+        Initialize a ReplayBuffer, which keeps the recent events of a range for new subscribers
+
+        :type key: str or bytes
+        :param key: the key or the start of the range to buffer
+        :type range_end: str or bytes
+        :param range_end: the end of the range [key, range_end) to buffer
+        :type prefix: bool
+        :param prefix: if the key is a prefix [default: False]
+        :type all: bool
+        :param all: all the keys [default: False]
+        :type maxlen: int
+        :param maxlen: max events kept in the buffer [default: 10000]
+        :type max_retries: int
+        :param max_retries: max retries of the feeding watch, -1 means no limit [default: -1]
+        :return: ReplayBuffer
+        """
+        return ReplayBuffer(self, key=key, range_end=range_end, prefix=prefix, all=all, maxlen=maxlen,
+                            max_retries=max_retries)
+
+    def KVCache(self, key=None, range_end=None, prefix=None, all=None, maxsize=10000, negative=True,
+                serializable=False, max_retries=-1):
+        """
+        Initialize a KVCache, which caches the reads of single keys and prefixes in a range, kept coherent by a watch
+
+        :type key: str or bytes
+        :param key: the key or the start of the range to cache
+        :type range_end: str or bytes
+        :param range_end: the end of the range [key, range_end) to cache
+        :type prefix: bool
+        :param prefix: if the key is a prefix [default: False]
+        :type all: bool
+        :param all: all the keys [default: False]
+        :type maxsize: int
+        :param maxsize: max entries (single keys and prefixes) kept in the cache [default: 10000]
+        :type negative: bool
+        :param negative: cache the keys that do not exist [default: True]
+        :type serializable: bool
+        :param serializable: fill the cache by serializable reads [default: False]
+        :type max_retries: int
+        :param max_retries: max retries of the feeding watch, -1 means no limit [default: -1]
+        :return: KVCache
+        """
+        return KVCache(self, key=key, range_end=range_end, prefix=prefix, all=all, maxsize=maxsize, negative=negative,
+                       serializable=serializable, max_retries=max_retries)
+
+    def Informer(self, prefix, decode=None, indexers=None, max_retries=-1):
+        """
+        Initialize an Informer, which lists and watches a prefix into a local store with secondary indexes
+
+        :type prefix: str or bytes
+        :param prefix: the key prefix
+        :type decode: callable
+        :param decode: decode the value (bytes) to the object kept in the store [default: keep the bytes]
+        :type indexers: dict
+        :param indexers: {index name: callable(key, obj)} returns the index value (or a list of them) of the object
+        :type max_retries: int
+        :param max_retries: max retries of the watch, and of the re-lists in a row when the watch is canceled
+            for a reason other than compaction, -1 means no limit [default: -1]
+        :return: Informer
+        """
+        return Informer(self, prefix, decode=decode, indexers=indexers, max_retries=max_retries)
+
+    def Replica(self, prefix, path, decode=None, indexers=None, max_retries=-1):
+        """
+        Initialize a Replica, an Informer persists its store to a sqlite file and resumes from it after restart
+
+        :type prefix: str or bytes
+        :param prefix: the key prefix
+        :type path: str
+        :param path: the path of the sqlite file
+        :type decode: callable
+        :param decode: decode the value (bytes) to the object kept in the store [default: keep the bytes]
+        :type indexers: dict
+        :param indexers: {index name: callable(key, obj)} returns the index value (or a list of them) of the object
+        :type max_retries: int
+        :param max_retries: max retries of the watch, and of the re-lists in a row when the watch is canceled
+            for a reason other than compaction, -1 means no limit [default: -1]
+        :return: Replica
+        """
+        return Replica(self, prefix, path, decode=decode, indexers=indexers, max_retries=max_retries)
+
+    def changes(self, prefix, from_revision, to_revision=None, idle_timeout=DEFAULT_IDLE_TIMEOUT, timeout=None):
+        """
+        Replay the changes under a prefix between two revisions (both inclusive)
+
+        >>> try:
+        ...     for batch in client.changes('/jobs/', last_revision + 1):
+        ...         handle(batch)
+        ... except Etcd3WatchCompacted as e:
+        ...     full_resync()  # or continue from e.compact_revision
+
+        :type prefix: str or bytes
+        :param prefix: the key prefix
+        :type from_revision: int
+        :param from_revision: the revision to replay from
+        :type to_revision: int
+        :param to_revision: the revision to replay to, None means the head revision read at call time
+        :type idle_timeout: float
+        :param idle_timeout: seconds without any response of the prefix stream to replay the rest
+            by a watch of all the keys [default: 1]
+        :type timeout: float
+        :param timeout: seconds without any response of the watch of all the keys to give up,
+            None means no limit [default: None]
+        :return: generator of EventBatch
+        :raises Etcd3WatchCompacted: if from_revision has been compacted
+        :raises OnceTimeout: if the watch of all the keys is idle for timeout seconds before to_revision
+        """
+        return iter_changes(self, prefix, from_revision, to_revision=to_revision, idle_timeout=idle_timeout,
+                            timeout=timeout)
+
+    def at(self, revision):
+        """
+        Get a read-only view of the key-value store at a revision, its range results are memoized
+        in client.history_cache until the revision is compacted
+
+        >>> view = client.at(1234)
+        >>> view.range('/config/', prefix=True)  # read from the server
+        >>> view.range('/config/', prefix=True)  # from the cache
+
+        :type revision: int
+        :param revision: the revision to read at
+        :return: RevisionView
+        """
+        return RevisionView(self, revision, self.history_cache)
+
+    def diff(self, prefix, rev_a, rev_b=None, values=False, page_size=DEFAULT_PAGE_SIZE):
+        """
+        Diff the keys under a prefix between two revisions, without reading the unchanged values
+
+        >>> for change in client.diff('/config/', last_synced_revision):
+        ...     print(change.type, change.key)
+
+        :type prefix: str or bytes
+        :param prefix: the key prefix
+        :type rev_a: int
+        :param rev_a: the older revision
+        :type rev_b: int
+        :param rev_b: the newer revision, None means the current revision
+        :type values: bool
+        :param values: read the values of the created and modified keys [default: False]
+        :type page_size: int
+        :param page_size: keys per range request [default: 1000]
+        :return: generator of Change (created, modified or deleted) in key order
+        :raises ErrCompacted: if rev_a has been compacted
+        """
+        return iter_diff(self, prefix, rev_a, rev_b=rev_b, values=values, page_size=page_size)
+
+    def snapshot_read(self, ranges, page_size=DEFAULT_PAGE_SIZE, max_workers=DEFAULT_MAX_WORKERS, max_retries=3):
+        """
+        Read several ranges as one consistent view at the same revision
+
+        >>> snap = client.snapshot_read(['/config/', '/routes/', {'key': '/leader'}])
+        >>> config, routes, leader = snap
+        >>> snap.revision
+
+        :type ranges: list
+        :param ranges: a key prefix (str or bytes), or the kwargs of range (dict) of each range
+        :type page_size: int
+        :param page_size: read a range in pages of page_size keys, 0 means no paging [default: 1000]
+        :type max_workers: int
+        :param max_workers: max concurrent range requests [default: 8]
+        :type max_retries: int
+        :param max_retries: max retries if the revision is compacted during the read [default: 3]
+        :return: Snapshot, the key-values of each range and the revision
+        """
+        return snapshot_read(self, ranges, page_size=page_size, max_workers=max_workers, max_retries=max_retries)
+
+    def LeasePool(self, buckets=(5, 10, 30, 60, 300), keeper=None, on_lost=None):
+        """
+        Initialize a LeasePool, which attaches the keys to shared leases by TTL buckets
+
+        :type buckets: list
+        :param buckets: the TTLs of the shared leases [default: (5, 10, 30, 60, 300)]
+        :type keeper: LeaseKeeper
+        :param keeper: keep the leases alive by this keeper, None means a keeper of the pool [default: None]
+        :type on_lost: callable
+        :param on_lost: called with the set of the keys whose lease is found expired [default: None]
+        :return: LeasePool
+        """
+        return LeasePool(self, buckets=buckets, keeper=keeper, on_lost=on_lost)
+
+    def LeaseKeeper(self, fraction=1 / 3.0, jitter=0.1, batch_window=0.05, max_batch=500, on_expire=None,
+                    retry_interval=0.5):
+        """
+        Initialize a LeaseKeeper, which keeps many leases alive from one thread
+
+        :type fraction: float
+        :param fraction: refresh a lease after this fraction of its TTL [default: 1/3]
+        :type jitter: float
+        :param jitter: refresh up to this fraction of the interval earlier, at random [default: 0.1]
+        :type batch_window: float
+        :param batch_window: the leases due within these seconds are refreshed in the same batch [default: 0.05]
+        :type max_batch: int
+        :param max_batch: max leases refreshed by one request [default: 500]
+        :type on_expire: callable
+        :param on_expire: called with the lease ID when a lease is found expired [default: None]
+        :type retry_interval: float
+        :param retry_interval: seconds to retry the leases of a failed batch [default: 0.5]
+        :return: LeaseKeeper
+        """
+        return LeaseKeeper(self, fraction=fraction, jitter=jitter, batch_window=batch_window, max_batch=max_batch,
+                           on_expire=on_expire, retry_interval=retry_interval)
+
+    def Lock(self, lock_name, lock_ttl=Lock.DEFAULT_LOCK_TTL, reentrant=None, lock_prefix='_locks', session=None):
+        return Lock(self, lock_name=lock_name, lock_ttl=lock_ttl, reentrant=reentrant, lock_prefix=lock_prefix,
+                    session=session)
+
+    def Mutex(self, name, ttl=60, session=None, lock_prefix='_mutex'):
+        """
+        Initialize a Mutex, a fair lock whose waiters are queued by the create revision of their keys
+
+        :type name: str
+        :param name: the name of the lock
+        :type ttl: int
+        :param ttl: the TTL of the shared session of the client, ignored if session is given [default: 60]
+        :type session: Session
+        :param session: the session to attach the key to, None means the shared session of the client
+            with the ttl [default: None]
+        :type lock_prefix: str
+        :param lock_prefix: the prefix of the lock keys [default: '_mutex']
+        :return: Mutex
+        """
+        return Mutex(self, name, ttl=ttl, session=session, lock_prefix=lock_prefix)
+
+    def RWLock(self, name, ttl=60, session=None, lock_prefix='_rwlock'):
+        """
+        Initialize a RWLock, a read-write lock whose readers hold the lock concurrently
+
+        :type name: str
+        :param name: the name of the lock
+        :type ttl: int
+        :param ttl: the TTL of the shared session of the client, ignored if session is given [default: 60]
+        :type session: Session
+        :param session: the session to attach the keys to, None means the shared session of the client
+            with the ttl [default: None]
+        :type lock_prefix: str
+        :param lock_prefix: the prefix of the lock keys [default: '_rwlock']
+        :return: RWLock
+        """
+        return RWLock(self, name, ttl=ttl, session=session, lock_prefix=lock_prefix)
+
+    def Semaphore(self, name, limit, ttl=60, session=None, lock_prefix='_semaphore'):
+        """
+        Initialize a Semaphore, a fair counting semaphore held by at most limit waiters at the same time
+
+        :type name: str
+        :param name: the name of the semaphore
+        :type limit: int
+        :param limit: the max number of the holders at the same time
+        :type ttl: int
+        :param ttl: the TTL of the shared session of the client, ignored if session is given [default: 60]
+        :type session: Session
+        :param session: the session to attach the key to, None means the shared session of the client
+            with the ttl [default: None]
+        :type lock_prefix: str
+        :param lock_prefix: the prefix of the semaphore keys [default: '_semaphore']
+        :return: Semaphore
+        """
+        return Semaphore(self, name, limit, ttl=ttl, session=session, lock_prefix=lock_prefix)
+
+    def Election(self, name, ttl=60, session=None):
+        """
+        Initialize an Election, a leader election on the election service of etcd server
+
+        :type name: str
+        :param name: the name of the election
+        :type ttl: int
+        :param ttl: the TTL of the session of the election, ignored if session is given [default: 60]
+        :type session: Session
+        :param session: the session to attach the candidate key to, not shared with the other candidates
+            of the election, None means a session of the election with the ttl [default: None]
+        :return: Election
+        """
+        return Election(self, name, ttl=ttl, session=session)
+
+    def Session(self, ttl=60, keeper=None):
+        """
+        Initialize a Session, a lease granted on the first use and kept alive by a LeaseKeeper
+
+        :type ttl: int
+        :param ttl: the TTL of the lease [default: 60]
+        :type keeper: LeaseKeeper
+        :param keeper: keep the lease alive by this keeper, None means a keeper of the session [default: None]
+        :return: Session
+        """
+        return Session(self, ttl=ttl, keeper=keeper)
+
+    def shared_session(self, ttl=60):
+        """
+        Get the Session of the TTL shared by the locks of the client,
+        the shared sessions are kept alive by one LeaseKeeper
+
+        :type ttl: int
+        :param ttl: the TTL of the lease [default: 60]
+        :return: Session
+        """
+        with self._sessions_lock:
+            session = self._sessions.get(ttl)
+            if session is None or session.closed:
+                if self._sessions_keeper is None:
+                    self._sessions_keeper = self.LeaseKeeper()
+                session = self._sessions[ttl] = Session(self, ttl=ttl, keeper=self._sessions_keeper)
+            return session
+
+    def close_sessions(self, revoke=True):
+        """
+        Close the shared sessions and stop their keeper
+
+        :type revoke: bool
+        :param revoke: revoke the leases of the sessions, which releases the locks [default: True]
+        """
+        with self._sessions_lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+            keeper, self._sessions_keeper = self._sessions_keeper, None
+        for session in sessions:
+            session.close(revoke=revoke)
+        if keeper is not None:
+            keeper.stop()
@@ -29,6 +29,7 @@ class ModelizedStreamResponse(BaseModelizedStreamResponse):
         self.method = method
         self.resp = resp
         self.decode = decode
+        self.received_bytes = 0
 
     @property
     def raw(self):
@@ -49,10 +50,14 @@ class ModelizedStreamResponse(BaseModelizedStreamResponse):
     # def __del__(self):
     #     self.close()
 
-    def __iter__(self):
+    def iter_data(self):
+        """
+        yield the json decoded dict of every object of the stream, without modelizing it
+        """
         for data in iter_response(self.resp):
             if not data:
                 continue
+            self.received_bytes += len(data)
             if six.PY3:
                 data = six.text_type(data, encoding='utf-8')
             data = json.loads(data)
@@ -60,6 +65,10 @@ class ModelizedStreamResponse(BaseModelizedStreamResponse):
                 # {"error":{"grpc_code":14,"http_code":503,"message":"rpc error: code = Unavailable desc = transport is closing","http_status":"Service Unavailable"}}
                 err = data.get('error')
                 raise get_client_error(err.get('message'), code=err.get('code'), status=err.get('http_code'))
+            yield data
+
+    def __iter__(self):
+        for data in self.iter_data():
             r = self.client._modelizeResponseData(self.method, data, decode=self.decode)
             if r.result:
                 r = r.result
@@ -129,6 +138,7 @@ class Client(BaseClient):
         """
         close all connections in connection pool
         """
+        self.close_sessions(revoke=False)
         return self._session.close()
 
     def _modelizeStreamResponse(self, method, resp, decode=True):
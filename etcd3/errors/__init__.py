@@ -1,8 +1,11 @@
 # flake8: noqa
 from .errors import Etcd3StreamError
 from .errors import Etcd3WatchCanceled
+from .errors import Etcd3WatchCompacted
 from .errors import UnsupportedServerVersion
 from .errors import get_client_error
+from .go_etcd_concurrency_error import ErrElectionNoLeader
+from .go_etcd_concurrency_error import ErrElectionNotLeader
 from .go_etcd_rpctypes_error import ErrAuthFailed
 from .go_etcd_rpctypes_error import ErrAuthNotEnabled
 from .go_etcd_rpctypes_error import ErrCompacted
@@ -93,3 +96,8 @@ __all__ += [
     'ErrUnhealthy',
     'ErrCorrupt'
 ]
+
+__all__ += [
+    'ErrElectionNotLeader',
+    'ErrElectionNoLeader'
+]
@@ -16,6 +16,17 @@ class Etcd3WatchCanceled(Etcd3Exception):  # pragma: no cover
         self.resp = resp
 
 
+class Etcd3WatchCompacted(Etcd3WatchCanceled):  # pragma: no cover
+    """
+    The watch is canceled because the start revision has been compacted,
+    the events since compact_revision are still available
+    """
+
+    def __init__(self, error, resp, compact_revision):
+        super(Etcd3WatchCompacted, self).__init__(error, resp)
+        self.compact_revision = compact_revision
+
+
 def get_client_error(error, code, status, response=None):
     if six.PY3 and not isinstance(error, six.string_types):
         error = six.text_type(error, encoding='utf-8')
@@ -0,0 +1,18 @@
+"""
+from github.com/coreos/etcd/clientv3/concurrency/election.go
+returned as is by the v3election server
+"""
+
+from .go_etcd_rpctypes_error import Error, error_desc, errStringToClientError
+from .go_grpc_codes import GRPCCode
+
+ErrGRPCElectionNotLeader = GRPCCode.Unknown, "election: not leader"
+ErrGRPCElectionNoLeader = GRPCCode.Unknown, "election: no leader"
+
+ErrElectionNotLeader = Error(ErrGRPCElectionNotLeader, 'ErrElectionNotLeader')
+ErrElectionNoLeader = Error(ErrGRPCElectionNoLeader, 'ErrElectionNoLeader')
+
+errStringToClientError.update({
+    error_desc(ErrGRPCElectionNotLeader): ErrElectionNotLeader,
+    error_desc(ErrGRPCElectionNoLeader): ErrElectionNoLeader,
+})
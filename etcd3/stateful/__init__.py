@@ -1,7 +1,35 @@
 # flake8: noqa
+import six
+
+from .cache import KVCache
+from .election import Election
+from .executor import CallbackExecutor
+from .executor import Overflow
+from .fanout import ProcessDispatcher
+from .informer import Informer
+from .keeper import LeaseKeeper
 from .lease import Lease
+from .leasepool import LeasePool
 from .lock import Lock
+from .mutex import Mutex
+from .reactor import WatchReactor
+from .replay import ReplayBuffer
+from .replica import Replica
+from .rwlock import RWLock
+from .semaphore import Semaphore
+from .session import Session
 from .transaction import Txn
 from .watch import Watcher
 
-__all__ = ['Txn', 'Lease', 'Watcher', 'Lock']
+__all__ = ['Txn', 'Lease', 'Watcher', 'Lock', 'CallbackExecutor', 'Overflow', 'WatchReactor', 'ProcessDispatcher', 'ReplayBuffer', 'KVCache', 'Informer', 'Replica', 'LeaseKeeper', 'LeasePool', 'Session', 'Mutex', 'RWLock', 'Semaphore', 'Election']
+
+AioLease = AioLeaseKeeper = AioSession = AioLock = AioRWLock = AioElection = None
+if six.PY3:  # pragma: no cover
+    from .aio_election import AioElection
+    from .aio_lease import AioLease
+    from .aio_lease import AioLeaseKeeper
+    from .aio_lease import AioSession
+    from .aio_lock import AioLock
+    from .aio_lock import AioRWLock
+
+__all__.extend(['AioLease', 'AioLeaseKeeper', 'AioSession', 'AioLock', 'AioRWLock', 'AioElection'])
@@ -0,0 +1,215 @@
+"""
+Async leader election recipe on the v3election API (python 3 only)
+"""
+import asyncio
+import json
+
+from .election import leader_key
+from .lock import EtcdLockAcquireTimeout
+from .lock import EtcdLockError
+from ..errors import ErrElectionNoLeader
+from ..errors import ErrElectionNotLeader
+from ..errors import ErrLeaseNotFound
+from ..errors import get_client_error
+from ..utils import JSONFramer
+from ..utils import log
+
+
+class AioObserver(object):
+    """
+    Async iterator of the KeyValue of the leader, reading the observe stream of an election
+
+    >>> async with election.observe() as observer:
+    ...     async for kv in observer:
+    ...         print(kv.value)
+    """
+
+    method = '/election/observe'
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.resp = None
+        self._chunks = None
+        self._framer = JSONFramer()
+        self._frames = []
+
+    async def _open(self):
+        self.resp = await self.client.call_rpc(self.method, {'name': self.name}, raw=True, timeout=None)
+        await self.client._raise_for_status(self.resp)
+        self._chunks = self.resp.content.iter_any().__aiter__()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.resp is None:
+            await self._open()
+        while not self._frames:
+            try:
+                chunk = await self._chunks.__anext__()
+            except StopAsyncIteration:
+                self.close()
+                raise
+            self._frames.extend(self._framer.feed(chunk))
+        data = json.loads(self._frames.pop(0).decode('utf-8'))
+        if data.get('error'):
+            err = data.get('error')
+            raise get_client_error(err.get('message'), code=err.get('code'), status=err.get('http_code'))
+        r = self.client._modelizeResponseData(self.method, data)
+        if r.result:
+            r = r.result
+        return r.kv
+
+    def close(self):
+        """
+        close the stream
+        """
+        if self.resp is not None:
+            self.resp.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class AioElection(object):
+    """
+    Leader election of the async client, works like Election
+
+    Without a given session, every AioElection grants a lease of its own, which is revoked by close.
+
+    Usage:
+
+    >>> election = aio_client.Election('scheduler')
+    >>> await election.campaign('node1', timeout=10)
+    >>> await election.proclaim('node1:8080')
+    >>> await election.resign()
+    >>> await election.close()
+    """
+
+    DEFAULT_TTL = 60
+
+    def __init__(self, client, name, ttl=DEFAULT_TTL, session=None):
+        """
+        :type client: AioClient
+        :param client: async client instance of etcd3
+        :type name: str
+        :param name: the name of the election
+        :type ttl: int
+        :param ttl: the TTL of the session of the election, ignored if session is given [default: 60]
+        :type session: AioSession
+        :param session: the session to attach the candidate key to, not shared with the other candidates
+            of the election, None means a session of the election with the ttl [default: None]
+        """
+        self.client = client
+        self.name = name
+        self.ttl = ttl
+        self.session = session
+        self.leader_key = None  # dict of the LeaderKey once elected
+        self._own_session = None
+
+    def _get_session(self):
+        if self.session is not None:
+            return self.session
+        if self._own_session is None or self._own_session.closed:
+            self._own_session = self.client.Session(self.ttl)
+        return self._own_session
+
+    async def _withdraw(self, ID):
+        await self.client.delete_range("%s/%x" % (self.name, ID))
+
+    async def campaign(self, value, timeout=None):
+        """
+        Put the candidate key and wait until it's elected
+
+        If the waiting is canceled or timed out, the candidate key is deleted.
+
+        :type value: str or bytes
+        :param value: the value proclaimed when elected
+        :type timeout: float
+        :param timeout: the time to wait before giving up the campaign [default: None]
+        :return: self
+        :raises EtcdLockAcquireTimeout: if timeout is reached
+        """
+        if self.leader_key is not None:
+            raise EtcdLockError("already elected")
+        session = self._get_session()
+        ID = await session.lease_id()
+        try:
+            r = await asyncio.wait_for(self.client.campaign(self.name, lease=ID, value=value, timeout=None), timeout)
+        except ErrLeaseNotFound:  # expired before the keepalive task noticed
+            await session.lost(ID)
+            return await self.campaign(value, timeout=timeout)
+        except asyncio.TimeoutError:
+            await asyncio.shield(self._withdraw(ID))
+            raise EtcdLockAcquireTimeout
+        except BaseException:
+            await asyncio.shield(self._withdraw(ID))
+            raise
+        self.leader_key = leader_key(r.leader)
+        log.debug("elected as the leader of %s (key: %s)" % (self.name, r.leader.key))
+        return self
+
+    async def proclaim(self, value):
+        """
+        Update the value of the leader without another election
+
+        :raises ErrElectionNotLeader: if not the leader anymore
+        """
+        if self.leader_key is None:
+            raise ErrElectionNotLeader()
+        return await self.client.proclaim(self.leader_key, value)
+
+    async def resign(self):
+        """
+        Give up the leadership, finishes even if the caller is canceled
+        """
+        leader, self.leader_key = self.leader_key, None
+        if leader is not None:
+            await asyncio.shield(self.client.resign(leader))
+
+    async def close(self):
+        """
+        Resign and revoke the session of the election, the given session is left open
+        """
+        session, self._own_session = self._own_session, None
+        try:
+            await self.resign()
+        finally:
+            if session is not None:
+                await session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def leader(self):
+        """
+        :return: the KeyValue of the current leader, None if no leader
+        """
+        try:
+            return (await self.client.leader(self.name)).kv
+        except ErrElectionNoLeader:
+            return None
+
+    async def is_leader(self):
+        """
+        :return: if this candidate is the current leader
+        """
+        if self.leader_key is None:
+            return False
+        kv = await self.leader()
+        return kv is not None and kv.key == self.leader_key['key']
+
+    def observe(self):
+        """
+        Stream the leader changes, starting with the current leader if any
+
+        :return: AioObserver
+        """
+        return AioObserver(self.client, self.name)
@@ -0,0 +1,546 @@
+"""
+Async lease utils (python 3 only)
+"""
+import asyncio
+import json
+import sys
+import time
+
+from .keeper import DEFAULT_BATCH_WINDOW
+from .keeper import DEFAULT_FRACTION
+from .keeper import DEFAULT_JITTER
+from .keeper import DEFAULT_MAX_BATCH
+from .keeper import DEFAULT_RETRY_INTERVAL
+from .keeper import KeepSchedule
+from .keeper import keepalive_body
+from .keeper import parse_keepalive
+from ..errors import ErrLeaseNotFound
+from ..utils import JSONFramer
+from ..utils import log
+
+
+async def keepalive(client, leases):
+    """
+    Refresh the leases by one request of the keepalive stream
+
+    :type client: AioClient
+    :param client: async client instance of etcd3
+    :param leases: the leases to refresh, anything with an ID attribute
+    :return: list of (ID, TTL) of the responses
+    """
+    resp = await client.call_rpc('/lease/keepalive', keepalive_body(leases), raw=True)
+    try:
+        await client._raise_for_status(resp)
+        framer = JSONFramer()
+        results = []
+        async for chunk in resp.content.iter_any():
+            for frame in framer.feed(chunk):
+                data = json.loads(frame.decode('utf-8'))
+                if data.get('error'):
+                    raise RuntimeError(data['error'])
+                results.append(parse_keepalive(data))
+            if len(results) >= len(leases):
+                break
+        return results
+    finally:
+        resp.close()
+
+
+async def _call(cb, *args):
+    r = cb(*args)
+    if asyncio.iscoroutine(r):
+        await r
+
+
+class AioLease(object):
+    """
+    Lease util of the async client, the keepalive runs as an asyncio task
+
+    Usage:
+
+    >>> async with aio_client.Lease(ttl=5) as lease:
+    ...     await aio_client.put('foo', 'bar', lease=lease.ID)
+    """
+
+    def __init__(self, client, ttl, ID=0, new=True):
+        """
+        :type client: AioClient
+        :param client: async client instance of etcd3
+        :type ID: int
+        :param ID: ID is the requested ID for the lease. If ID is set to 0, the lessor chooses an ID.
+        :type new: bool
+        :param new: whether grant a new lease or maintain a exist lease by its id [default: True]
+        """
+        self.client = client
+        if ttl < 2:
+            ttl = 2
+        self.grantedTTL = ttl
+        if not new and not ID:
+            raise TypeError("should provide the lease ID if new=False")
+        self._ID = ID
+        self.new = new
+        self.last_grant = None
+        self.keeping = False
+        self.last_keep = None
+        self._keepalive_error = None
+        self._keepalive_exc_info = None
+        self._keepalive_keep_cb_error = None
+        self._keepalive_keep_cb_exc_info = None
+        self._keepalive_cancel_cb_error = None
+        self._keepalive_cancel_cb_exc_info = None
+        self._task = None
+        self._keeper = None
+        self._cancel_cb = None
+
+    @property
+    def ID(self):
+        """
+        Property: the id of the granted lease
+
+        :return: int
+        """
+        return self._ID
+
+    async def grant(self):
+        """
+        Grant the lease if new is set to False
+        or it just inherit the lease of the specified id
+
+        When granting new lease if ID is set to 0, the lessor will chooses an ID.
+        """
+        if self.new:
+            r = await self.client.lease_grant(self.grantedTTL, self.ID)
+            self.last_grant = time.time()
+            self._ID = r.ID
+            return r
+        r = await self.time_to_live()
+        ttl = r.TTL if 'TTL' in r else -1
+        if ttl == -1:
+            raise ErrLeaseNotFound
+        self.last_grant = time.time() - ttl
+        return r
+
+    async def time_to_live(self, keys=False):
+        """
+        Retrieves lease information.
+
+        :type keys: bool
+        :param keys: whether return the keys that attached to the lease
+        """
+        return await self.client.lease_time_to_live(self.ID, keys=keys)
+
+    async def ttl(self):
+        """
+        Get the ttl that lease has left
+
+        :return: int
+        """
+        r = await self.time_to_live()
+        if 'TTL' not in r:
+            return -1
+        return r.TTL
+
+    async def alive(self):
+        """
+        Tell if the lease is still alive
+
+        :return: bool
+        """
+        return await self.ttl() > 0
+
+    async def keepalive_once(self):
+        """
+        Call keepalive for once to refresh the ttl of the lease
+
+        :return: the TTL of the lease, <= 0 if the lease is expired
+        """
+        for ID, ttl in await keepalive(self.client, [self]):
+            return ttl
+        return 0
+
+    refresh = keepalive_once
+
+    async def _on_keep(self, keep_cb):
+        self.last_keep = time.time()
+        log.debug("keeping lease %d" % self.ID)
+        if keep_cb:
+            try:
+                await _call(keep_cb)
+            except Exception as e:
+                log.exception("keep_cb() raised an error")
+                self._keepalive_keep_cb_error = e
+                self._keepalive_keep_cb_exc_info = sys.exc_info()
+
+    async def _on_cancel(self):
+        cancel_cb, self._cancel_cb = self._cancel_cb, None
+        log.debug("canceled keeping lease %d" % self.ID)
+        if cancel_cb:
+            try:
+                await _call(cancel_cb)
+            except Exception as e:
+                log.exception("cancel_cb() raised an error")
+                self._keepalive_cancel_cb_error = e
+                self._keepalive_cancel_cb_exc_info = sys.exc_info()
+
+    async def _keepalived(self, keep_cb):
+        try:
+            while self.keeping:
+                for i in range(3):
+                    try:
+                        ttl = await self.keepalive_once()
+                        break
+                    except Exception as e:
+                        if i == 2:
+                            raise
+                        log.debug("keepalive_once() failed (times:%d) retrying %s" % (i + 1, e))
+                        await asyncio.sleep(0.3)
+                if ttl <= 0:
+                    log.warning("lease %d expired while keeping alive" % self.ID)
+                    break
+                await self._on_keep(keep_cb)
+                await asyncio.sleep(self.grantedTTL / 4.0)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            log.exception('error occurred while keeping alive lease')
+            self._keepalive_error = e
+            self._keepalive_exc_info = sys.exc_info()
+        finally:
+            self.keeping = False
+            await self._on_cancel()
+
+    def keepalive(self, keep_cb=None, cancel_cb=None, keeper=None):
+        """
+        Start a task of the current event loop to constantly keep the lease alive
+
+        :type keep_cb: callable
+        :param keep_cb: callback function (or coroutine function) that will be called after every refresh
+        :type cancel_cb: callable
+        :param cancel_cb: callback function (or coroutine function) that will be called after cancel keepalive
+        :type keeper: AioLeaseKeeper
+        :param keeper: keep the lease alive by the keeper instead of a task of its own [default: None]
+        """
+        if self.keeping:
+            raise RuntimeError("already keeping")
+        self.keeping = True
+        self._keepalive_error = None
+        self._keepalive_exc_info = None
+        self._cancel_cb = cancel_cb
+        self.last_keep = time.time()
+        if keeper is None:
+            self._task = asyncio.ensure_future(self._keepalived(keep_cb))
+            return self._task
+
+        async def on_expire(ID):
+            log.warning("lease %d expired while keeping alive" % ID)
+            await self.cancel_keepalive()
+
+        self._keeper = keeper
+        keeper.add(self.ID, self.grantedTTL, on_keep=lambda ttl: self._on_keep(keep_cb), on_expire=on_expire)
+        keeper.start()
+
+    async def cancel_keepalive(self):
+        """
+        stop keeping-alive, and wait the keepalive task to exit
+        """
+        self.keeping = False
+        keeper, self._keeper = self._keeper, None
+        if keeper is not None:
+            keeper.remove(self.ID)
+            await self._on_cancel()
+            return
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.wait([task])
+
+    def jammed(self):
+        """
+        if is failed to keepalive at the last loop
+        """
+        if not self.keeping:
+            return False
+        if self._keeper is not None:
+            interval = self.grantedTTL * self._keeper.schedule.fraction + self._keeper.retry_interval
+            return time.time() - self.last_keep > interval
+        return time.time() - self.last_keep > self.grantedTTL / 4.0 + 1
+
+    async def revoke(self):
+        """
+        revoke the lease
+        """
+        log.debug("revoking lease %d" % self.ID)
+        await self.cancel_keepalive()
+        return await self.client.lease_revoke(self.ID)
+
+    async def __aenter__(self):
+        await self.grant()
+        self.keepalive()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        try:
+            await self.revoke()
+        except ErrLeaseNotFound:  # expired or revoked already
+            pass
+
+
+class AioSession(object):
+    """
+    An AioLease granted on the first use and kept alive by its keepalive task or an AioLeaseKeeper,
+    shared by the AioLocks of a client, see Session
+
+    If the lease is found expired, the next use grants a new one.
+    """
+
+    DEFAULT_TTL = 60
+
+    def __init__(self, client, ttl=DEFAULT_TTL, keeper=None):
+        """
+        :type client: AioClient
+        :param client: async client instance of etcd3
+        :type ttl: int
+        :param ttl: the TTL of the lease [default: 60]
+        :type keeper: AioLeaseKeeper
+        :param keeper: keep the lease alive by this keeper, None means a keepalive task of the lease
+            [default: None]
+        """
+        self.client = client
+        self.grantedTTL = max(2, ttl)
+        self.keeper = keeper
+        self.lease = None
+        self.closed = False
+        self._lock = None
+
+    async def lease_id(self):
+        """
+        Get the id of the lease, granted if not granted yet
+
+        :return: int
+        """
+        if self.closed:
+            raise RuntimeError("session is closed")
+        lease = self.lease
+        if lease is not None and lease.keeping:
+            return lease.ID
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:  # grant only once for the concurrent waiters
+            if self.lease is None or not self.lease.keeping:
+                lease = AioLease(self.client, self.grantedTTL)
+                await lease.grant()
+                lease.keepalive(keeper=self.keeper)
+                self.lease = lease
+                log.debug("granted lease %d for the session" % lease.ID)
+            return self.lease.ID
+
+    @property
+    def ID(self):
+        """
+        Property: the id of the lease, None if not granted
+        """
+        return self.lease.ID if self.lease is not None else None
+
+    @property
+    def keeping(self):
+        """
+        Property: if the lease is granted and kept alive
+
+        :return: bool
+        """
+        return self.lease is not None and self.lease.keeping
+
+    async def lost(self, ID):
+        """
+        Drop the lease found not existing, the next use grants a new one
+        """
+        lease = self.lease
+        if lease is not None and lease.ID == ID:
+            self.lease = None
+            await lease.cancel_keepalive()
+
+    async def revoke(self):
+        """
+        Revoke the lease, which deletes the keys attached to it, the next use grants a new one
+        """
+        lease, self.lease = self.lease, None
+        if lease is None:
+            return
+        try:
+            await lease.revoke()
+        except ErrLeaseNotFound:
+            pass
+
+    async def close(self, revoke=True):
+        """
+        Stop keeping the lease alive
+
+        :type revoke: bool
+        :param revoke: revoke the lease of the session [default: True]
+        """
+        self.closed = True
+        if revoke:
+            await self.revoke()
+        elif self.lease is not None:
+            lease, self.lease = self.lease, None
+            await lease.cancel_keepalive()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+
+class AioLeaseKeeper(object):
+    """
+    Keep many leases alive from one asyncio task, see LeaseKeeper
+
+    Usage:
+
+    >>> keeper = AioLeaseKeeper(aio_client, on_expire=on_expire)
+    >>> keeper.start()
+    >>> keeper.add(lease_id, ttl)
+    >>> await keeper.stop()
+    """
+
+    def __init__(self, client, fraction=DEFAULT_FRACTION, jitter=DEFAULT_JITTER, batch_window=DEFAULT_BATCH_WINDOW,
+                 max_batch=DEFAULT_MAX_BATCH, on_expire=None, retry_interval=DEFAULT_RETRY_INTERVAL):
+        """
+        :type client: AioClient
+        :param client: async client instance of etcd3
+        :type fraction: float
+        :param fraction: refresh a lease after this fraction of its TTL [default: 1/3]
+        :type jitter: float
+        :param jitter: refresh up to this fraction of the interval earlier, at random [default: 0.1]
+        :type batch_window: float
+        :param batch_window: the leases due within these seconds are refreshed in the same batch [default: 0.05]
+        :type max_batch: int
+        :param max_batch: max leases refreshed by one request [default: 500]
+        :type on_expire: callable
+        :param on_expire: called with the lease ID when a lease is found expired [default: None]
+        :type retry_interval: float
+        :param retry_interval: seconds to retry the leases of a failed batch [default: 0.5]
+        """
+        self.client = client
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.on_expire = on_expire
+        self.retry_interval = retry_interval
+        self.schedule = KeepSchedule(fraction, jitter)
+        self._wakeup = None
+        self._task = None
+        self._stats = {'refreshed': 0, 'expired': 0, 'batches': 0, 'errors': 0}
+
+    def add(self, ID, ttl, on_keep=None, on_expire=None):
+        """
+        Keep a lease alive, see LeaseKeeper.add
+        """
+        self.schedule.add(ID, ttl, on_keep, on_expire)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def remove(self, ID):
+        """
+        Stop keeping a lease alive
+        """
+        self.schedule.remove(ID)
+
+    def __len__(self):
+        return len(self.schedule)
+
+    def __contains__(self, ID):
+        return ID in self.schedule
+
+    async def refresh(self, leases):
+        """
+        Refresh the leases by one request of the keepalive stream, and reschedule them
+        """
+        pending = dict((lease.ID, lease) for lease in leases)
+        callbacks = []
+        self._stats['batches'] += 1
+        try:
+            for ID, ttl in await keepalive(self.client, leases):
+                lease = pending.pop(ID, None)
+                if lease is None or self.schedule.leases.get(ID) is not lease:  # removed while refreshing
+                    continue
+                if ttl <= 0:
+                    self.schedule.remove(ID)
+                    self._stats['expired'] += 1
+                    callbacks.append((lease.on_expire or self.on_expire, ID))
+                else:
+                    self.schedule.schedule(lease, time.time(), ttl)
+                    self._stats['refreshed'] += 1
+                    callbacks.append((lease.on_keep, ttl))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("failed refreshing %d leases, retrying in %ss" % (len(pending), self.retry_interval))
+            self._stats['errors'] += 1
+        finally:
+            now = time.time()
+            for lease in pending.values():
+                if self.schedule.leases.get(lease.ID) is lease:
+                    self.schedule.retry(lease, now, self.retry_interval)
+        for cb, arg in callbacks:
+            if cb is None:
+                continue
+            try:
+                await _call(cb, arg)
+            except Exception:
+                log.exception("lease keeper callback raised an error")
+
+    async def run(self):
+        """
+        Refresh the due leases until canceled
+        """
+        self._wakeup = asyncio.Event()
+        while True:
+            deadline = self.schedule.next_deadline()
+            now = time.time()
+            if deadline is None or deadline > now:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), None if deadline is None else deadline - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            due = self.schedule.pop_due(now + self.batch_window, self.max_batch)
+            if due:
+                await self.refresh(due)
+
+    def start(self):
+        """
+        Run the keeper in a task of the current event loop
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self.run())
+        return self._task
+
+    async def stop(self):
+        """
+        Stop refreshing, the leases are not revoked
+        """
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def stats(self):
+        """
+        :return: dict of leases, refreshed, expired, batches and errors
+        """
+        rt = dict(self._stats)
+        rt['leases'] = len(self.schedule)
+        return rt
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
@@ -0,0 +1,307 @@
+"""
+Async lock util (python 3 only)
+"""
+import asyncio
+import json
+import time
+import uuid
+
+from .lock import EtcdLockAcquireTimeout
+from .lock import EtcdLockError
+from ..errors import ErrLeaseNotFound
+from ..models import RangeRequestSortOrder
+from ..models import RangeRequestSortTarget
+from ..utils import JSONFramer
+from ..utils import log
+
+
+async def wait_deleted(client, key, start_revision):
+    """
+    Watch a key until it's deleted
+
+    :type client: AioClient
+    :param client: async client instance of etcd3
+    :param key: the key to watch
+    :type start_revision: int
+    :param start_revision: the revision to watch from
+    :return: True if the key is deleted, False if the watch is canceled (eg. the revision is compacted)
+    """
+    create_request = client.watch_create(key, start_revision=start_revision, no_put=True, create_request_obj=True)
+    resp = await client.call_rpc('/watch', {'create_request': create_request}, raw=True)
+    try:
+        await client._raise_for_status(resp)
+        framer = JSONFramer()
+        async for chunk in resp.content.iter_any():
+            for frame in framer.feed(chunk):
+                data = json.loads(frame.decode('utf-8'))
+                if data.get('error'):
+                    raise RuntimeError(data['error'])
+                result = data.get('result', data)
+                if result.get('events'):
+                    return True
+                if result.get('canceled') or result.get('compact_revision'):
+                    return False
+        return False
+    finally:
+        resp.close()
+
+
+class AioLock(object):
+    """
+    Fair lock of the async client, works like Mutex
+
+    Every waiter puts its own key under the prefix of the lock, attached to the lease of an AioSession,
+    and only watches the deletion of the key right before its own, so waiting takes no thread and a
+    release wakes up only the next waiter.
+
+    Usage:
+
+    >>> async with aio_client.Lock('job', timeout=10):
+    ...     await do_the_job()
+    """
+
+    DEFAULT_TTL = 60
+
+    def __init__(self, client, name, ttl=DEFAULT_TTL, session=None, lock_prefix='_mutex', timeout=None):
+        """
+        :type client: AioClient
+        :param client: async client instance of etcd3
+        :type name: str
+        :param name: the name of the lock
+        :type ttl: int
+        :param ttl: the TTL of the shared session of the client, ignored if session is given [default: 60]
+        :type session: AioSession
+        :param session: the session to attach the key to, None means the shared session of the client
+            with the ttl [default: None]
+        :type lock_prefix: str
+        :param lock_prefix: the prefix of the lock keys [default: '_mutex']
+        :type timeout: float
+        :param timeout: the timeout of acquiring the lock by `async with` [default: None]
+        """
+        self.client = client
+        self.name = name
+        self.ttl = ttl
+        self.session = session
+        self.timeout = timeout
+        self.prefix = "{}/{}/".format(lock_prefix, name)
+        self._key_prefix = self.prefix  # where the key of the waiter is put
+        self._wait_prefix = self.prefix  # the keys created before the waiter's here block it
+        self.uuid = uuid.uuid4().hex[:8]
+        self.key = None  # the key of the waiter
+        self.revision = None  # the create revision of the key
+
+    def _get_session(self):
+        if self.session is not None:
+            return self.session
+        return self.client.shared_session(self.ttl)
+
+    def _first_range(self, txn, **kwargs):
+        return txn.range(self._wait_prefix, prefix=True, limit=1, sort_target=RangeRequestSortTarget.CREATE,
+                         **kwargs)
+
+    @staticmethod
+    def _first_kv(response):
+        kvs = response.response_range.kvs
+        return kvs[0] if kvs else None
+
+    async def _enqueue(self, session):
+        """
+        Put the key of the waiter and read the first key of the wait prefix by one txn
+
+        :return: (kv of the first key of the wait prefix, revision of the response)
+        """
+        ID = await session.lease_id()
+        key = "%s%x-%s" % (self._key_prefix, ID, self.uuid)
+        txn = self.client.Txn()
+        txn.If(txn.key(key).create == 0)
+        txn.Then(txn.put(key, b'', lease=ID))
+        txn.Then(self._first_range(txn, sort_order=RangeRequestSortOrder.ASCEND))
+        txn.Else(txn.range(key))
+        txn.Else(self._first_range(txn, sort_order=RangeRequestSortOrder.ASCEND))
+        try:
+            r = await txn.commit()
+        except ErrLeaseNotFound:  # expired before the keepalive task noticed
+            await session.lost(ID)
+            return await self._enqueue(session)
+        self.key = key
+        if r.succeeded:
+            self.revision = r.header.revision
+        else:
+            self.revision = self._first_kv(r.responses[0]).create_revision
+        return self._first_kv(r.responses[1]), r.header.revision
+
+    async def _predecessor(self):
+        """
+        :return: (kv of the key right before the waiter's, if the waiter's key exists, revision of the response)
+        """
+        txn = self.client.Txn()
+        txn.Then(txn.range(self.key, count_only=True))
+        txn.Then(self._first_range(txn, sort_order=RangeRequestSortOrder.DESCEND,
+                                   max_create_revision=self.revision - 1))
+        r = await txn.commit()
+        return self._first_kv(r.responses[1]), bool(r.responses[0].response_range.count), r.header.revision
+
+    async def _dequeue(self):
+        key, self.key, self.revision = self.key, None, None
+        if key is not None:
+            await self.client.delete_range(key)
+
+    async def _wait(self):
+        while True:
+            pred, exists, revision = await self._predecessor()
+            if not exists:
+                raise EtcdLockError("the key of the waiter is gone, the session may be expired")
+            if pred is None:
+                return
+            log.debug("waiting for %s to be deleted" % pred.key)
+            await wait_deleted(self.client, pred.key, revision + 1)
+
+    async def acquire(self, block=True, timeout=None):
+        """
+        Acquire the lock, waiting in the queue of the waiters
+
+        If the waiting is canceled or timed out, the waiter leaves the queue.
+
+        :type block: bool
+        :param block: wait until the lock is obtained, or timeout is reached [default: True]
+        :type timeout: float
+        :param timeout: the time to wait before giving up on getting a lock
+        :return: self, None if not block and the lock is held by another one
+        :raises EtcdLockAcquireTimeout: if timeout is reached
+        :raises EtcdLockError: if the session expired while waiting
+        """
+        if self.key is not None:
+            raise EtcdLockError("already acquired or acquiring")
+        start = time.time()
+        first, _ = await self._enqueue(self._get_session())
+        if first is None or first.create_revision >= self.revision:
+            log.debug("AioLock acquired (key: %s)" % self.key)
+            return self
+        if not block:
+            await asyncio.shield(self._dequeue())
+            return
+        try:
+            if timeout is None:
+                await self._wait()
+            else:
+                await asyncio.wait_for(self._wait(), max(timeout - (time.time() - start), 0))
+        except asyncio.TimeoutError:
+            await asyncio.shield(self._dequeue())
+            raise EtcdLockAcquireTimeout
+        except BaseException:
+            await asyncio.shield(self._dequeue())
+            raise
+        log.debug("AioLock acquired (key: %s)" % self.key)
+        return self
+
+    async def release(self):
+        """
+        Release the lock, or leave the queue, finishes even if the caller is canceled
+        """
+        await asyncio.shield(self._dequeue())
+
+    async def is_acquired(self):
+        """
+        :return: if the lock is held by this waiter
+        """
+        if self.key is None:
+            return False
+        pred, exists, _ = await self._predecessor()
+        return exists and pred is None
+
+    async def waiters(self):
+        """
+        :return: int, the number of the keys in the queue, including the owner
+        """
+        r = await self.client.range(self.prefix, prefix=True, count_only=True)
+        return int(r.count or 0)
+
+    async def __aenter__(self):
+        await self.acquire(timeout=self.timeout)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.release()
+
+
+class _AioRWMutex(AioLock):
+    """
+    A side of the AioRWLock, a writer is blocked by any earlier key, a reader only by an earlier writer
+    """
+
+    def __init__(self, client, name, ttl, session, lock_prefix, timeout, write):
+        super(_AioRWMutex, self).__init__(client, name, ttl=ttl, session=session, lock_prefix=lock_prefix,
+                                          timeout=timeout)
+        self.write = write
+        self._key_prefix = self.prefix + ('write/' if write else 'read/')
+        self._wait_prefix = self.prefix if write else self.prefix + 'write/'
+
+
+class AioRWLock(object):
+    """
+    Read-write lock of the async client, see RWLock
+
+    Usage:
+
+    >>> rw = aio_client.RWLock('config')
+    >>> async with rw.read_lock:
+    ...     await read_the_config()
+    >>> async with rw.write_lock:
+    ...     await write_the_config()
+    """
+
+    DEFAULT_TTL = 60
+
+    def __init__(self, client, name, ttl=DEFAULT_TTL, session=None, lock_prefix='_rwlock', timeout=None):
+        """
+        :type client: AioClient
+        :param client: async client instance of etcd3
+        :type name: str
+        :param name: the name of the lock
+        :type ttl: int
+        :param ttl: the TTL of the shared session of the client, ignored if session is given [default: 60]
+        :type session: AioSession
+        :param session: the session to attach the keys to, None means the shared session of the client
+            with the ttl [default: None]
+        :type lock_prefix: str
+        :param lock_prefix: the prefix of the lock keys [default: '_rwlock']
+        :type timeout: float
+        :param timeout: the timeout of acquiring the lock by `async with` [default: None]
+        """
+        self.client = client
+        self.name = name
+        self.read_lock = _AioRWMutex(client, name, ttl, session, lock_prefix, timeout, write=False)
+        self.write_lock = _AioRWMutex(client, name, ttl, session, lock_prefix, timeout, write=True)
+        self.prefix = self.read_lock.prefix
+
+    async def acquire_read(self, block=True, timeout=None):
+        """
+        Acquire the lock shared with the other readers, see AioLock.acquire
+        """
+        return await self.read_lock.acquire(block=block, timeout=timeout)
+
+    async def release_read(self):
+        await self.read_lock.release()
+
+    async def acquire_write(self, block=True, timeout=None):
+        """
+        Acquire the lock exclusively, see AioLock.acquire
+        """
+        return await self.write_lock.acquire(block=block, timeout=timeout)
+
+    async def release_write(self):
+        await self.write_lock.release()
+
+    async def readers(self):
+        """
+        :return: int, the number of the readers holding or waiting for the lock
+        """
+        r = await self.client.range(self.prefix + 'read/', prefix=True, count_only=True)
+        return int(r.count or 0)
+
+    async def writers(self):
+        """
+        :return: int, the number of the writers holding or waiting for the lock
+        """
+        r = await self.client.range(self.prefix + 'write/', prefix=True, count_only=True)
+        return int(r.count or 0)
@@ -0,0 +1,288 @@
+"""
+Read-through cache of single keys and prefixes, kept coherent by a watch
+"""
+import threading
+
+from .planner import in_key_range
+from .planner import key_range
+from .planner import prefix_range_end
+from .planner import to_bytes
+from .watch import Watcher
+from ..models import EventEventType as EventType
+from ..utils import OrderedDictEx
+from ..utils import check_param
+from ..utils import get_ident
+from ..utils import log
+
+
+class CacheResult(object):
+    """
+    Result of a cached read
+    """
+    __slots__ = ('kvs', 'revision', 'hit')
+
+    def __init__(self, kvs, revision, hit):
+        """
+        :param kvs: list of the key-values, empty if the key does not exist
+        :type revision: int
+        :param revision: the revision the result reflects
+        :type hit: bool
+        :param hit: whether the result is served from the cache
+        """
+        self.kvs = kvs
+        self.revision = revision
+        self.hit = hit
+
+    @property
+    def kv(self):
+        """
+        the first key-value, None if not exists
+        """
+        return self.kvs[0] if self.kvs else None
+
+    @property
+    def value(self):
+        """
+        the value of the first key-value, None if not exists
+        """
+        return self.kvs[0].value if self.kvs else None
+
+    def __repr__(self):
+        return "<CacheResult of %d kvs at revision %s%s>" % (len(self.kvs), self.revision, ' (hit)' if self.hit else '')
+
+
+class KVCache(object):
+    """
+    Cache the reads of single keys and prefixes in a range, fed by one long-lived watch of the range
+
+    A read is served from the cache after the first time, an event of a cached single key updates
+    (or deletes) it in place, and an event under a cached prefix drops the prefix. A missing key is cached
+    as a negative entry, so the reads of absent keys are answered locally too.
+
+    The cache is only as fresh as the watch, linearizable=True bypasses it and reads from the cluster,
+    so does a read out of the cached range or before the watch is created.
+
+    Usage:
+
+    >>> cache = client.KVCache(key='/config', prefix=True, maxsize=10000)
+    >>> cache.runDaemon()
+    >>> r = cache.get('/config/db')  # from the server, then cached
+    >>> r = cache.get('/config/db')  # from the cache
+    >>> r.value, r.revision, r.hit
+    >>> cache.stats()['hit_rate']
+    >>> cache.stop()
+    """
+
+    @check_param(at_least_one_of=['key', 'all'], at_most_one_of=['range_end', 'prefix', 'all'])
+    def __init__(self, client, key=None, range_end=None, prefix=None, all=None, maxsize=10000, negative=True,
+                 serializable=False, max_retries=-1):
+        """
+        :type client: BaseClient
+        :param client: client instance of etcd3
+        :type key: str or bytes
+        :param key: the key or the start of the range to cache
+        :type range_end: str or bytes
+        :param range_end: the end of the range [key, range_end) to cache
+        :type prefix: bool
+        :param prefix: if the key is a prefix [default: False]
+        :type all: bool
+        :param all: all the keys [default: False]
+        :type maxsize: int
+        :param maxsize: max entries (single keys and prefixes) kept in the cache [default: 10000]
+        :type negative: bool
+        :param negative: cache the keys that do not exist [default: True]
+        :type serializable: bool
+        :param serializable: fill the cache by serializable reads [default: False]
+        :type max_retries: int
+        :param max_retries: max retries of the feeding watch, -1 means no limit [default: -1]
+        """
+        self.client = client
+        self.range = dict(key=key, range_end=range_end, prefix=prefix, all=all)
+        self.maxsize = maxsize
+        self.negative = negative
+        self.serializable = serializable
+        self.watcher = Watcher(client, max_retries=max_retries, **self.range)
+        self.revision = None  # the revision applied from the feeding watch, None if not created yet
+        self._start, self._end = key_range(self.range)
+        self._entries = OrderedDictEx()  # ('k', key) or ('p', prefix) -> (kvs, revision)
+        self._prefixes = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {'hits': 0, 'misses': 0, 'negative_hits': 0, 'bypasses': 0, 'evictions': 0}
+
+    def _covers(self, key, prefix):
+        if not prefix:
+            return in_key_range(key, self._start, self._end)
+        if self._end == b'\0':
+            return key >= self._start
+        end = prefix_range_end(key)
+        return self._end is not None and end is not None and self._start <= key and end <= self._end
+
+    def _read(self, key, prefix, linearizable):
+        entry_key = ('p' if prefix else 'k', key)
+        covered = self._covers(key, prefix)
+        if linearizable or self.revision is None or not covered:
+            with self._lock:
+                self._stats['bypasses'] += 1
+            return self._fill(entry_key, key, prefix, linearizable, store=covered)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is not None:
+                self._entries.move_to_end(entry_key)
+                kvs, revision = entry
+                self._stats['hits'] += 1
+                if not kvs:
+                    self._stats['negative_hits'] += 1
+                return CacheResult(kvs, max(revision, self.revision), True)
+            self._stats['misses'] += 1
+        return self._fill(entry_key, key, prefix, False)
+
+    def _fill(self, entry_key, key, prefix, linearizable, store=True):
+        r = self.client.range(key, prefix=prefix or None, serializable=(self.serializable and not linearizable) or None)
+        kvs = list(r.kvs or ())
+        revision = r.header.revision
+        if store and (kvs or self.negative):
+            with self._lock:
+                # a read older than the applied watch revision may miss the events applied before it
+                if self.revision is not None and revision >= self.revision:
+                    self._store(entry_key, kvs, revision)
+        return CacheResult(kvs, revision, False)
+
+    def _store(self, entry_key, kvs, revision):
+        self._entries[entry_key] = (kvs, revision)
+        self._entries.move_to_end(entry_key)
+        if entry_key[0] == 'p':
+            self._prefixes.add(entry_key[1])
+        while len(self._entries) > self.maxsize:
+            evicted, _ = self._entries.popitem(last=False)
+            if evicted[0] == 'p':
+                self._prefixes.discard(evicted[1])
+            self._stats['evictions'] += 1
+
+    def _drop(self, entry_key):
+        if self._entries.pop(entry_key, None) is not None and entry_key[0] == 'p':
+            self._prefixes.discard(entry_key[1])
+
+    def get(self, key, linearizable=False):
+        """
+        Read a single key
+
+        :type key: str or bytes
+        :param key: the key
+        :type linearizable: bool
+        :param linearizable: bypass the cache and read from the cluster [default: False]
+        :return: CacheResult
+        """
+        return self._read(to_bytes(key), False, linearizable)
+
+    def get_prefix(self, prefix, linearizable=False):
+        """
+        Read all the keys of a prefix
+
+        :type prefix: str or bytes
+        :param prefix: the key prefix
+        :type linearizable: bool
+        :param linearizable: bypass the cache and read from the cluster [default: False]
+        :return: CacheResult
+        """
+        return self._read(to_bytes(prefix), True, linearizable)
+
+    def on_response(self, r):
+        """
+        Apply a watch response of the range to the cache
+
+        :param r: WatchResponse
+        """
+        with self._lock:
+            if 'compact_revision' in r and r.compact_revision > 0:
+                log.warning("kv cache missed the events before compacted revision %d, cleared" % r.compact_revision)
+                self._entries.clear()
+                self._prefixes.clear()
+            for event in r.events:
+                key = event.key
+                entry = self._entries.get(('k', key))
+                if entry is not None and event.mod_revision > entry[1]:
+                    if event.type == EventType.PUT:
+                        self._entries[('k', key)] = ([event], event.mod_revision)
+                    elif self.negative:
+                        self._entries[('k', key)] = ([], event.mod_revision)
+                    else:
+                        self._drop(('k', key))
+                for prefix in [p for p in self._prefixes if key.startswith(p)]:
+                    if event.mod_revision > self._entries[('p', prefix)][1]:
+                        self._drop(('p', prefix))
+            if r.events:
+                # the header is the current revision even while older events are still pending
+                self.revision = max(self.revision or 0, r.events[-1].mod_revision)
+            elif not r.created or self.revision is None:
+                # a progress notify, or the first watch created at the current revision
+                self.revision = max(self.revision or 0, r.header.revision)
+
+    def invalidate(self, key, prefix=False):
+        """
+        Drop a single key or a prefix from the cache
+        """
+        with self._lock:
+            self._drop(('p' if prefix else 'k', to_bytes(key)))
+
+    def clear(self):
+        """
+        Drop all the entries
+        """
+        with self._lock:
+            self._entries.clear()
+            self._prefixes.clear()
+
+    def run(self):
+        """
+        Run the feeding watch
+        """
+        try:
+            with self.watcher:
+                for r in self.watcher.iter_responses():
+                    self.on_response(r)
+        except Exception:
+            log.exception("kv cache stopped watching, reads bypass the cache")
+        finally:
+            with self._lock:
+                self.revision = None
+                self._entries.clear()
+                self._prefixes.clear()
+
+    def runDaemon(self):
+        """
+        Run the feeding watch in a daemon thread
+        """
+        t = self._thread = threading.Thread(target=self.run)
+        t.setDaemon(True)
+        t.start()
+
+    def stop(self):
+        """
+        Stop the feeding watch, the reads bypass the cache after stopped
+        """
+        self.watcher.stop()
+        if self._thread and self._thread.is_alive() and self._thread.ident != get_ident():
+            self._thread.join()
+
+    def stats(self):
+        """
+        :return: dict of hits, misses, negative_hits, bypasses, evictions, size, hit_rate and revision
+        """
+        with self._lock:
+            rt = dict(self._stats)
+            rt['size'] = len(self._entries)
+            rt['revision'] = self.revision
+        reads = rt['hits'] + rt['misses']
+        rt['hit_rate'] = float(rt['hits']) / reads if reads else 0.0
+        return rt
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __enter__(self):
+        self.runDaemon()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,97 @@
+"""
+Bounded replay of the changes of a prefix between two revisions
+"""
+from .planner import to_bytes
+from .watch import EventBatch
+from .watch import OnceTimeout
+from .watch import Watcher
+from ..utils import log
+
+DEFAULT_IDLE_TIMEOUT = 1  # seconds
+
+
+def iter_changes(client, prefix, from_revision, to_revision=None, idle_timeout=DEFAULT_IDLE_TIMEOUT, timeout=None):
+    """
+    Replay the watch history of a prefix from from_revision up to to_revision (both inclusive)
+
+    The history is replayed by a watch of the prefix, which ends at the first event at or after to_revision.
+    If the last change of the prefix is before to_revision, no such event comes, so once the prefix stream
+    has been idle for idle_timeout seconds, the rest is replayed by a watch of all the keys, which ends
+    exactly at the event of to_revision (every revision is made by at least one event).
+
+    :type client: BaseClient
+    :param client: client instance of etcd3
+    :type prefix: str or bytes
+    :param prefix: the key prefix
+    :type from_revision: int
+    :param from_revision: the revision to replay from (inclusive)
+    :type to_revision: int
+    :param to_revision: the revision to replay to (inclusive), None means the head revision read at call time
+    :type idle_timeout: float
+    :param idle_timeout: seconds without any response of the prefix stream to replay the rest
+        by a watch of all the keys [default: 1]
+    :type timeout: float
+    :param timeout: seconds without any response of the watch of all the keys to give up,
+        None means no limit [default: None]
+    :return: generator of EventBatch, the events of one watch response each
+    :raises Etcd3WatchCompacted: if from_revision has been compacted, its compact_revision is
+        the oldest revision still can be replayed
+    :raises OnceTimeout: if the watch of all the keys is idle for timeout seconds before to_revision
+    """
+    if to_revision is None:
+        to_revision = client.range(prefix, prefix=True, count_only=True).header.revision
+    if from_revision > to_revision or to_revision <= 1:  # revision 1 is the empty store, no event
+        return iter(())
+    return _iter_changes(client, to_bytes(prefix), from_revision, to_revision, idle_timeout, timeout)
+
+
+class _Replay(object):
+    """
+    Read the responses of a watcher into EventBatch until the events reach to_revision
+    """
+
+    def __init__(self, watcher, to_revision, revision, key_prefix=None):
+        self.watcher = watcher
+        self.to_revision = to_revision
+        self.revision = revision  # the last revision replayed
+        self.key_prefix = key_prefix
+
+    def __iter__(self):
+        for r in self.watcher.iter_responses(raise_timeout=True):
+            if not r.events:
+                if not r.created and r.header.revision >= self.to_revision:  # progress notify, nothing pending
+                    return
+                continue
+            events = [e for e in r.events if e.mod_revision <= self.to_revision and
+                      (self.key_prefix is None or e.key.startswith(self.key_prefix))]
+            if events:
+                yield EventBatch(events, r.header)
+            # the header is the current revision even while catching up, only the events tell the progress
+            self.revision = r.events[-1].mod_revision
+            if self.revision >= self.to_revision:
+                return
+
+
+def _iter_changes(client, prefix, from_revision, to_revision, idle_timeout, timeout):
+    w = Watcher(client, key=prefix, prefix=True, start_revision=from_revision, max_retries=0)
+    w.set_default_timeout(idle_timeout)
+    replay = _Replay(w, to_revision, from_revision - 1)
+    try:
+        with w:
+            for batch in replay:
+                yield batch
+            return
+    except OnceTimeout:
+        pass
+    finally:
+        w.stop()
+    log.debug("replaying the changes of '%s' from revision %d to %d by watching all keys" %
+              (prefix, replay.revision + 1, to_revision))
+    w = Watcher(client, all=True, start_revision=replay.revision + 1, max_retries=0)
+    w.set_default_timeout(timeout)
+    try:
+        with w:
+            for batch in _Replay(w, to_revision, replay.revision, key_prefix=prefix):
+                yield batch
+    finally:
+        w.stop()
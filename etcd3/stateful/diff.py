@@ -0,0 +1,115 @@
+"""
+Diff the keys of a prefix between two revisions
+"""
+from .planner import key_range
+from .snapshot import DEFAULT_PAGE_SIZE
+from .snapshot import iter_pages
+
+CREATED = 'created'
+MODIFIED = 'modified'
+DELETED = 'deleted'
+
+
+class Change(object):
+    """
+    A key changed between two revisions
+    """
+    __slots__ = ('type', 'key', 'kv')
+
+    def __init__(self, type, key, kv):
+        """
+        :type type: str
+        :param type: CREATED, MODIFIED or DELETED
+        :type key: bytes
+        :param key: the key
+        :param kv: the key-value at the newer revision, or at the older revision if deleted
+        """
+        self.type = type
+        self.key = key
+        self.kv = kv
+
+    def __eq__(self, other):
+        return isinstance(other, Change) and (self.type, self.key) == (other.type, other.key)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.type, self.key))
+
+    def __repr__(self):
+        return "<Change %s '%s'>" % (self.type, self.key)
+
+
+def _iter_kvs(client, params, revision, page_size):
+    for r in iter_pages(client, params, revision, page_size):
+        for kv in r.kvs or ():
+            yield kv
+
+
+def _count(client, params, revision):
+    r = client.range(revision=revision, count_only=True, **params)
+    return int(r.count or 0), r.header.revision
+
+
+def iter_diff(client, prefix, rev_a, rev_b=None, values=False, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Diff the keys of a prefix between rev_a and rev_b, in key order
+
+    The created and modified keys are the ones whose mod_revision is after rev_a at rev_b, read by
+    a min_mod_revision range. The keys at rev_a are compared with the keys at rev_b (keys only) to find
+    the deleted ones, unless the key counts prove nothing is deleted. All the ranges are streamed
+    page by page, so the memory is bounded by the page size.
+
+    :type client: BaseClient
+    :param client: client instance of etcd3
+    :type prefix: str or bytes
+    :param prefix: the key prefix
+    :type rev_a: int
+    :param rev_a: the older revision
+    :type rev_b: int
+    :param rev_b: the newer revision, None means the current revision
+    :type values: bool
+    :param values: read the values of the created and modified keys [default: False]
+    :type page_size: int
+    :param page_size: keys per range request [default: 1000]
+    :return: generator of Change
+    :raises ErrCompacted: if rev_a has been compacted
+    """
+    key, range_end = key_range({'key': prefix, 'prefix': True})
+    params = {'key': key, 'range_end': range_end}
+    count_b, head = _count(client, params, rev_b)
+    rev_b = rev_b or head
+    if rev_a >= rev_b:
+        return
+    count_a, _ = _count(client, params, rev_a)
+    # etcd counts a range before the revision filters, so the created keys are counted page by page
+    created = sum(1 for _ in _iter_kvs(client, dict(params, min_create_revision=rev_a + 1, keys_only=True),
+                                       rev_b, page_size))
+    changed = dict(params, min_mod_revision=rev_a + 1, keys_only=not values or None)
+
+    # the keys created after rev_a are not at rev_a, the others at rev_b must be, if they are as many
+    # as the keys at rev_a nothing is deleted (a key deleted and re-created is counted as created, so
+    # it only makes the check fall to the full comparison)
+    if count_b - created == count_a:
+        for kv in _iter_kvs(client, changed, rev_b, page_size):
+            yield Change(CREATED if kv.create_revision > rev_a else MODIFIED, kv.key, kv)
+        return
+
+    keys = dict(params, keys_only=True)
+    old_kvs = _iter_kvs(client, keys, rev_a, page_size)
+    new_kvs = _iter_kvs(client, keys, rev_b, page_size)
+    changed_kvs = _iter_kvs(client, changed, rev_b, page_size)
+    old, new, change = next(old_kvs, None), next(new_kvs, None), next(changed_kvs, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old.key < new.key):
+            yield Change(DELETED, old.key, old)
+            old = next(old_kvs, None)
+            continue
+        existed = old is not None and old.key == new.key
+        if change is not None and change.key == new.key:
+            yield Change(MODIFIED if existed else CREATED, change.key, change)
+            change = next(changed_kvs, None)
+        if existed:
+            old = next(old_kvs, None)
+        new = next(new_kvs, None)
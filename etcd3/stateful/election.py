@@ -0,0 +1,175 @@
+"""
+Leader election recipe on the v3election API
+"""
+from requests.exceptions import Timeout
+
+from .lock import EtcdLockAcquireTimeout
+from .lock import EtcdLockError
+from ..errors import ErrElectionNoLeader
+from ..errors import ErrElectionNotLeader
+from ..errors import ErrLeaseNotFound
+from ..utils import log
+
+
+def leader_key(leader):
+    """
+    :param leader: the LeaderKey model of the campaign response
+    :return: dict of the LeaderKey to proclaim or resign with
+    """
+    return {'name': leader.name, 'key': leader.key, 'rev': leader.rev, 'lease': leader.lease}
+
+
+class Election(object):
+    """
+    Leader election on the election service of etcd server
+
+    The candidate key is attached to the lease of a session, the server keys it by the lease ID,
+    so the candidates of an election must not share a session: without a given session, every Election
+    grants a lease of its own, which is revoked by close. If the session expires, the leadership passes
+    to the next candidate.
+
+    The followers observe the leader by one stream, the server pushes the new leader as soon as
+    its key becomes the first one, so a change is learned within a watch round trip.
+
+    Usage:
+
+    >>> election = client.Election('scheduler')
+    >>> election.campaign('node1')  # blocks until elected
+    >>> election.proclaim('node1:8080')
+    >>> election.resign()
+    >>> election.close()
+
+    >>> for kv in client.Election('scheduler').observe():
+    ...     print(kv.value)
+    """
+
+    DEFAULT_TTL = 60
+
+    def __init__(self, client, name, ttl=DEFAULT_TTL, session=None):
+        """
+        :type client: BaseClient
+        :param client: instance of etcd.Client
+        :type name: str
+        :param name: the name of the election
+        :type ttl: int
+        :param ttl: the TTL of the session of the election, ignored if session is given [default: 60]
+        :type session: Session
+        :param session: the session to attach the candidate key to, not shared with the other candidates
+            of the election, None means a session of the election with the ttl [default: None]
+        """
+        self.client = client
+        self.name = name
+        self.ttl = ttl
+        self.session = session
+        self.leader_key = None  # dict of the LeaderKey once elected
+        self._own_session = None
+
+    def _get_session(self):
+        if self.session is not None:
+            return self.session
+        if self._own_session is None or self._own_session.closed:
+            self._own_session = self.client.Session(self.ttl)
+        return self._own_session
+
+    def campaign(self, value, timeout=None):
+        """
+        Put the candidate key and block until it's elected
+
+        :type value: str or bytes
+        :param value: the value proclaimed when elected
+        :type timeout: float
+        :param timeout: the time to wait before giving up the campaign [default: None]
+        :return: self
+        :raises EtcdLockAcquireTimeout: if timeout is reached, the candidate key is deleted
+        """
+        if self.leader_key is not None:
+            raise EtcdLockError("already elected")
+        session = self._get_session()
+        ID = session.ID
+        try:
+            r = self.client.campaign(self.name, lease=ID, value=value, timeout=timeout)
+        except ErrLeaseNotFound:  # expired before the keeper noticed
+            session.lost(ID)
+            return self.campaign(value, timeout=timeout)
+        except BaseException as e:
+            # the server withdraws the candidate when the request is canceled, unless the connection is lost
+            self.client.delete_range("%s/%x" % (self.name, ID))
+            if isinstance(e, Timeout):
+                raise EtcdLockAcquireTimeout
+            raise
+        self.leader_key = leader_key(r.leader)
+        log.debug("elected as the leader of %s (key: %s)" % (self.name, r.leader.key))
+        return self
+
+    def proclaim(self, value):
+        """
+        Update the value of the leader without another election
+
+        :type value: str or bytes
+        :param value: the new value
+        :raises ErrElectionNotLeader: if not the leader anymore
+        """
+        if self.leader_key is None:
+            raise ErrElectionNotLeader()
+        return self.client.proclaim(self.leader_key, value)
+
+    def resign(self):
+        """
+        Give up the leadership, the next candidate is elected
+        """
+        leader, self.leader_key = self.leader_key, None
+        if leader is not None:
+            self.client.resign(leader)
+
+    def close(self):
+        """
+        Resign and revoke the session of the election, the given session is left open
+        """
+        session, self._own_session = self._own_session, None
+        try:
+            self.resign()
+        finally:
+            if session is not None:
+                session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def leader(self):
+        """
+        :return: the KeyValue of the current leader, None if no leader
+        """
+        try:
+            return self.client.leader(self.name).kv
+        except ErrElectionNoLeader:
+            return None
+
+    @property
+    def is_leader(self):
+        """
+        if this candidate is the current leader
+        """
+        if self.leader_key is None:
+            return False
+        kv = self.leader()
+        return kv is not None and kv.key == self.leader_key['key']
+
+    def observe(self, timeout=None):
+        """
+        Stream the leader changes, starting with the current leader if any
+
+        The stream is closed when the iterator is closed or garbage collected.
+
+        :type timeout: float
+        :param timeout: the timeout of the stream [default: None]
+        :return: iterator of the KeyValue of the leader
+        """
+        stream = self.client.observe(self.name, timeout=timeout)
+        try:
+            for r in stream:
+                yield r.kv
+        finally:
+            stream.close()
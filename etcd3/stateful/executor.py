@@ -0,0 +1,252 @@
+"""
+Bounded thread pool that runs watch callbacks off the stream-reading thread
+"""
+import threading
+import time
+from collections import deque
+
+import enum
+
+from .metrics import LatencyStat
+from ..utils import log
+
+
+class Overflow(enum.Enum):
+    """
+    What to do when the queue of a worker is full
+    """
+    BLOCK = 'block'  # block the watch stream until there is room
+    DROP_OLDEST = 'drop_oldest'  # drop the oldest pending event of the worker
+    COALESCE = 'coalesce'  # replace the pending event of the same key, block if there is none
+
+
+class _Task(object):
+    __slots__ = ('key', 'event', 'callbacks', 'enqueued')
+
+    def __init__(self, key, event, callbacks):
+        self.key = key
+        self.event = event
+        self.callbacks = callbacks
+        self.enqueued = time.time()
+
+
+class _WorkerQueue(object):
+    """
+    Bounded FIFO queue that applies the overflow policy on put
+    """
+
+    def __init__(self, maxsize, overflow):
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.tasks = deque()
+        self.pending = {}  # key -> the latest pending task of that key, only maintained for COALESCE
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def put(self, task):
+        """
+        :return: (dropped, coalesced) counts caused by this put
+        """
+        dropped = coalesced = 0
+        with self.cond:
+            while len(self.tasks) >= self.maxsize and not self.closed:
+                if self.overflow == Overflow.DROP_OLDEST:
+                    self.tasks.popleft()
+                    dropped += 1
+                    break
+                if self.overflow == Overflow.COALESCE:
+                    pending = self.pending.get(task.key)
+                    if pending is not None:
+                        # keep the slot (and so the order) of the pending task, only refresh its content
+                        pending.event = task.event
+                        pending.callbacks = task.callbacks
+                        return dropped, 1
+                self.cond.wait(0.5)
+            if self.closed:
+                return dropped, coalesced
+            self.tasks.append(task)
+            if self.overflow == Overflow.COALESCE:
+                self.pending[task.key] = task
+            self.cond.notify_all()
+        return dropped, coalesced
+
+    def get(self):
+        """
+        :return: _Task or None if the queue is closed and drained
+        """
+        with self.cond:
+            while not self.tasks:
+                if self.closed:
+                    return
+                self.cond.wait(0.5)
+            task = self.tasks.popleft()
+            if self.pending.get(task.key) is task:
+                del self.pending[task.key]
+            self.cond.notify_all()
+            return task
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class CallbackExecutor(object):
+    """
+    Run watch callbacks in a pool of worker threads
+
+    Events are sharded to the workers by the hash of their key,
+    so the callbacks of the events of the same key are called in order.
+
+    Usage:
+
+    >>> executor = CallbackExecutor(workers=4, maxsize=1000, overflow=Overflow.COALESCE)
+    >>> w = client.Watcher(prefix=True, key='/config', executor=executor)
+    >>> w.onEvent(reload_config)
+    >>> w.runDaemon()
+    """
+
+    def __init__(self, workers=4, maxsize=1000, overflow=Overflow.BLOCK):
+        """
+        :type workers: int
+        :param workers: number of worker threads [default: 4]
+        :type maxsize: int
+        :param maxsize: max pending events of each worker [default: 1000]
+        :type overflow: Overflow
+        :param overflow: the policy to apply when the queue of a worker is full [default: Overflow.BLOCK]
+        """
+        if workers < 1:
+            raise ValueError("workers should be at least 1")
+        if maxsize < 1:
+            raise ValueError("maxsize should be at least 1")
+        self.workers = workers
+        self.maxsize = maxsize
+        self.overflow = Overflow(overflow)
+        self._queues = [_WorkerQueue(maxsize, self.overflow) for _ in range(workers)]
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._stat_lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.max_queue_depth = 0
+        self.callback_latency = LatencyStat()
+        self.queue_latency = LatencyStat()
+
+    @property
+    def running(self):
+        return bool(self._threads)
+
+    def start(self):
+        """
+        Start the worker threads, it will be called on the first submit if not started yet
+        """
+        with self._start_lock:
+            if self._threads:
+                return
+            for i, q in enumerate(self._queues):
+                t = threading.Thread(target=self._work, args=(q,), name='etcd3-callback-%d' % i)
+                t.setDaemon(True)
+                t.start()
+                self._threads.append(t)
+
+    def shard(self, key):
+        """
+        Get the index of the worker that handles the key
+        """
+        return hash(key) % self.workers
+
+    def submit(self, event, callbacks):
+        """
+        Queue the callbacks of an event
+
+        :param event: Event
+        :type callbacks: list of callable
+        :param callbacks: the callbacks to call with the event
+        """
+        if not self._threads:
+            self.start()
+        q = self._queues[self.shard(event.key)]
+        dropped, coalesced = q.put(_Task(event.key, event, callbacks))
+        with self._stat_lock:
+            self.submitted += 1
+            self.dropped += dropped
+            self.coalesced += coalesced
+            depth = self.queue_depth()
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+
+    def _work(self, q):
+        while True:
+            task = q.get()
+            if task is None:
+                return
+            start = time.time()
+            self.queue_latency.observe(start - task.enqueued)
+            for cb in task.callbacks:
+                t = time.time()
+                try:
+                    cb(task.event)
+                except Exception:
+                    log.exception("watch callback raised an error")
+                    with self._stat_lock:
+                        self.errors += 1
+                self.callback_latency.observe(time.time() - t)
+            with self._stat_lock:
+                self.completed += 1
+
+    def queue_depth(self):
+        """
+        :return: the number of pending events of all the workers
+        """
+        return sum(len(q) for q in self._queues)
+
+    def stats(self):
+        """
+        Snapshot of the executor metrics
+
+        :return: dict
+        """
+        with self._stat_lock:
+            rt = {
+                'workers': self.workers,
+                'overflow': self.overflow.value,
+                'queue_depth': self.queue_depth(),
+                'max_queue_depth': self.max_queue_depth,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'dropped': self.dropped,
+                'coalesced': self.coalesced,
+                'errors': self.errors,
+            }
+        rt['callback_latency'] = self.callback_latency.snapshot()
+        rt['queue_latency'] = self.queue_latency.snapshot()
+        return rt
+
+    def shutdown(self, wait=True):
+        """
+        Stop the workers after the pending events are handled
+
+        :type wait: bool
+        :param wait: whether to wait the workers to exit
+        """
+        for q in self._queues:
+            q.close()
+        if wait:
+            for t in self._threads:
+                if t.is_alive() and t is not threading.current_thread():
+                    t.join()
+        self._threads = []
+        self._queues = [_WorkerQueue(self.maxsize, self.overflow) for _ in range(self.workers)]
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
@@ -0,0 +1,344 @@
+"""
+Fan watch events out to a pool of worker processes
+"""
+import multiprocessing
+import pickle
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from ..utils import log
+
+try:
+    from multiprocessing.connection import wait as _wait_conns
+except ImportError:  # pragma: no cover
+    def _wait_conns(conns, timeout):
+        deadline = time.time() + timeout
+        while True:
+            ready = [c for c in conns if c.poll()]
+            if ready or time.time() >= deadline:
+                return ready
+            time.sleep(0.005)
+
+_PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+
+def _worker_main(conn, handler, initializer):
+    """
+    Main loop of a worker process: receive batches, call the handler with every event, ack the batch
+    """
+    if initializer is not None:
+        initializer()
+    while True:
+        try:
+            seq, events = pickle.loads(conn.recv_bytes())
+        except (EOFError, OSError):
+            return
+        if seq is None:
+            return
+        errors = 0
+        for event in events:
+            try:
+                handler(event)
+            except Exception:
+                log.exception("event handler raised an error in worker process")
+                errors += 1
+        conn.send((seq, errors))
+
+
+class _Worker(object):
+    """
+    A worker process with its pipe, pending buffer and unacked batches
+    """
+
+    def __init__(self, dispatcher, index):
+        self.dispatcher = dispatcher
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.lock = threading.Lock()  # guards buffer, unacked and the counters
+        self.send_lock = threading.RLock()  # keeps the batches in order on the pipe
+        self.not_full = threading.Condition(self.lock)
+        self.buffer = []
+        self.buffered_at = None
+        self.unacked = OrderedDict()  # seq -> (pickled batch, event count)
+        self.pending = 0  # events buffered or unacked
+        self.seq = 0
+
+    def start(self):
+        d = self.dispatcher
+        parent_conn, child_conn = d.context.Pipe()
+        p = d.context.Process(target=_worker_main, args=(child_conn, d.handler, d.initializer),
+                              name='etcd3-fanout-%d' % self.index)
+        p.daemon = True
+        p.start()
+        child_conn.close()
+        self.process, self.conn = p, parent_conn
+
+    def stop(self, timeout=None):
+        with self.send_lock:
+            try:
+                self.conn.send_bytes(pickle.dumps((None, None), _PROTOCOL))
+            except (IOError, OSError):
+                pass
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.conn.close()
+
+    def restart(self):
+        """
+        Start a new process and resend the unacked batches in order
+        """
+        with self.send_lock:
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process.join()
+            exitcode = self.process.exitcode
+            self.conn.close()
+            self.start()
+            with self.lock:
+                batches = list(self.unacked.values())
+            log.warning("fanout worker %d exited (exitcode: %s), restarted and resending %d batches" % (
+                self.index, exitcode, len(batches)))
+            for data, _ in batches:
+                self.conn.send_bytes(data)
+        self.dispatcher._count('restarts', 1)
+
+    def put(self, event, block=True):
+        with self.lock:
+            while block and self.pending >= self.dispatcher.max_pending:
+                self.not_full.wait(0.5)
+            self.buffer.append(event)
+            self.pending += 1
+            if self.buffered_at is None:
+                self.buffered_at = time.time()
+            full = len(self.buffer) >= self.dispatcher.batch_size
+        if full:
+            self.flush()
+
+    def flush(self, blocking=True):
+        """
+        Send the buffered events as one batch
+
+        :return: False if not blocking and another thread is sending
+        """
+        if not self.send_lock.acquire(blocking):
+            return False
+        try:
+            with self.lock:
+                if not self.buffer:
+                    return True
+                events, self.buffer, self.buffered_at = self.buffer, [], None
+                self.seq += 1
+                seq = self.seq
+                data = pickle.dumps((seq, events), _PROTOCOL)
+                self.unacked[seq] = (data, len(events))
+            try:
+                self.conn.send_bytes(data)
+            except (IOError, OSError):  # the process is dead, the batch will be resent by restart
+                log.debug("failed sending batch %d to fanout worker %d" % (seq, self.index))
+                self.restart()
+            self.dispatcher._count('batches', 1)
+            return True
+        finally:
+            self.send_lock.release()
+
+    def on_ack(self, seq, errors):
+        with self.lock:
+            _, count = self.unacked.pop(seq, (None, 0))
+            self.pending -= count
+            self.not_full.notify_all()
+        self.dispatcher._count('acked', count)
+        self.dispatcher._count('errors', errors)
+
+
+class ProcessDispatcher(object):
+    """
+    Dispatch watch events to the handler running in a pool of worker processes,
+    so CPU-bound handlers are not limited by the GIL of the watching process
+
+    Events are sharded to the workers by the crc32 of the key, so the events of the same key
+    are handled in order. Events are sent in pickled batches through pipes, and kept until
+    the worker acks the batch. If a worker dies, it's restarted and the unacked batches are
+    resent in order, so events are delivered at least once.
+
+    The handler (and initializer) must be picklable, e.g. a module level function.
+
+    Usage:
+
+    >>> dispatcher = ProcessDispatcher(rebuild_route, processes=4)
+    >>> w = client.Watcher(prefix=True, key='/routes')
+    >>> w.onEvent(dispatcher)
+    >>> w.runDaemon()
+    >>> ...
+    >>> w.stop()
+    >>> dispatcher.shutdown()
+    """
+
+    def __init__(self, handler, processes=None, batch_size=100, batch_ms=5, max_pending=10000, initializer=None,
+                 context=None):
+        """
+        :type handler: callable
+        :param handler: called with every Event in the worker processes
+        :type processes: int
+        :param processes: number of worker processes [default: cpu count]
+        :type batch_size: int
+        :param batch_size: max events in a batch [default: 100]
+        :type batch_ms: int
+        :param batch_ms: max milliseconds an event waits in the buffer before its batch is sent [default: 5]
+        :type max_pending: int
+        :param max_pending: max buffered and unacked events of a worker, dispatch blocks when exceeded [default: 10000]
+        :type initializer: callable
+        :param initializer: called once when a worker process starts [default: None]
+        :param context: the multiprocessing context used to start the processes [default: multiprocessing]
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        if processes < 1:
+            raise ValueError("processes should be at least 1")
+        self.handler = handler
+        self.processes = processes
+        self.batch_size = batch_size
+        self.batch_window = batch_ms / 1000.0
+        self.max_pending = max_pending
+        self.initializer = initializer
+        self.context = context or multiprocessing
+        self._workers = [_Worker(self, i) for i in range(processes)]
+        self._thread = None
+        self._running = False
+        self._start_lock = threading.Lock()
+        self._stat_lock = threading.Lock()
+        self._stats = {'dispatched': 0, 'acked': 0, 'batches': 0, 'errors': 0, 'restarts': 0}
+
+    def _count(self, name, n):
+        with self._stat_lock:
+            self._stats[name] += n
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        """
+        Start the worker processes, it will be called on the first dispatch if not started yet
+        """
+        with self._start_lock:
+            if self._running:
+                return
+            for worker in self._workers:
+                worker.start()
+            self._running = True
+            t = self._thread = threading.Thread(target=self._loop, name='etcd3-fanout')
+            t.setDaemon(True)
+            t.start()
+
+    def shard(self, key):
+        """
+        Get the index of the worker that handles the key
+        """
+        return (zlib.crc32(key) & 0xffffffff) % self.processes
+
+    def dispatch(self, event, block=True):
+        """
+        Queue the event to its worker
+
+        :param event: Event
+        :type block: bool
+        :param block: wait if the worker has max_pending events [default: True]
+        """
+        if not self._running:
+            self.start()
+        self._workers[self.shard(event.key)].put(event, block)
+        self._count('dispatched', 1)
+
+    __call__ = dispatch
+
+    def flush(self):
+        """
+        Send all the buffered events now
+        """
+        for worker in self._workers:
+            worker.flush()
+
+    def _loop(self):
+        while self._running:
+            conns = dict((w.conn, w) for w in self._workers)
+            try:
+                ready = _wait_conns(list(conns), self.batch_window or 0.05)
+            except (IOError, OSError, ValueError):  # closed by a restart in another thread
+                continue
+            for conn in ready:
+                worker = conns[conn]
+                try:
+                    seq, errors = conn.recv()
+                except (EOFError, IOError, OSError):
+                    if self._running and conn is worker.conn:
+                        worker.restart()
+                    continue
+                worker.on_ack(seq, errors)
+            now = time.time()
+            for worker in self._workers:
+                if worker.buffered_at is not None and now - worker.buffered_at >= self.batch_window:
+                    worker.flush(blocking=False)
+                if self._running and not worker.process.is_alive():
+                    worker.restart()
+
+    def pending(self):
+        """
+        :return: the number of events that are buffered or not acked yet
+        """
+        return sum(w.pending for w in self._workers)
+
+    def join(self, timeout=None):
+        """
+        Wait until all the dispatched events are handled
+
+        :return: True if all the events are handled
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        self.flush()
+        while self.pending():
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self):
+        """
+        Snapshot of the dispatcher metrics
+
+        :return: dict
+        """
+        with self._stat_lock:
+            rt = dict(self._stats)
+        rt['processes'] = self.processes
+        rt['pending'] = self.pending()
+        return rt
+
+    def shutdown(self, wait=True, timeout=None):
+        """
+        Stop the worker processes
+
+        :type wait: bool
+        :param wait: wait the dispatched events to be handled before stopping [default: True]
+        :type timeout: float
+        :param timeout: max seconds to wait [default: None]
+        """
+        if not self._running:
+            return
+        if wait:
+            self.join(timeout)
+        self._running = False
+        if self._thread and self._thread.is_alive():
+            self._thread.join()
+        for worker in self._workers:
+            worker.stop(timeout)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
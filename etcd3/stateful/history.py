@@ -0,0 +1,185 @@
+"""
+Read-only views of the key-value store at historical revisions, with the results memoized
+"""
+import threading
+
+import six
+
+from ..errors import ErrCompacted
+from ..utils import OrderedDictEx
+from ..utils import bytes_types
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+_ENTRY_OVERHEAD = 256  # the approximate bytes of a cached response besides its keys and values
+_KV_OVERHEAD = 128  # the approximate bytes of a key-value besides its key and value
+
+
+def _freeze(v):
+    if isinstance(v, six.text_type):
+        return v.encode('utf-8')
+    if isinstance(v, bytearray):
+        return bytes(v)
+    return v
+
+
+def _response_size(r):
+    size = _ENTRY_OVERHEAD
+    for kv in r.kvs or ():
+        size += _KV_OVERHEAD + len(kv.key or b'')
+        value = getattr(kv, 'value', None)
+        if isinstance(value, bytes_types):
+            size += len(value)
+    return size
+
+
+class HistoryCache(object):
+    """
+    Bounded LRU cache of the range responses at historical revisions
+
+    A response at a revision never changes until the revision is compacted, so the entries are only
+    dropped by the LRU bounds or a compaction.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        :type max_entries: int
+        :param max_entries: max cached responses [default: 1000]
+        :type max_bytes: int
+        :param max_bytes: max approximate bytes of the cached responses [default: 64MiB]
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDictEx()  # (revision, params) -> (response, size)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    @staticmethod
+    def make_key(revision, params):
+        return revision, tuple(sorted((k, _freeze(v)) for k, v in params.items() if v is not None))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[0]
+
+    def put(self, key, response):
+        size = _response_size(response)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (response, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self._stats['evictions'] += 1
+
+    def compacted(self, revision):
+        """
+        Drop the entries before the compacted revision
+
+        :type revision: int
+        :param revision: the compacted revision, the entries at lower revisions are dropped
+        """
+        with self._lock:
+            for key in [k for k in self._entries if k[0] < revision]:
+                self.bytes -= self._entries.pop(key)[1]
+                self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """
+        :return: dict of hits, misses, evictions, invalidations, entries, bytes and hit_rate
+        """
+        with self._lock:
+            rt = dict(self._stats)
+            rt['entries'] = len(self._entries)
+            rt['bytes'] = self.bytes
+        reads = rt['hits'] + rt['misses']
+        rt['hit_rate'] = float(rt['hits']) / reads if reads else 0.0
+        return rt
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RevisionView(object):
+    """
+    Read-only view of the key-value store at a revision, the range results are memoized in the
+    HistoryCache of the client
+
+    The cached responses are shared by the reads of the same range, they should not be modified.
+
+    Usage:
+
+    >>> view = client.at(1234)
+    >>> view.range('/config/', prefix=True).kvs
+    >>> view.get('/config/db')
+    """
+
+    def __init__(self, client, revision, cache):
+        """
+        :type client: BaseClient
+        :param client: client instance of etcd3
+        :type revision: int
+        :param revision: the revision to read at
+        :type cache: HistoryCache
+        :param cache: the cache of the results
+        """
+        if not revision or revision < 1:
+            raise ValueError("revision should be a positive int")
+        self.client = client
+        self.revision = revision
+        self.cache = cache
+
+    def range(self, key=None, **kwargs):
+        """
+        Range at the revision of the view, accepts the params of KVAPI.range except revision and txn_obj
+
+        :return: the response of range, may be shared with the other reads
+        """
+        if 'revision' in kwargs or 'txn_obj' in kwargs:
+            raise TypeError("revision and txn_obj are not allowed in a revision view")
+        kwargs['key'] = key
+        cache_key = self.cache.make_key(self.revision, kwargs)
+        r = self.cache.get(cache_key)
+        if r is not None:
+            return r
+        try:
+            r = self.client.range(revision=self.revision, **kwargs)
+        except ErrCompacted:
+            self.cache.compacted(self.revision + 1)
+            raise
+        self.cache.put(cache_key, r)
+        return r
+
+    def get(self, key):
+        """
+        :return: the value of the key at the revision, None if not exists
+        """
+        kvs = self.range(key).kvs
+        return kvs[0].value if kvs else None
+
+    def get_prefix(self, prefix, keys_only=False):
+        """
+        :return: list of the key-values of the prefix at the revision
+        """
+        return list(self.range(prefix, prefix=True, keys_only=keys_only or None).kvs or ())
+
+    def __repr__(self):
+        return "<RevisionView at revision %d>" % self.revision
@@ -0,0 +1,364 @@
+"""
+List and watch a prefix into a local store in key order, with secondary indexes and event handlers
+"""
+import bisect
+import threading
+
+from .planner import prefix_range_end
+from .planner import to_bytes
+from .watch import Watcher
+from ..errors import Etcd3WatchCanceled
+from ..errors import Etcd3WatchCompacted
+from ..models import EventEventType as EventType
+from ..utils import get_ident
+from ..utils import log
+
+RELIST_INTERVAL = 0.2  # the same interval as Watcher's re-watch
+MAX_RELIST_INTERVAL = 30
+
+
+def _index_values(v):
+    if v is None:
+        return ()
+    if isinstance(v, (list, tuple, set, frozenset)):
+        return v
+    return (v,)
+
+
+class Informer(object):
+    """
+    Keep all the keys of a prefix in memory: list the prefix once, then apply the watch events incrementally
+
+    The store is kept in key order so ranges can be scanned locally, and the objects can be looked up by
+    user defined secondary indexes. If the watch is canceled, the prefix is re-listed and the difference
+    is delivered to the handlers as add/update/delete: right away if its revision has been compacted,
+    after a backoff doubling up to 30 seconds for the other reasons (e.g. permission denied).
+
+    Usage:
+
+    >>> inf = client.Informer('/pods/', decode=json.loads, indexers={'node': lambda key, pod: pod['node']})
+    >>> inf.add_handler(on_add=lambda key, pod: ..., on_delete=lambda key, pod: ...)
+    >>> inf.runDaemon()
+    >>> inf.wait_synced()
+    >>> inf.get('/pods/a')
+    >>> inf.by_index('node', 'node-1')
+    >>> inf.scan('/pods/a', '/pods/m')
+    >>> inf.stop()
+    """
+
+    def __init__(self, client, prefix, decode=None, indexers=None, max_retries=-1):
+        """
+        :type client: BaseClient
+        :param client: client instance of etcd3
+        :type prefix: str or bytes
+        :param prefix: the key prefix
+        :type decode: callable
+        :param decode: decode the value (bytes) to the object kept in the store [default: keep the bytes]
+        :type indexers: dict
+        :param indexers: {index name: callable(key, obj)} returns the index value (or a list of them) of the object
+        :type max_retries: int
+        :param max_retries: max retries of the watch, and of the re-lists in a row when the watch is canceled
+            for a reason other than compaction, -1 means no limit [default: -1]
+        """
+        self.client = client
+        self.prefix = to_bytes(prefix)
+        self.decode = decode
+        self.indexers = dict(indexers or {})
+        self.max_retries = max_retries
+        self.watcher = None
+        self.revision = None  # the revision the store reflects
+        self.relists = 0
+        self._keys = []  # sorted
+        self._items = {}  # key -> (KeyValue, obj)
+        self._indexes = dict((name, {}) for name in self.indexers)  # name -> {index value: set of keys}
+        self._handlers = []
+        self._lock = threading.RLock()
+        self._synced = threading.Event()
+        self._running = False
+        self._stopping = threading.Event()
+        self._thread = None
+
+    # store
+
+    def _index(self, key, obj, remove=False):
+        for name, indexer in self.indexers.items():
+            index = self._indexes[name]
+            try:
+                values = _index_values(indexer(key, obj))
+            except Exception:
+                log.exception("indexer '%s' raised an error on key '%s'" % (name, key))
+                continue
+            for v in values:
+                if remove:
+                    keys = index.get(v)
+                    if keys is not None:
+                        keys.discard(key)
+                        if not keys:
+                            del index[v]
+                else:
+                    index.setdefault(v, set()).add(key)
+
+    def _set(self, kv):
+        """
+        :return: the old object if updated, None if added
+        """
+        key = kv.key
+        obj = self.decode(kv.value) if self.decode and kv.value is not None else kv.value
+        old = self._items.get(key)
+        if old is None:
+            bisect.insort(self._keys, key)
+        else:
+            self._index(key, old[1], remove=True)
+        self._items[key] = (kv, obj)
+        self._index(key, obj)
+        return old
+
+    def _delete(self, key):
+        """
+        :return: the deleted (KeyValue, obj), None if not exists
+        """
+        old = self._items.pop(key, None)
+        if old is not None:
+            del self._keys[bisect.bisect_left(self._keys, key)]
+            self._index(key, old[1], remove=True)
+        return old
+
+    def get(self, key, default=None):
+        """
+        :return: the object of the key
+        """
+        item = self._items.get(to_bytes(key))
+        return default if item is None else item[1]
+
+    def get_kv(self, key):
+        """
+        :return: the KeyValue of the key, None if not exists
+        """
+        item = self._items.get(to_bytes(key))
+        return None if item is None else item[0]
+
+    def keys(self, start=None, end=None):
+        """
+        The keys in [start, end) in order
+
+        :type start: str or bytes
+        :param start: the first key, None means from the first key of the store
+        :type end: str or bytes
+        :param end: the key after the last one, None means to the last key of the store
+        :return: list of bytes
+        """
+        with self._lock:
+            lo = 0 if start is None else bisect.bisect_left(self._keys, to_bytes(start))
+            hi = len(self._keys) if end is None else bisect.bisect_left(self._keys, to_bytes(end))
+            return self._keys[lo:hi]
+
+    def scan(self, start=None, end=None):
+        """
+        The (key, object) pairs of the keys in [start, end) in order
+        """
+        with self._lock:
+            return [(k, self._items[k][1]) for k in self.keys(start, end)]
+
+    def scan_prefix(self, prefix):
+        """
+        The (key, object) pairs of the keys start with the prefix in order
+        """
+        prefix = to_bytes(prefix)
+        return self.scan(prefix, prefix_range_end(prefix))
+
+    def by_index(self, name, value):
+        """
+        The (key, object) pairs of an index value in key order
+
+        :type name: str
+        :param name: the name of the index
+        :param value: the index value
+        """
+        with self._lock:
+            keys = sorted(self._indexes[name].get(value, ()))
+            return [(k, self._items[k][1]) for k in keys]
+
+    def index_values(self, name):
+        """
+        :return: list of the values of an index
+        """
+        with self._lock:
+            return list(self._indexes[name])
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return to_bytes(key) in self._items
+
+    # handlers
+
+    def add_handler(self, on_add=None, on_update=None, on_delete=None):
+        """
+        Add the handlers of the changes of the store
+
+        :type on_add: callable
+        :param on_add: called with (key, obj) when a key is added
+        :type on_update: callable
+        :param on_update: called with (key, old obj, new obj) when a key is updated
+        :type on_delete: callable
+        :param on_delete: called with (key, old obj) when a key is deleted
+        """
+        self._handlers.append((on_add, on_update, on_delete))
+
+    def _notify(self, changes):
+        for kind, args in changes:
+            for handlers in self._handlers:
+                handler = handlers[kind]
+                if handler is None:
+                    continue
+                try:
+                    handler(*args)
+                except Exception:
+                    log.exception("informer handler raised an error")
+
+    # list and watch
+
+    def relist(self):
+        """
+        List the prefix and replace the store, the differences are delivered to the handlers
+        """
+        r = self.client.range(self.prefix, prefix=True)
+        changes = []
+        with self._lock:
+            listed = set()
+            for kv in r.kvs or ():
+                listed.add(kv.key)
+                old = self._items.get(kv.key)
+                if old is not None and old[0].mod_revision == kv.mod_revision:
+                    continue
+                self._set(kv)
+                if old is None:
+                    changes.append((0, (kv.key, self._items[kv.key][1])))
+                else:
+                    changes.append((1, (kv.key, old[1], self._items[kv.key][1])))
+            for key in [k for k in self._keys if k not in listed]:
+                changes.append((2, (key, self._delete(key)[1])))
+            self.revision = r.header.revision
+        self.relists += 1
+        self._notify(changes)
+        self._synced.set()
+
+    def _initial_sync(self):
+        """
+        Get the store in sync before the first watch
+        """
+        self.relist()
+
+    def on_response(self, r):
+        """
+        Apply a watch response of the prefix to the store
+
+        :param r: WatchResponse
+        """
+        changes = []
+        with self._lock:
+            for event in r.events:
+                key = event.key
+                if event.type == EventType.DELETE:
+                    old = self._delete(key)
+                    if old is not None:
+                        changes.append((2, (key, old[1])))
+                    continue
+                old = self._items.get(key)
+                if old is not None and old[0].mod_revision >= event.mod_revision:
+                    continue
+                self._set(event)
+                if old is None:
+                    changes.append((0, (key, self._items[key][1])))
+                else:
+                    changes.append((1, (key, old[1], self._items[key][1])))
+            if r.events:
+                # the header is the current revision even while older events are still pending
+                self.revision = max(self.revision or 0, r.events[-1].mod_revision)
+            elif not r.created:  # progress notify, nothing pending before the header revision
+                self.revision = max(self.revision or 0, r.header.revision)
+        self._notify(changes)
+
+    def run(self):
+        """
+        List the prefix and watch it, re-list when the watch is canceled
+        """
+        self._running = True
+        self._stopping.clear()
+        sync = self._initial_sync
+        failures = 0  # re-lists in a row for the cancels other than compaction
+        try:
+            while self._running:
+                sync()
+                sync = self.relist
+                self.watcher = Watcher(self.client, key=self.prefix, prefix=True, start_revision=self.revision + 1,
+                                       max_retries=self.max_retries)
+                if not self._running:  # stopped while listing
+                    return
+                try:
+                    with self.watcher:
+                        for r in self.watcher.iter_responses():
+                            if 'compact_revision' in r and r.compact_revision > 0:
+                                raise Etcd3WatchCompacted("compacted", r, r.compact_revision)
+                            if r.events:
+                                failures = 0
+                            self.on_response(r)
+                except Etcd3WatchCompacted as e:
+                    log.warning("informer watch of '%s' compacted (%s), re-listing" % (self.prefix, e.error))
+                    self.watcher.stop()
+                    failures = 0
+                    continue
+                except Etcd3WatchCanceled as e:
+                    self.watcher.stop()
+                    failures += 1
+                    if 0 <= self.max_retries < failures:
+                        log.error("informer watch of '%s' canceled (%s) %d times, giving up" %
+                                  (self.prefix, e.error, failures))
+                        raise
+                    interval = min(RELIST_INTERVAL * 2 ** (failures - 1), MAX_RELIST_INTERVAL)
+                    log.warning("informer watch of '%s' canceled (%s), re-listing in %.1fs" %
+                                (self.prefix, e.error, interval))
+                    self._stopping.wait(interval)
+                    continue
+                return
+        finally:
+            self._running = False
+
+    def runDaemon(self):
+        """
+        Run the informer in a daemon thread
+        """
+        t = self._thread = threading.Thread(target=self.run)
+        t.setDaemon(True)
+        t.start()
+
+    def wait_synced(self, timeout=None):
+        """
+        Wait until the first list is done
+
+        :return: True if synced
+        """
+        return self._synced.wait(timeout)
+
+    @property
+    def synced(self):
+        return self._synced.is_set()
+
+    def stop(self):
+        """
+        Stop watching, the store is kept as is
+        """
+        self._running = False
+        self._stopping.set()
+        if self.watcher is not None:
+            self.watcher.stop()
+        if self._thread and self._thread.is_alive() and self._thread.ident != get_ident():
+            self._thread.join()
+
+    def __enter__(self):
+        self.runDaemon()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
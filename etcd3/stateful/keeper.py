@@ -0,0 +1,308 @@
+"""
+Keep many leases alive from one thread, refreshing the due ones in batches over the keepalive stream
+"""
+import heapq
+import random
+import threading
+import time
+
+import six
+
+from ..utils import get_ident
+from ..utils import log
+
+DEFAULT_FRACTION = 1 / 3.0
+DEFAULT_JITTER = 0.1
+DEFAULT_BATCH_WINDOW = 0.05  # seconds
+DEFAULT_MAX_BATCH = 500
+DEFAULT_RETRY_INTERVAL = 0.5  # seconds
+
+
+class _KeptLease(object):
+    __slots__ = ('ID', 'ttl', 'deadline', 'on_keep', 'on_expire')
+
+    def __init__(self, ID, ttl, on_keep, on_expire):
+        self.ID = ID
+        self.ttl = ttl
+        self.deadline = None
+        self.on_keep = on_keep
+        self.on_expire = on_expire
+
+
+class KeepSchedule(object):
+    """
+    Deadline heap of the leases to refresh, shared by the sync and async keepers (not thread-safe)
+    """
+
+    def __init__(self, fraction=DEFAULT_FRACTION, jitter=DEFAULT_JITTER):
+        """
+        :type fraction: float
+        :param fraction: refresh a lease after this fraction of its TTL [default: 1/3]
+        :type jitter: float
+        :param jitter: refresh up to this fraction of the interval earlier, at random [default: 0.1]
+        """
+        if not 0 < fraction < 1:
+            raise ValueError("fraction should be in (0, 1)")
+        self.fraction = fraction
+        self.jitter = jitter
+        self.leases = {}  # ID -> _KeptLease
+        self._heap = []  # (deadline, ID)
+
+    def __len__(self):
+        return len(self.leases)
+
+    def __contains__(self, ID):
+        return ID in self.leases
+
+    def _push(self, lease, deadline):
+        lease.deadline = deadline
+        heapq.heappush(self._heap, (deadline, lease.ID))
+
+    def add(self, ID, ttl, on_keep=None, on_expire=None, now=None):
+        now = time.time() if now is None else now
+        lease = self.leases[ID] = _KeptLease(ID, ttl, on_keep, on_expire)
+        self.schedule(lease, now)
+
+    def remove(self, ID):
+        return self.leases.pop(ID, None)  # the heap entry is dropped when it's popped
+
+    def schedule(self, lease, now, ttl=None):
+        if ttl is not None:
+            lease.ttl = ttl
+        interval = lease.ttl * self.fraction
+        self._push(lease, now + interval * (1 - self.jitter * random.random()))
+
+    def retry(self, lease, now, delay):
+        self._push(lease, now + delay)
+
+    def next_deadline(self):
+        """
+        :return: the earliest deadline, None if no lease
+        """
+        heap = self._heap
+        while heap:
+            deadline, ID = heap[0]
+            lease = self.leases.get(ID)
+            if lease is not None and lease.deadline == deadline:
+                return deadline
+            heapq.heappop(heap)  # removed or rescheduled
+
+    def pop_due(self, until, max_batch):
+        """
+        :return: list of the _KeptLease whose deadline is before until
+        """
+        due = []
+        while len(due) < max_batch:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > until:
+                break
+            _, ID = heapq.heappop(self._heap)
+            lease = self.leases[ID]
+            lease.deadline = None
+            due.append(lease)
+        return due
+
+
+def keepalive_body(leases):
+    """
+    :return: the body of a keepalive stream request refreshing the leases
+    """
+    return b''.join(b'{"ID":%d}\n' % lease.ID for lease in leases)
+
+
+def parse_keepalive(data):
+    """
+    :param data: dict decoded from a frame of the keepalive stream
+    :return: (ID, TTL), TTL <= 0 means the lease is expired
+    """
+    result = data.get('result', data)
+    return int(result.get('ID', 0)), int(result.get('TTL', 0))
+
+
+class LeaseKeeper(object):
+    """
+    Keep many leases alive from one thread
+
+    The leases are kept in a deadline heap and refreshed after a fraction of their TTL (minus a random
+    jitter), the leases due within batch_window are refreshed together by one request of the streaming
+    keepalive api. A lease found expired is dropped and its on_expire callback is called.
+
+    Usage:
+
+    >>> keeper = client.LeaseKeeper(on_expire=lambda ID: log.warning('lease %d expired' % ID))
+    >>> keeper.start()
+    >>> keeper.add(lease_id, ttl)
+    >>> keeper.remove(lease_id)
+    >>> keeper.stop()
+    """
+
+    def __init__(self, client, fraction=DEFAULT_FRACTION, jitter=DEFAULT_JITTER, batch_window=DEFAULT_BATCH_WINDOW,
+                 max_batch=DEFAULT_MAX_BATCH, on_expire=None, retry_interval=DEFAULT_RETRY_INTERVAL):
+        """
+        :type client: Client
+        :param client: client instance of etcd3
+        :type fraction: float
+        :param fraction: refresh a lease after this fraction of its TTL [default: 1/3]
+        :type jitter: float
+        :param jitter: refresh up to this fraction of the interval earlier, at random [default: 0.1]
+        :type batch_window: float
+        :param batch_window: the leases due within these seconds are refreshed in the same batch [default: 0.05]
+        :type max_batch: int
+        :param max_batch: max leases refreshed by one request [default: 500]
+        :type on_expire: callable
+        :param on_expire: called with the lease ID when a lease is found expired [default: None]
+        :type retry_interval: float
+        :param retry_interval: seconds to retry the leases of a failed batch [default: 0.5]
+        """
+        self.client = client
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.on_expire = on_expire
+        self.retry_interval = retry_interval
+        self.schedule = KeepSchedule(fraction, jitter)
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._stats = {'refreshed': 0, 'expired': 0, 'batches': 0, 'errors': 0}
+
+    def add(self, ID, ttl, on_keep=None, on_expire=None):
+        """
+        Keep a lease alive
+
+        :type ID: int
+        :param ID: the lease ID
+        :type ttl: int
+        :param ttl: the granted TTL of the lease
+        :type on_keep: callable
+        :param on_keep: called with the TTL after every refresh [default: None]
+        :type on_expire: callable
+        :param on_expire: called with the lease ID when the lease is found expired [default: the keeper's]
+        """
+        with self._cond:
+            self.schedule.add(ID, ttl, on_keep, on_expire)
+            self._cond.notify()
+
+    def remove(self, ID):
+        """
+        Stop keeping a lease alive
+        """
+        with self._cond:
+            self.schedule.remove(ID)
+
+    def __len__(self):
+        return len(self.schedule)
+
+    def __contains__(self, ID):
+        return ID in self.schedule
+
+    def _count(self, name, n=1):
+        with self._cond:
+            self._stats[name] += n
+
+    def refresh(self, leases):
+        """
+        Refresh the leases by one request of the keepalive stream, and reschedule them
+        """
+        pending = dict((lease.ID, lease) for lease in leases)
+        callbacks = []
+        self._count('batches')
+        try:
+            with self.client.lease_keep_alive(keepalive_body(leases)) as r:
+                for data in r.iter_data():
+                    ID, ttl = parse_keepalive(data)
+                    lease = pending.pop(ID, None)
+                    if lease is not None:
+                        callbacks.append(self._on_response(lease, ttl))
+                    if not pending:
+                        break
+        except Exception:
+            log.exception("failed refreshing %d leases, retrying in %ss" % (len(pending), self.retry_interval))
+            self._count('errors')
+        finally:
+            now = time.time()
+            with self._cond:
+                for lease in six.itervalues(pending):
+                    if self.schedule.leases.get(lease.ID) is lease:
+                        self.schedule.retry(lease, now, self.retry_interval)
+        for cb, arg in callbacks:
+            if cb is None:
+                continue
+            try:
+                cb(arg)
+            except Exception:
+                log.exception("lease keeper callback raised an error")
+
+    def _on_response(self, lease, ttl):
+        """
+        :return: (callback, arg) to call out of the lock
+        """
+        with self._cond:
+            if self.schedule.leases.get(lease.ID) is not lease:  # removed while refreshing
+                return None, None
+            if ttl <= 0:
+                self.schedule.remove(lease.ID)
+                self._stats['expired'] += 1
+                log.debug("lease %d expired" % lease.ID)
+                return lease.on_expire or self.on_expire, lease.ID
+            self.schedule.schedule(lease, time.time(), ttl)
+            self._stats['refreshed'] += 1
+            return lease.on_keep, ttl
+
+    def run(self):
+        """
+        Refresh the due leases until stopped
+        """
+        self._running = True
+        while self._running:
+            with self._cond:
+                while self._running:
+                    deadline = self.schedule.next_deadline()
+                    now = time.time()
+                    if deadline is not None and deadline <= now:
+                        break
+                    self._cond.wait(None if deadline is None else deadline - now)
+                if not self._running:
+                    return
+                due = self.schedule.pop_due(now + self.batch_window, self.max_batch)
+            if due:
+                self.refresh(due)
+
+    def start(self):
+        """
+        Run the keeper in a daemon thread
+        """
+        with self._cond:
+            if self._thread and self._thread.is_alive():
+                return
+            self._running = True
+            t = self._thread = threading.Thread(target=self.run, name='etcd3-lease-keeper')
+            t.setDaemon(True)
+            t.start()
+
+    runDaemon = start
+
+    def stop(self):
+        """
+        Stop refreshing, the leases are not revoked
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread and self._thread.is_alive() and self._thread.ident != get_ident():
+            self._thread.join()
+
+    def stats(self):
+        """
+        :return: dict of leases, refreshed, expired, batches and errors
+        """
+        with self._cond:
+            rt = dict(self._stats)
+            rt['leases'] = len(self.schedule)
+        return rt
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
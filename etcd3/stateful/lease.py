@@ -38,6 +38,8 @@ class Lease(object):
         self._keepalive_cancel_cb_error = None
         self._keepalive_cancel_cb_exc_info = None
         self._thread = None
+        self._keeper = None
+        self._cancel_cb = None
         self._lock = threading.Condition()
 
     @property
@@ -108,7 +110,7 @@ class Lease(object):
 
     refresh = keepalive_once
 
-    def keepalive(self, keep_cb=None, cancel_cb=None):
+    def keepalive(self, keep_cb=None, cancel_cb=None, keeper=None):
         """
         Start a daemon thread to constantly keep the lease alive
 
@@ -116,12 +118,16 @@ class Lease(object):
         :param keep_cb: callback function that will be called after every refresh
         :type cancel_cb: callable
         :param cancel_cb: callback function that will be called after cancel keepalive
+        :type keeper: LeaseKeeper
+        :param keeper: keep the lease alive by the keeper instead of a thread of its own [default: None]
         """
         if self.keeping:
             raise RuntimeError("already keeping")
         self.keeping = True
         self._keepalive_error = None
         self._keepalive_exc_info = None
+        if keeper is not None:
+            return self._keepalive_by(keeper, keep_cb, cancel_cb)
 
         def keepalived():
             try:
@@ -158,6 +164,27 @@ class Lease(object):
         t.setDaemon(True)
         t.start()
 
+    def _keepalive_by(self, keeper, keep_cb, cancel_cb):
+        def on_keep(ttl):
+            self.last_keep = time.time()
+            if keep_cb:
+                try:
+                    keep_cb()
+                except Exception as e:
+                    log.exception("keep_cb() raised an error")
+                    self._keepalive_keep_cb_error = e
+                    self._keepalive_keep_cb_exc_info = sys.exc_info()
+
+        def on_expire(ID):
+            log.warning("lease %d expired while keeping alive" % ID)
+            self.cancel_keepalive(False)
+
+        self.last_keep = time.time()
+        self._keeper = keeper
+        self._cancel_cb = cancel_cb
+        keeper.add(self.ID, self.grantedTTL, on_keep=on_keep, on_expire=on_expire)
+        keeper.start()
+
     def cancel_keepalive(self, join=True):
         """
         stop keeping-alive
@@ -166,6 +193,17 @@ class Lease(object):
         :param join: whether to wait the keepalive thread to exit
         """
         self.keeping = False
+        keeper, self._keeper = self._keeper, None
+        if keeper is not None:
+            keeper.remove(self.ID)
+            if self._cancel_cb:
+                try:
+                    self._cancel_cb()
+                except Exception as e:
+                    log.exception("cancel_cb() raised an error")
+                    self._keepalive_cancel_cb_error = e
+                    self._keepalive_cancel_cb_exc_info = sys.exc_info()
+            return
         with self._lock:
             self._lock.notify_all()
         if join and self._thread and self._thread.is_alive():
@@ -177,6 +215,9 @@ class Lease(object):
         """
         if not self.keeping:
             return False
+        if self._keeper is not None:
+            interval = self.grantedTTL * self._keeper.schedule.fraction + self._keeper.retry_interval
+            return time.time() - self.last_keep > interval
         return time.time() - self.last_keep > self.grantedTTL / 4.0
 
     def revoke(self):
@@ -0,0 +1,231 @@
+"""
+Share leases among the keys requesting similar TTLs
+"""
+import bisect
+import threading
+
+import six
+
+from .planner import to_bytes
+from ..errors import ErrLeaseNotFound
+from ..utils import log
+
+DEFAULT_BUCKETS = (5, 10, 30, 60, 300)
+
+
+class _Bucket(object):
+    __slots__ = ('ttl', 'ID', 'keys')
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.ID = None
+        self.keys = set()
+
+
+class LeasePool(object):
+    """
+    Attach the keys to shared leases by TTL buckets instead of a lease per key
+
+    A key requesting a TTL goes to the largest bucket not longer than the TTL (or the smallest bucket),
+    so the key never outlives its owner longer than requested. The lease of a bucket is granted when
+    its first key is put, kept alive by one LeaseKeeper, and revoked when its last key is deleted or
+    moved to another bucket.
+
+    If the lease of a bucket is found expired, its keys are gone and on_lost is called with them,
+    the next put to the bucket grants a new lease.
+
+    Usage:
+
+    >>> with client.LeasePool() as pool:
+    ...     pool.put('/services/api/node1', 'addr', ttl=10)
+    ...     pool.move('/services/api/node1', ttl=60)
+    ...     pool.delete('/services/api/node1')
+    """
+
+    def __init__(self, client, buckets=DEFAULT_BUCKETS, keeper=None, on_lost=None):
+        """
+        :type client: Client
+        :param client: client instance of etcd3
+        :type buckets: list
+        :param buckets: the TTLs of the shared leases [default: (5, 10, 30, 60, 300)]
+        :type keeper: LeaseKeeper
+        :param keeper: keep the leases alive by this keeper, None means a keeper of the pool [default: None]
+        :type on_lost: callable
+        :param on_lost: called with the set of the keys whose lease is found expired [default: None]
+        """
+        if not buckets:
+            raise ValueError("at least one bucket is required")
+        self.client = client
+        self.buckets = sorted(set(max(2, int(ttl)) for ttl in buckets))
+        self.on_lost = on_lost
+        self._own_keeper = keeper is None
+        self.keeper = client.LeaseKeeper() if keeper is None else keeper
+        self._buckets = dict((ttl, _Bucket(ttl)) for ttl in self.buckets)
+        self._keys = {}  # key -> _Bucket
+        self._lock = threading.RLock()
+
+    def bucket_for(self, ttl):
+        """
+        :return: the TTL of the bucket for the requested TTL
+        """
+        i = bisect.bisect_right(self.buckets, ttl) - 1
+        return self.buckets[max(i, 0)]
+
+    def lease(self, ttl):
+        """
+        Get the shared lease of the bucket of the TTL, grant it if not granted yet
+
+        The keys attached by the caller (eg. in a transaction) should be recorded by attach,
+        or the lease may be revoked when the other keys of the bucket are gone.
+
+        :type ttl: int
+        :param ttl: the requested TTL
+        :return: int, the lease ID
+        """
+        with self._lock:
+            return self._grant(self._buckets[self.bucket_for(ttl)])
+
+    def _grant(self, bucket):
+        if bucket.ID is None:
+            r = self.client.lease_grant(bucket.ttl)
+            bucket.ID = r.ID
+            log.debug("granted lease %d for the bucket of TTL %d" % (r.ID, bucket.ttl))
+            self.keeper.add(r.ID, r.TTL, on_expire=lambda ID: self._expired(bucket, ID))
+            self.keeper.start()
+        return bucket.ID
+
+    def _revoke(self, bucket):
+        ID, bucket.ID = bucket.ID, None
+        if ID is None:
+            return
+        self.keeper.remove(ID)
+        try:
+            self.client.lease_revoke(ID)
+        except ErrLeaseNotFound:
+            pass
+        log.debug("revoked lease %d of the bucket of TTL %d" % (ID, bucket.ttl))
+
+    def _expired(self, bucket, ID):
+        with self._lock:
+            if bucket.ID != ID:
+                return
+            bucket.ID = None
+            lost, bucket.keys = bucket.keys, set()
+            for key in lost:
+                self._keys.pop(key, None)
+        log.warning("lease %d of the bucket of TTL %d expired, %d keys lost" % (ID, bucket.ttl, len(lost)))
+        if self.on_lost and lost:
+            self.on_lost(lost)
+
+    def attach(self, key, ttl):
+        """
+        Record a key attached to the lease of the bucket of the TTL by the caller
+        """
+        with self._lock:
+            self._attach(to_bytes(key), self._buckets[self.bucket_for(ttl)])
+
+    def _attach(self, key, bucket):
+        old = self._keys.get(key)
+        if old is bucket:
+            return
+        bucket.keys.add(key)
+        self._keys[key] = bucket
+        if old is not None:
+            self._detach(key, old)
+
+    def _detach(self, key, bucket):
+        bucket.keys.discard(key)
+        if not bucket.keys:
+            self._revoke(bucket)
+
+    def _put(self, key, bucket, **kwargs):
+        try:
+            r = self.client.put(key, lease=self._grant(bucket), **kwargs)
+        except ErrLeaseNotFound:  # expired before the keeper noticed
+            self._expired(bucket, bucket.ID)
+            r = self.client.put(key, lease=self._grant(bucket), **kwargs)
+        self._attach(key, bucket)
+        return r
+
+    def put(self, key, value, ttl, prev_kv=False):
+        """
+        Put a key attached to the shared lease of the bucket of the TTL
+
+        :type key: str or bytes
+        :param key: the key
+        :type value: str or bytes
+        :param value: the value
+        :type ttl: int
+        :param ttl: the requested TTL
+        :type prev_kv: bool
+        :param prev_kv: return the previous key-value in the response [default: False]
+        :return: the response of put
+        """
+        key = to_bytes(key)
+        with self._lock:
+            return self._put(key, self._buckets[self.bucket_for(ttl)], value=value, prev_kv=prev_kv)
+
+    def move(self, key, ttl):
+        """
+        Move a key to the bucket of another TTL, keeping its value
+        """
+        key = to_bytes(key)
+        with self._lock:
+            bucket = self._buckets[self.bucket_for(ttl)]
+            if self._keys.get(key) is bucket:
+                return
+            return self._put(key, bucket, value=None, ignore_value=True)
+
+    def delete(self, key):
+        """
+        Delete a key of the pool, the lease of its bucket is revoked if it was the last key
+        """
+        key = to_bytes(key)
+        with self._lock:
+            r = self.client.delete_range(key)
+            bucket = self._keys.pop(key, None)
+            if bucket is not None:
+                self._detach(key, bucket)
+            return r
+
+    def __contains__(self, key):
+        return to_bytes(key) in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def stats(self):
+        """
+        :return: dict of keys, leases and the key count of each bucket
+        """
+        with self._lock:
+            return {
+                'keys': len(self._keys),
+                'leases': sum(1 for b in six.itervalues(self._buckets) if b.ID is not None),
+                'buckets': dict((ttl, len(b.keys)) for ttl, b in six.iteritems(self._buckets))
+            }
+
+    def close(self, revoke=True):
+        """
+        Stop keeping the leases alive
+
+        :type revoke: bool
+        :param revoke: revoke the leases, which deletes their keys [default: True]
+        """
+        with self._lock:
+            for bucket in six.itervalues(self._buckets):
+                if revoke:
+                    self._revoke(bucket)
+                elif bucket.ID is not None:
+                    self.keeper.remove(bucket.ID)
+                    bucket.ID = None
+                bucket.keys.clear()
+            self._keys.clear()
+        if self._own_keeper:
+            self.keeper.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
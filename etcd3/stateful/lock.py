@@ -1,6 +1,7 @@
 import os
 import socket
 import tempfile
+import time
 import uuid
 
 import six
@@ -19,9 +20,14 @@ class EtcdLockAcquireTimeout(Exception):
     pass
 
 
-class Lock(object):  # TODO: maybe we could improve the performance by reduce some HTTP requests
+class Lock(object):
     """
     Locking recipe for etcd, inspired by the kazoo recipe for zookeeper
+
+    The lock key is attached to the lease of a Session, which is shared by the locks of the client with
+    the same TTL and kept alive by one LeaseKeeper. Acquiring a free lock takes one txn: put the lock key
+    (and the holders count of a reentrant lock) if it does not exist, else read it back. The holders count
+    of a reentrant lock is updated by compare-and-swap txns guarded by the owner of the lock key.
     """
 
     DEFAULT_LOCK_TTL = 60
@@ -30,7 +36,8 @@ class Lock(object):  # TODO: maybe we could improve the performance by reduce so
     PROCESS = 'process'
     THREAD = 'thread'
 
-    def __init__(self, client, lock_name, lock_ttl=DEFAULT_LOCK_TTL, reentrant=None, lock_prefix='_locks'):
+    def __init__(self, client, lock_name, lock_ttl=DEFAULT_LOCK_TTL, reentrant=None, lock_prefix='_locks',
+                 session=None):
         """
         :type client: BaseClient
         :param client: instance of etcd.Client
@@ -42,10 +49,14 @@ class Lock(object):  # TODO: maybe we could improve the performance by reduce so
         :param reentrant: the reentrant type of the lock can set to Lock.HOST, Lock.PROCESS, Lock.THREAD
         :type lock_prefix: str
         :param lock_prefix: the prefix of the lock key
+        :type session: Session
+        :param session: the session to attach the lock key to, None means the shared session of the client
+            with the lock_ttl [default: None]
         """
         self.client = client
         self.name = lock_name
-        self.lock_ttl = lock_ttl
+        self.session = session
+        self.lock_ttl = session.grantedTTL if session else lock_ttl
         self.lock_prefix = lock_prefix
         self.reentrant = reentrant
         self.uuid = self._get_uuid()
@@ -54,8 +65,9 @@ class Lock(object):  # TODO: maybe we could improve the performance by reduce so
         self.lock_key = "{}/{}".format(lock_prefix, lock_name)  # the key of the lock
         self.holders_key = self.lock_key + '/holders'  # the key of holders-count
         self.is_taken = False  # if the lock is taken by someone
-        self.lease = None
-        self.__holders_lease = None
+        self.lease = None  # the session holding the lock
+        self._held = False  # if the lock is held by this object
+        self._kept_lease = None  # the lease of a reentrant lock taken by another holder, kept alive while held
         self._watcher = None
         log.debug("Initiating lock for %s with uuid %s", self.lock_key, self.uuid)
 
@@ -90,13 +102,25 @@ class Lock(object):  # TODO: maybe we could improve the performance by reduce so
         r = self.client.range(self.lock_key).kvs
         return r[0] if r else None
 
-    def _holders_lease(self):
-        if self.__holders_lease:
-            return self.__holders_lease
-        locker = self._get_locker()
-        if locker:
-            self.__holders_lease = locker.lease
-        return self.__holders_lease
+    def _get_session(self):
+        if self.session is not None:
+            return self.session
+        return self.client.shared_session(self.lock_ttl)
+
+    @staticmethod
+    def _first_kv(response):
+        kvs = response.response_range.kvs
+        return kvs[0] if kvs else None
+
+    def _read(self):
+        """
+        :return: (kv of the lock, kv of the holders count) read by one txn
+        """
+        txn = self.client.Txn()
+        txn.Then(txn.range(self.lock_key))
+        txn.Then(txn.range(self.holders_key))
+        r = txn.commit()
+        return self._first_kv(r.responses[0]), self._first_kv(r.responses[1])
 
     def holders(self):
         """
@@ -109,46 +133,56 @@ class Lock(object):  # TODO: maybe we could improve the performance by reduce so
                 return 1
             return 0
         r = self.client.range(self.holders_key).kvs
-        if r is not None:
-            self.__holders_lease = r[0].lease
-            return int(r[0].value)
-        lease = self._holders_lease()
-        if lease:
-            try:
-                log.debug("try creating holders count key with lease %d" % lease)
-                self.client.put(self.holders_key, b'%d' % 0, lease=lease)
-            except ErrLeaseNotFound:
-                self.__holders_lease = None
-        return 0
+        return int(r[0].value) if r else 0
+
+    def _update_holders(self, delta, locker=None, holders=None):
+        """
+        Compare-and-swap the holders count while the lock is held by the uuid,
+        the lock is deleted with the count if it drops to 0
+
+        :return: the new count, None if the lock is not held by the uuid
+        """
+        if locker is None:
+            locker, holders = self._read()
+        while locker is not None and locker.value == self.uuid:
+            n = max(int(holders.value) if holders else 0, 0) + delta
+            txn = self.client.Txn()
+            txn.If(txn.key(self.lock_key).mod == locker.mod_revision)
+            if holders:
+                txn.If(txn.key(self.holders_key).mod == holders.mod_revision)
+            else:
+                txn.If(txn.key(self.holders_key).create == 0)
+            if n > 0:
+                txn.Then(txn.put(self.holders_key, b'%d' % n, lease=int(locker.lease or 0)))
+            else:
+                n = 0
+                txn.Then(txn.delete(self.lock_key))
+                txn.Then(txn.delete(self.holders_key))
+            txn.Else(txn.range(self.lock_key))
+            txn.Else(txn.range(self.holders_key))
+            r = txn.commit()
+            if r.succeeded:
+                return n
+            log.debug("holders count changed, retrying")
+            locker, holders = self._first_kv(r.responses[0]), self._first_kv(r.responses[1])
 
     def incr_holder(self):
         """
         Atomic increase the holder count by 1
         """
-        n = self.holders()
-        t = self.client.Txn()
-        t.If(t.key(self.holders_key).value == b'%d' % n)
-        t.Then(t.put(self.holders_key, b'%d' % (n + 1), lease=self._holders_lease()))
-        r = t.commit()
-        if r.succeeded:
-            return n + 1
-        log.debug("failed to incr holders count")
+        n = self._update_holders(1)
+        if n is None:
+            log.debug("failed to incr holders count")
+        return n
 
     def decr_holder(self):
         """
         Atomic decrease the holder count by 1
         """
-        n = self.holders() or 0
-        t = self.client.Txn()
-        t.If(t.key(self.holders_key).value == b'%d' % n)
-        if n - 1 == 0:
-            t.Then(t.delete(self.holders_key))
-        else:
-            t.Then(t.put(self.holders_key, b'%d' % (n - 1), lease=self._holders_lease()))
-        r = t.commit()
-        if r.succeeded:
-            return n - 1
-        log.debug("failed to decr holders count")
+        n = self._update_holders(-1)
+        if n is None:
+            log.debug("failed to decr holders count")
+        return n
 
     @property
     def is_acquired(self):
@@ -158,16 +192,53 @@ class Lock(object):  # TODO: maybe we could improve the performance by reduce so
         if not self.is_taken:
             log.debug("Lock not taken")
             return False
+        if not self._held:
+            return False
         locker = self._get_locker()
-        if locker:
-            self.is_taken = True
-        if locker and locker.value == self.uuid:
-            if self.lease and self.lease.keeping:
-                return True
-        return False
+        return bool(locker and locker.value == self.uuid and self.lease and self.lease.keeping)
 
     acquired = is_acquired
 
+    def _try_acquire(self, session):
+        """
+        Put the lock key if it does not exist, else read it back, by one txn
+
+        :return: (succeeded, kv of the lock, kv of the holders count, revision of the response)
+        """
+        ID = session.ID
+        txn = self.client.Txn()
+        txn.If(txn.key(self.lock_key).create == 0)
+        txn.Then(txn.put(self.lock_key, self.uuid, lease=ID))
+        txn.Else(txn.range(self.lock_key))
+        if self.reentrant:
+            txn.Then(txn.put(self.holders_key, b'1', lease=ID))
+            txn.Else(txn.range(self.holders_key))
+        try:
+            r = txn.commit()
+        except ErrLeaseNotFound:  # expired before the keeper noticed
+            session.lost(ID)
+            return self._try_acquire(session)
+        if r.succeeded:
+            return True, None, None, r.header.revision
+        holders = self._first_kv(r.responses[1]) if self.reentrant else None
+        return False, self._first_kv(r.responses[0]), holders, r.header.revision
+
+    def _keep(self, session, locker):
+        """
+        Keep the lease of the lock alive with the session if it's another one
+        """
+        ID = int(locker.lease)
+        if ID == session.ID:
+            return
+        r = self.client.lease_time_to_live(ID)
+        session.keep(ID, r.grantedTTL)
+        self._kept_lease = ID
+
+    def _unkeep(self):
+        ID, self._kept_lease = self._kept_lease, None
+        if ID is not None and self.lease is not None:
+            self.lease.unkeep(ID)
+
     def acquire(self, block=True, lock_ttl=None, timeout=None, delete_key=True):
         """
         Acquire the lock.
@@ -181,89 +252,78 @@ class Lock(object):  # TODO: maybe we could improve the performance by reduce so
         :type delete_key: bool
         :param delete_key: whether delete the key if it has not attached to any lease [default: True]
         """
-        lock_ttl = self.lock_ttl = lock_ttl or self.lock_ttl
-        locker = self._get_locker()
-        if locker:
+        if lock_ttl and self.session is None:
+            self.lock_ttl = lock_ttl
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            session = self._get_session()
+            succeeded, locker, holders, revision = self._try_acquire(session)
+            if succeeded:
+                log.debug("Lock key written, we got the lock")
+                break
             if not locker.lease:
                 if not delete_key:
-                    raise EtcdLockError("lock-key %s already exist but with no lease attached")
+                    raise EtcdLockError("lock-key %s already exist but with no lease attached" % self.lock_key)
                 log.debug("delete lock key that has no expiration")
                 self.client.delete_range(locker.key)
-            elif locker.value == self.uuid:
-                log.debug("we already have the lock")
-                if not (self.lease and self.lease.keeping):
-                    log.debug("we have the lock but not keeping it, now keep the lease alive")
-                    self.__holders_lease = None
-                    self.lease = self.client.Lease(self.lock_ttl, locker.lease, new=False)
-                    self.lease.grant()
-                    self.lease.keepalive()
-                    if self.reentrant:
-                        log.debug("the lock is reentrant, will incr its holders count")
-                        self.incr_holder()
-                    self.is_taken = True
-                return self
-            elif block:
-                event = self.wait(locker=locker, timeout=timeout)
-                if not event:
-                    log.debug("lock acquire wait timeout")
-                    raise EtcdLockAcquireTimeout
-            else:
+                continue
+            if locker.value == self.uuid:
+                if self._held:
+                    log.debug("we already have the lock")
+                    return self
+                if self.reentrant:
+                    log.debug("the lock is reentrant, will incr its holders count")
+                    if self._update_holders(1, locker, holders) is None:
+                        continue  # released meanwhile
+                self._keep(session, locker)
+                break
+            if not block:
                 self.is_taken = True
                 return
-        # locker key not found
-        log.debug("writing lock key to %s", self.lock_key)
-        if self.lease and self.lease.keeping:  # clean old lease that may exist
-            self.lease.revoke()
-            self.__holders_lease = None
-        self.lease = self.client.Lease(self.lock_ttl)
-        self.lease.grant()
-        txn = self.client.Txn()
-        txn.If(txn.key(self.lock_key).value == self.uuid)
-        txn.Else(txn.put(self.lock_key, self.uuid, lease=self.lease.ID))
-        r = txn.commit()
-        if r.succeeded:
-            return self.acquire(block, lock_ttl, timeout, delete_key)
-        else:
-            self.is_taken = True
-            self.lease.keepalive()
-            if self.reentrant:
-                log.debug("the lock is reentrant, will incr its holders count")
-                self.incr_holder()
-            log.debug("Lock key written, we got the lock")
+            remaining = None if deadline is None else deadline - time.time()
+            if (remaining is not None and remaining <= 0) or \
+                    not self.wait(locker=locker, timeout=remaining, revision=revision):
+                log.debug("lock acquire wait timeout")
+                raise EtcdLockAcquireTimeout
+        self.lease = session
+        self._held = self.is_taken = True
         log.debug("Lock acquired (lock_key: %s, value: %s)" % (self.lock_key, self.uuid))
         return self
 
-    def wait(self, locker=None, timeout=None):
+    def wait(self, locker=None, timeout=None, revision=None):
         """
         Wait until the lock is lock is able to acquire
 
         :param locker: kv of the lock
         :param timeout: wait timeout
+        :param revision: the revision the locker is read at, the events after it are watched [default: None]
         """
         locker = locker or self._get_locker()
         if not locker:
             return
-        self._watcher = watcher = self.client.Watcher(key=locker.key, max_retries=0)
+        self._watcher = watcher = self.client.Watcher(
+            key=locker.key, max_retries=0, start_revision=revision + 1 if revision else None)
         return watcher.watch_once(lambda e: e.type == EventType.DELETE or e.value == self.uuid, timeout=timeout)
 
     def release(self):
         """
         Release the lock
         """
+        if not self._held:
+            log.debug("Lock not held (lock_key: %s)" % self.lock_key)
+            return
         if self.reentrant:
             n = self.decr_holder()
-            if n is not None and n == 0:
-                self.lease.revoke()
-                self.lease = None
-                self.is_taken = False
-            else:
-                self.lease.cancel_keepalive(join=False)
-                self.lease = None
-                self.is_taken = True
+            self.is_taken = bool(n)
         else:
-            self.lease.revoke()
-            self.lease = None
+            txn = self.client.Txn()
+            txn.If(txn.key(self.lock_key).value == self.uuid)
+            txn.Then(txn.delete(self.lock_key))
+            txn.commit()
             self.is_taken = False
+        self._unkeep()
+        self.lease = None
+        self._held = False
         log.debug("Lock released (lock_key: %s, value: %s)" % (self.lock_key, self.uuid))
 
     def __enter__(self):
@@ -0,0 +1,264 @@
+"""
+Lightweight in-process metrics used by the stateful utils
+"""
+import threading
+import time
+from collections import deque
+
+
+class LatencyStat(object):
+    """
+    Thread-safe accumulator of durations (in seconds)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        """
+        Record a duration
+
+        :type seconds: float
+        :param seconds: the duration to record
+        """
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+
+    @property
+    def avg(self):
+        if not self.count:
+            return 0.0
+        return self.total / self.count
+
+    def snapshot(self):
+        """
+        :return: dict of count, total, avg and max
+        """
+        with self._lock:
+            return {
+                'count': self.count,
+                'total': self.total,
+                'avg': self.total / self.count if self.count else 0.0,
+                'max': self.max
+            }
+
+
+class RateMeter(object):
+    """
+    Thread-safe counter with the rate of a recent time window
+    """
+
+    def __init__(self, window=60):
+        """
+        :type window: int
+        :param window: seconds of the window to calculate the rate [default: 60]
+        """
+        self.window = window
+        self._lock = threading.Lock()
+        self._buckets = deque()  # [second, count] of the recent seconds
+        self.total = 0
+        self.started = time.time()
+
+    def mark(self, n=1):
+        """
+        Count n occurrences
+        """
+        now = int(time.time())
+        with self._lock:
+            self.total += n
+            if self._buckets and self._buckets[-1][0] == now:
+                self._buckets[-1][1] += n
+            else:
+                self._buckets.append([now, n])
+            self._trim(now)
+
+    def _trim(self, now):
+        while self._buckets and self._buckets[0][0] <= now - self.window:
+            self._buckets.popleft()
+
+    def rate(self):
+        """
+        :return: occurrences per second in the recent window
+        """
+        now = time.time()
+        with self._lock:
+            self._trim(int(now))
+            count = sum(c for _, c in self._buckets)
+        elapsed = min(self.window, now - self.started)
+        if elapsed <= 0:
+            return 0.0
+        return count / elapsed
+
+    def snapshot(self):
+        """
+        :return: dict of total and rate
+        """
+        return {'total': self.total, 'rate': self.rate()}
+
+
+class WatchMetrics(object):
+    """
+    Throughput and lag of a Watcher
+
+    - revision_lag: the head revision known by the watcher (from the headers of the responses and
+      the status probes) minus the revision it has delivered (the last event or progress notification).
+      Enable progress_notify to keep it accurate on quiet ranges.
+    - delivery_lag: seconds between a status probe read a head revision and the watcher delivered it
+    """
+
+    def __init__(self, window=60, max_probes=100):
+        self.events = RateMeter(window)
+        self.bytes = RateMeter(window)
+        self.responses = 0
+        self.progress_notifies = 0
+        self.reconnects = 0
+        self.replans = 0
+        self.head_revision = None
+        self.delivered_revision = None
+        self.last_event_revision = None
+        self.delivery_lag = None  # the latest sample
+        self.delivery_lag_stat = LatencyStat()
+        self.callback_latency = LatencyStat()
+        self._probes = deque(maxlen=max_probes)  # (time, revision) not delivered yet
+        self._lock = threading.Lock()
+
+    def _see_revision(self, revision):
+        if self.head_revision is None or revision > self.head_revision:
+            self.head_revision = revision
+
+    def on_response(self, r, size=0):
+        """
+        Record a watch response
+
+        :param r: WatchResponse
+        :type size: int
+        :param size: bytes of the response
+        """
+        with self._lock:
+            self.responses += 1
+            self._see_revision(r.header.revision)
+        if size:
+            self.bytes.mark(size)
+        if not r.events and not ('created' in r or 'canceled' in r or 'compact_revision' in r):
+            self.progress_notifies += 1
+            self.on_delivered(r.header.revision)
+
+    def on_events(self, events):
+        """
+        Record the events delivered to the callbacks
+        """
+        if not events:
+            return
+        self.events.mark(len(events))
+        revision = events[-1].mod_revision  # events are in the order of revision
+        if revision is not None:
+            self.last_event_revision = revision
+            self.on_delivered(revision)
+
+    def on_delivered(self, revision):
+        now = time.time()
+        with self._lock:
+            if self.delivered_revision is None or revision > self.delivered_revision:
+                self.delivered_revision = revision
+            while self._probes and self._probes[0][1] <= revision:
+                probed_at, _ = self._probes.popleft()
+                self.delivery_lag = now - probed_at
+                self.delivery_lag_stat.observe(self.delivery_lag)
+
+    def on_probe(self, revision, probed_at=None):
+        """
+        Record the head revision read by a status probe
+        """
+        with self._lock:
+            self._see_revision(revision)
+            if self.delivered_revision is None or revision > self.delivered_revision:
+                self._probes.append((probed_at or time.time(), revision))
+
+    @property
+    def revision_lag(self):
+        if self.head_revision is None or self.delivered_revision is None:
+            return
+        return max(0, self.head_revision - self.delivered_revision)
+
+    def snapshot(self):
+        """
+        :return: dict
+        """
+        with self._lock:
+            pending_since = self._probes[0][0] if self._probes else None
+            rt = {
+                'responses': self.responses,
+                'progress_notifies': self.progress_notifies,
+                'reconnects': self.reconnects,
+                'replans': self.replans,
+                'head_revision': self.head_revision,
+                'delivered_revision': self.delivered_revision,
+                'last_event_revision': self.last_event_revision,
+                'revision_lag': self.revision_lag,
+                'delivery_lag': self.delivery_lag,
+                # the oldest probed revision not delivered yet, the lag is at least this long
+                'undelivered_probe_age': time.time() - pending_since if pending_since else None,
+            }
+        rt['events'] = self.events.snapshot()
+        rt['bytes'] = self.bytes.snapshot()
+        rt['delivery_lag_stat'] = self.delivery_lag_stat.snapshot()
+        rt['callback_latency'] = self.callback_latency.snapshot()
+        return rt
+
+
+def prometheus_collector(watchers, prefix='etcd3_watcher'):  # pragma: no cover
+    """
+    Get a prometheus_client collector that exports the stats of the watchers
+
+    >>> from prometheus_client import REGISTRY
+    >>> REGISTRY.register(prometheus_collector({'config': config_watcher, 'routes': route_watcher}))
+
+    :type watchers: dict
+    :param watchers: dict of name -> Watcher, or a callable returns it
+    :type prefix: str
+    :param prefix: prefix of the metric names
+    """
+    from prometheus_client.core import CounterMetricFamily
+    from prometheus_client.core import GaugeMetricFamily
+
+    counters = (
+        ('events', 'events delivered', lambda s: s['events']['total']),
+        ('bytes', 'bytes of the responses received', lambda s: s['bytes']['total']),
+        ('reconnects', 'reconnects of the watch stream', lambda s: s['reconnects']),
+        ('progress_notifies', 'progress notifications received', lambda s: s['progress_notifies']),
+        ('callback_seconds', 'seconds spent in the callbacks', lambda s: s['callback_latency']['total']),
+    )
+    gauges = (
+        ('events_rate', 'events delivered per second', lambda s: s['events']['rate']),
+        ('bytes_rate', 'bytes received per second', lambda s: s['bytes']['rate']),
+        ('revision_lag', 'head revision minus delivered revision', lambda s: s['revision_lag']),
+        ('delivery_lag_seconds', 'seconds between a head revision is probed and delivered',
+         lambda s: s['delivery_lag']),
+    )
+
+    class WatcherCollector(object):
+        def collect(self):
+            items = watchers() if callable(watchers) else watchers
+            stats = [(name, w.stats()) for name, w in items.items()]
+            for kind, metrics in ((CounterMetricFamily, counters), (GaugeMetricFamily, gauges)):
+                for name, doc, get in metrics:
+                    family = kind('%s_%s' % (prefix, name), doc, labels=['watcher'])
+                    for watcher_name, s in stats:
+                        value = get(s)
+                        if value is not None:
+                            family.add_metric([watcher_name], value)
+                    yield family
+
+    return WatcherCollector()
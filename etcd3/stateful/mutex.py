@@ -0,0 +1,207 @@
+"""
+Fair lock recipe, the waiters are queued by the create revision of their keys
+"""
+import time
+import uuid
+
+from .lock import EtcdLockAcquireTimeout
+from .lock import EtcdLockError
+from .watch import EventType
+from ..errors import ErrLeaseNotFound
+from ..models import RangeRequestSortOrder
+from ..models import RangeRequestSortTarget
+from ..utils import log
+
+
+class Mutex(object):
+    """
+    Fair lock recipe like the Mutex of etcd's concurrency package
+
+    Every waiter puts its own key under the prefix of the lock, attached to the lease of its session.
+    The key of the lowest create revision holds the lock, and each waiter only watches the deletion of
+    the key right before its own. So the lock is acquired in FIFO order, and a release wakes up only
+    the next waiter instead of all of them.
+
+    Usage:
+
+    >>> with client.Mutex('job') as mutex:
+    ...     do_the_job()
+    """
+
+    DEFAULT_TTL = 60
+
+    def __init__(self, client, name, ttl=DEFAULT_TTL, session=None, lock_prefix='_mutex'):
+        """
+        :type client: BaseClient
+        :param client: instance of etcd.Client
+        :type name: str
+        :param name: the name of the lock
+        :type ttl: int
+        :param ttl: the TTL of the shared session of the client, ignored if session is given [default: 60]
+        :type session: Session
+        :param session: the session to attach the key to, None means the shared session of the client
+            with the ttl [default: None]
+        :type lock_prefix: str
+        :param lock_prefix: the prefix of the lock keys [default: '_mutex']
+        """
+        self.client = client
+        self.name = name
+        self.ttl = ttl
+        self.session = session
+        self.prefix = "{}/{}/".format(lock_prefix, name)
+        self._key_prefix = self.prefix  # where the key of the waiter is put
+        self._wait_prefix = self.prefix  # the keys created before the waiter's here block it
+        self.limit = 1  # the number of the waiters holding the lock at the same time
+        self.uuid = uuid.uuid4().hex[:8]
+        self.key = None  # the key of the waiter
+        self.revision = None  # the create revision of the key
+        self._watcher = None
+
+    def _get_session(self):
+        if self.session is not None:
+            return self.session
+        return self.client.shared_session(self.ttl)
+
+    def _first_range(self, txn, limit=1, **kwargs):
+        return txn.range(self._wait_prefix, prefix=True, limit=limit, sort_target=RangeRequestSortTarget.CREATE,
+                         **kwargs)
+
+    @staticmethod
+    def _first_kv(response):
+        kvs = response.response_range.kvs
+        return kvs[0] if kvs else None
+
+    def _enqueue(self, session):
+        """
+        Put the key of the waiter and read the first keys of the wait prefix by one txn
+
+        :return: (the first limit key-values of the wait prefix, revision of the response)
+        """
+        ID = session.ID
+        key = "%s%x-%s" % (self._key_prefix, ID, self.uuid)
+        txn = self.client.Txn()
+        txn.If(txn.key(key).create == 0)
+        txn.Then(txn.put(key, b'', lease=ID))
+        txn.Then(self._first_range(txn, limit=self.limit, sort_order=RangeRequestSortOrder.ASCEND, keys_only=True))
+        txn.Else(txn.range(key))
+        txn.Else(self._first_range(txn, limit=self.limit, sort_order=RangeRequestSortOrder.ASCEND, keys_only=True))
+        try:
+            r = txn.commit()
+        except ErrLeaseNotFound:  # expired before the keeper noticed
+            session.lost(ID)
+            return self._enqueue(session)
+        self.key = key
+        if r.succeeded:
+            self.revision = r.header.revision
+        else:
+            self.revision = self._first_kv(r.responses[0]).create_revision
+        return r.responses[1].response_range.kvs or [], r.header.revision
+
+    def _admitted(self, first):
+        """
+        :param first: the first limit key-values of the wait prefix
+        :return: if the waiter is within the first limit keys
+        """
+        return len(first) < self.limit or first[-1].create_revision >= self.revision
+
+    def _predecessor(self):
+        """
+        :return: (kv of the key right before the waiter's, if the waiter's key exists, revision of the response)
+        """
+        txn = self.client.Txn()
+        txn.Then(txn.range(self.key, count_only=True))
+        txn.Then(self._first_range(txn, sort_order=RangeRequestSortOrder.DESCEND,
+                                   max_create_revision=self.revision - 1))
+        r = txn.commit()
+        return self._first_kv(r.responses[1]), bool(r.responses[0].response_range.count), r.header.revision
+
+    def _wait_delete(self, kv, revision, timeout):
+        self._watcher = watcher = self.client.Watcher(key=kv.key, max_retries=0, start_revision=revision + 1)
+        return watcher.watch_once(lambda e: e.type == EventType.DELETE, timeout=timeout)
+
+    def _dequeue(self):
+        key, self.key, self.revision = self.key, None, None
+        if key is not None:
+            self.client.delete_range(key)
+
+    def acquire(self, block=True, timeout=None):
+        """
+        Acquire the lock, waiting in the queue of the waiters
+
+        :type block: bool
+        :param block: Block until the lock is obtained, or timeout is reached [default: True]
+        :type timeout: float
+        :param timeout: The time to wait before giving up on getting a lock
+        :return: self, None if not block and the lock is held by another one
+        :raises EtcdLockAcquireTimeout: if timeout is reached, the waiter leaves the queue
+        :raises EtcdLockError: if the session expired while waiting
+        """
+        if self.key is not None:
+            raise EtcdLockError("already acquired or acquiring")
+        deadline = None if timeout is None else time.time() + timeout
+        first, revision = self._enqueue(self._get_session())
+        if self._admitted(first):
+            log.debug("%s acquired (key: %s)" % (type(self).__name__, self.key))
+            return self
+        if not block:
+            self._dequeue()
+            return
+        try:
+            self._wait(deadline)
+        except BaseException:
+            self._dequeue()
+            raise
+        log.debug("%s acquired (key: %s)" % (type(self).__name__, self.key))
+        return self
+
+    def _wait(self, deadline):
+        while True:
+            pred, exists, revision = self._predecessor()
+            if not exists:
+                raise EtcdLockError("the key of the waiter is gone, the session may be expired")
+            if pred is None:
+                return
+            log.debug("waiting for %s to be deleted" % pred.key)
+            remaining = None if deadline is None else deadline - time.time()
+            if (remaining is not None and remaining <= 0) or not self._wait_delete(pred, revision, remaining):
+                raise EtcdLockAcquireTimeout
+
+    def release(self):
+        """
+        Release the lock, or leave the queue
+        """
+        self._dequeue()
+
+    @property
+    def is_acquired(self):
+        """
+        if the lock is held by this waiter
+        """
+        if self.key is None:
+            return False
+        pred, exists, _ = self._predecessor()
+        return exists and pred is None
+
+    def owner(self):
+        """
+        :return: the key holding the lock, None if not held
+        """
+        txn = self.client.Txn()
+        txn.Then(txn.range(self.prefix, prefix=True, limit=1, keys_only=True, sort_target=RangeRequestSortTarget.CREATE,
+                           sort_order=RangeRequestSortOrder.ASCEND))
+        kv = self._first_kv(txn.commit().responses[0])
+        return kv.key if kv else None
+
+    def waiters(self):
+        """
+        :return: int, the number of the keys in the queue, including the owner
+        """
+        return int(self.client.range(self.prefix, prefix=True, count_only=True).count or 0)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+        return False
@@ -0,0 +1,147 @@
+"""
+Push the client-side filters of a Watcher down to the watch create request
+"""
+import re
+
+import six
+
+from ..models import EventEventType
+from ..utils import bytes_types
+from ..utils import incr_last_byte
+
+try:  # pragma: no cover
+    from re import _parser as sre_parse  # python 3.11+
+    from re import _constants as sre_constants
+except ImportError:  # pragma: no cover
+    import sre_parse
+    import sre_constants
+
+EventType = EventEventType
+
+
+def to_bytes(s):
+    if s is None or isinstance(s, bytes_types):
+        return s
+    if isinstance(s, six.text_type):
+        return s.encode('utf-8')
+    return six.b(str(s))
+
+
+def regex_literal_prefix(pattern):
+    """
+    Get the literal prefix that every key matched (by re.match) by the pattern starts with
+
+    >>> regex_literal_prefix('/config/(db|cache)/.*')
+    b'/config/'
+
+    :type pattern: str or bytes
+    :param pattern: the regex
+    :return: bytes, empty if the pattern has no literal prefix
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except (re.error, TypeError):
+        return b''
+    state = getattr(parsed, 'state', None) or parsed.pattern  # python 2 keeps the flags in `pattern`
+    if state.flags & sre_constants.SRE_FLAG_IGNORECASE:
+        return b''
+    chars = []
+    for op, av in parsed:
+        if op == sre_constants.AT and av in (sre_constants.AT_BEGINNING, sre_constants.AT_BEGINNING_STRING):
+            continue
+        if op != sre_constants.LITERAL:
+            break
+        chars.append(av)
+    if isinstance(pattern, bytes_types):
+        return bytes(bytearray(chars))
+    return u''.join(six.unichr(c) for c in chars).encode('utf-8')
+
+
+def common_prefix(prefixes):
+    """
+    :type prefixes: list of bytes
+    :return: bytes, the longest common prefix
+    """
+    if not prefixes:
+        return b''
+    lo, hi = min(prefixes), max(prefixes)
+    i = 0
+    while i < len(lo) and lo[i:i + 1] == hi[i:i + 1]:
+        i += 1
+    return lo[:i]
+
+
+def prefix_range_end(prefix):
+    """
+    Get the range_end of a prefix, None if the prefix covers the whole key space
+    """
+    prefix = prefix.rstrip(b'\xff')
+    if not prefix:
+        return
+    return incr_last_byte(prefix)
+
+
+def key_range(params):
+    """
+    :return: (key, range_end) in bytes, range_end is None for a single key, b'\\0' for no upper bound
+    """
+    if params.get('all'):
+        return b'\0', b'\0'
+    key = to_bytes(params.get('key'))
+    if params.get('prefix'):
+        return key, prefix_range_end(key) or b'\0'
+    return key, to_bytes(params.get('range_end'))
+
+
+def in_key_range(key, start, end):
+    """
+    :return: whether the key is in the range returned by key_range
+    """
+    if end is None:
+        return key == start
+    if end == b'\0':
+        return key >= start
+    return start <= key < end
+
+
+def plan_request(params, filters):
+    """
+    Narrow the params of a watch create request by the filters of all the callbacks
+
+    - only deletes (or only puts) are wanted: set no_put (or no_delete)
+    - all the filters are regexes: narrow the key range to their common literal prefix
+    - prev_kv is requested only if some callback uses it
+
+    The filters are still evaluated on the client, so the plan only needs to be a superset of what's wanted.
+
+    :type params: dict
+    :param params: the params of Watcher.request_params
+    :type filters: list of tuple
+    :param filters: (raw filter, prev_kv) of each callback, prev_kv None means unknown
+    :return: dict, the narrowed params
+    """
+    if not filters:
+        return params
+    params = dict(params)
+    raw_filters = [f for f, _ in filters]
+
+    if all(f == EventType.DELETE for f in raw_filters):
+        params['no_put'] = True
+    elif all(f == EventType.PUT for f in raw_filters):
+        params['no_delete'] = True
+
+    if params.get('prev_kv'):
+        params['prev_kv'] = any(p is None or p for _, p in filters) or None
+    elif any(p for _, p in filters):
+        params['prev_kv'] = True
+
+    if all(isinstance(f, (six.string_types, bytes)) for f in raw_filters):
+        key, range_end = key_range(params)
+        prefix = common_prefix([regex_literal_prefix(f) for f in raw_filters])
+        prefix_end = prefix_range_end(prefix)
+        if range_end is not None and prefix_end is not None:
+            lo = max(key, prefix)
+            hi = prefix_end if range_end == b'\0' else min(range_end, prefix_end)
+            if lo < hi and (lo, hi) != (key, range_end):
+                params.update(key=lo, range_end=hi, prefix=None, all=None)
+    return params
@@ -0,0 +1,570 @@
+"""
+Run many sync watch streams on one thread
+"""
+import errno
+import json
+import os
+import socket
+import ssl
+import threading
+import time
+
+import six
+
+try:
+    import selectors
+except ImportError:  # pragma: no cover
+    import selectors34 as selectors
+
+from .watch import EventBatch
+from .watch import WatchResponse
+from .watch import _Coalescer
+from ..errors import Etcd3StreamError
+from ..errors import Etcd3WatchCanceled
+from ..errors import get_client_error
+from ..utils import JSONFramer
+from ..utils import get_ident
+from ..utils import log
+
+_WOULD_BLOCK = (errno.EAGAIN, errno.EWOULDBLOCK)
+_IN_PROGRESS = (0, errno.EINPROGRESS, errno.EALREADY) + _WOULD_BLOCK
+DEFAULT_CONNECT_TIMEOUT = 5
+RETRY_INTERVAL = 0.2  # the same interval as Watcher's re-watch
+
+
+class _WatchStream(object):
+    """
+    A watch request over a socket that is owned by the reactor,
+    it decodes the (chunked) http response into json frames and feeds them to the watcher
+    """
+
+    def __init__(self, reactor, watcher):
+        self.reactor = reactor
+        self.watcher = watcher
+        self.sock = None
+        self.connecting = False  # connecting without blocking, until the request is sent
+        self.connect_deadline = None
+        self._tcp_connected = False
+        self._handshaking = False
+        self._out = b''
+        self.retries = 0
+        self.retry_at = None
+        self.created = False
+        self.coalescer = None
+        self.deliver = watcher.dispatch_batch
+        if watcher.coalesce_ms:
+            self.coalescer = _Coalescer(watcher.coalesce_ms / 1000.0, watcher.dispatch_batch)
+            self.deliver = self.coalescer.add
+        self._reset_parser()
+
+    def _reset_parser(self):
+        self.framer = JSONFramer()
+        self._head = b''
+        self._status = None
+        self._chunked = False
+        self._raw = bytearray()
+        self._chunk_left = None
+        self._crlf_left = 0
+        self._eof = False
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def _request(self, body):
+        client = self.reactor.client
+        headers = [
+            ('Host', '%s:%s' % (client.host, client.port)),
+            ('User-Agent', client.user_agent),
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(body))),
+        ]
+        if client.token:
+            headers.append(('Authorization', client.token))
+        headers.extend(client.headers.items())
+        lines = ['POST %s HTTP/1.1' % client._prefix('/watch')]
+        lines.extend('%s: %s' % h for h in headers)
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8') + body
+
+    def _body(self):
+        client = self.reactor.client
+        data = client.watch_create(create_request_obj=True, **self.watcher.request_params())
+        return json.dumps(client._encodeRPCRequest('/watch', {'create_request': data})).encode('utf-8')
+
+    def connect(self):
+        """
+        Send the watch create request, continue from the last watched revision of the watcher
+        """
+        client = self.reactor.client
+        body = self._body()
+        sock = socket.create_connection((client.host, int(client.port)),
+                                        timeout=client.timeout or DEFAULT_CONNECT_TIMEOUT)
+        try:
+            if client.protocol == 'https':
+                sock = self.reactor.ssl_context().wrap_socket(sock, server_hostname=client.host)
+            sock.sendall(self._request(body))
+            sock.setblocking(False)
+        except Exception:
+            sock.close()
+            raise
+        self._reset_parser()
+        self.sock = sock
+        log.debug("reactor: watch stream connected (key: %s)" % self.watcher.key)
+
+    def start_connect(self):
+        """
+        Start connecting without blocking the reactor thread, on_connecting continues it
+        when the socket is ready, until the watch create request is sent
+        """
+        client = self.reactor.client
+        out = self._request(self._body())
+        family, socktype, proto, _, address = self.reactor.address()
+        sock = socket.socket(family, socktype, proto)
+        try:
+            sock.setblocking(False)
+            err = sock.connect_ex(address)
+            if err not in _IN_PROGRESS:
+                raise socket.error(err, os.strerror(err))
+        except Exception:
+            sock.close()
+            raise
+        self._reset_parser()
+        self.sock = sock
+        self.connecting = True
+        self.connect_deadline = time.time() + (client.timeout or DEFAULT_CONNECT_TIMEOUT)
+        self._tcp_connected = False
+        self._handshaking = client.protocol == 'https'
+        self._out = out
+
+    def on_connecting(self):
+        """
+        Continue connecting without blocking: finish the tcp connection and the tls handshake,
+        then send the watch create request
+
+        :return: the selector events to wait for, EVENT_READ without connecting means connected
+        """
+        client = self.reactor.client
+        if not self._tcp_connected:
+            err = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if err:
+                raise socket.error(err, os.strerror(err))
+            self._tcp_connected = True
+            if self._handshaking:
+                self.sock = self.reactor.ssl_context().wrap_socket(self.sock, server_hostname=client.host,
+                                                                   do_handshake_on_connect=False)
+        try:
+            if self._handshaking:
+                self.sock.do_handshake()
+                self._handshaking = False
+            while self._out:
+                n = self.sock.send(self._out)
+                self._out = self._out[n:]
+        except ssl.SSLWantReadError:
+            return selectors.EVENT_READ
+        except ssl.SSLWantWriteError:
+            return selectors.EVENT_WRITE
+        except socket.error as e:
+            if e.args and e.args[0] in _WOULD_BLOCK:
+                return selectors.EVENT_WRITE
+            raise
+        self.connecting = False
+        self.connect_deadline = None
+        log.debug("reactor: watch stream connected (key: %s)" % self.watcher.key)
+        return selectors.EVENT_READ
+
+    def close(self):
+        """
+        Close the socket of the stream
+        """
+        self.connecting = False
+        self.connect_deadline = None
+        sock, self.sock = self.sock, None
+        if sock is None:
+            return
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except (socket.error, OSError):
+            pass
+        sock.close()
+
+    def on_readable(self):
+        """
+        Read all the data available on the socket without blocking
+        """
+        while self.sock is not None:
+            try:
+                data = self.sock.recv(65536)
+            except ssl.SSLWantReadError:
+                return
+            except socket.error as e:
+                if e.args and e.args[0] in _WOULD_BLOCK:
+                    return
+                raise
+            if not data:
+                raise Etcd3StreamError("watch stream closed by the server", self.framer.buf, None)
+            self._on_data(data)
+            if self._eof:
+                raise Etcd3StreamError("watch stream ended", self.framer.buf, None)
+
+    def _on_data(self, data):
+        if self._status is None:
+            self._head += data
+            i = self._head.find(b'\r\n\r\n')
+            if i < 0:
+                return
+            head, data = self._head[:i], self._head[i + 4:]
+            self._head = b''
+            lines = head.decode('latin-1').split('\r\n')
+            self._status = int(lines[0].split(' ')[1])
+            for line in lines[1:]:
+                k, _, v = line.partition(':')
+                if k.strip().lower() == 'transfer-encoding' and 'chunked' in v.lower():
+                    self._chunked = True
+        if self._chunked:
+            data = self._decode_chunks(data)
+        if data:
+            for frame in self.framer.feed(data):
+                self._on_frame(frame)
+                if self.sock is None:  # removed by a callback
+                    return
+
+    def _decode_chunks(self, data):
+        raw = self._raw
+        raw.extend(data)
+        out = []
+        while raw and not self._eof:
+            if self._chunk_left is None:
+                i = raw.find(b'\r\n')
+                if i < 0:
+                    break
+                size = int(bytes(raw[:i]).split(b';')[0], 16)
+                del raw[:i + 2]
+                if size == 0:
+                    self._eof = True
+                    break
+                self._chunk_left = size
+                self._crlf_left = 2
+            if self._chunk_left:
+                n = min(len(raw), self._chunk_left)
+                out.append(bytes(raw[:n]))
+                del raw[:n]
+                self._chunk_left -= n
+                if self._chunk_left:
+                    break
+            n = min(len(raw), self._crlf_left)
+            del raw[:n]
+            self._crlf_left -= n
+            if self._crlf_left:
+                break
+            self._chunk_left = None
+        return b''.join(out)
+
+    def _on_frame(self, frame):
+        data = json.loads(frame.decode('utf-8'))
+        if self._status >= 400:
+            raise get_client_error(data.get('error'), data.get('code'), self._status)
+        if data.get('error'):
+            err = data.get('error')
+            raise get_client_error(err.get('message'), code=err.get('code'), status=err.get('http_code'))
+        r = WatchResponse(data)
+        err = self.watcher.check_response(r, len(frame))
+        if err:
+            raise err
+        if 'created' in r:
+            self.created = True
+            self.retries = 0
+        if r.events:
+            self.deliver(EventBatch(r.events, r.header))
+
+
+class WatchReactor(object):
+    """
+    Multiplex the streams of many watchers on one thread with selectors
+
+    Each watcher costs a socket instead of a thread. The callbacks are called on the reactor thread,
+    or in the thread pool of the executor if one is given. The streams are reconnected without blocking
+    the reactor thread, to the address of the host resolved when the first watcher is added.
+
+    Usage:
+
+    >>> reactor = client.WatchReactor()
+    >>> for name in services:
+    ...     w = client.Watcher(key='/services/' + name, prefix=True)
+    ...     w.onEvent(on_service_change)
+    ...     reactor.add(w)
+    >>> reactor.runDaemon()
+    >>> reactor.remove(w)  # or w.stop()
+    >>> reactor.stop()
+    """
+
+    def __init__(self, client, executor=None):
+        """
+        :type client: Client
+        :param client: client instance of etcd3
+        :type executor: CallbackExecutor
+        :param executor: run the callbacks of the watchers that have no executor in its thread pool [default: None]
+        """
+        self.client = client
+        self.executor = executor
+        self.running = False
+        self._streams = {}  # watcher -> _WatchStream
+        self._commands = []
+        self._lock = threading.Lock()
+        self._selector = selectors.DefaultSelector()
+        self._waker_r, self._waker_w = socket.socketpair()
+        self._waker_r.setblocking(False)
+        self._selector.register(self._waker_r, selectors.EVENT_READ, None)
+        self._ssl_context = None
+        self._address = None
+        self._thread = None
+        self._ident = None
+
+    def ssl_context(self):
+        """
+        :return: ssl.SSLContext built from the cert and verify settings of the client
+        """
+        if self._ssl_context is None:
+            ctx = ssl.create_default_context()
+            verify = self.client.verify
+            if not verify:
+                ctx.check_hostname = False
+                ctx.verify_mode = ssl.CERT_NONE
+            elif isinstance(verify, six.string_types):
+                ctx.load_verify_locations(cafile=verify)
+            if self.client.cert:
+                ctx.load_cert_chain(*self.client.cert)
+            self._ssl_context = ctx
+        return self._ssl_context
+
+    def address(self):
+        """
+        :return: the getaddrinfo entry of the client's host to reconnect to,
+            resolved once by add() so the reactor thread doesn't block on resolving
+        """
+        if self._address is None:
+            client = self.client
+            self._address = socket.getaddrinfo(client.host, int(client.port), 0, socket.SOCK_STREAM)[0]
+        return self._address
+
+    @property
+    def watchers(self):
+        return list(self._streams)
+
+    def _wake(self):
+        try:
+            self._waker_w.send(b'x')
+        except socket.error:  # pragma: no cover
+            pass
+
+    def add(self, watcher):
+        """
+        Start watching with the watcher on the reactor
+
+        :type watcher: Watcher
+        :param watcher: the watcher with callbacks added
+        """
+        watcher._ensure_callbacks()
+        watcher._ensure_not_watching()
+        if self.executor is not None and watcher.executor is None:
+            watcher.executor = self.executor
+        stream = _WatchStream(self, watcher)
+        stream.connect()
+        self.address()
+        watcher.watching = True
+        watcher._reactor = self
+        with self._lock:
+            self._commands.append((self._add, stream))
+        self._wake()
+        return watcher
+
+    def remove(self, watcher):
+        """
+        Stop watching with the watcher and close its stream
+
+        :type watcher: Watcher
+        """
+        watcher.watching = False
+        with self._lock:
+            self._commands.append((self._remove, watcher))
+        if self._ident == get_ident() or not self.running:
+            self._run_commands()
+        else:
+            self._wake()
+
+    def rewatch(self, watcher):
+        """
+        Re-create the stream of the watcher with its current request params,
+        continue from the last watched revision
+
+        :type watcher: Watcher
+        """
+        with self._lock:
+            self._commands.append((self._rewatch, watcher))
+        if self._ident == get_ident() or not self.running:
+            self._run_commands()
+        else:
+            self._wake()
+
+    def _rewatch(self, watcher):
+        stream = self._streams.get(watcher)
+        if stream is None:
+            return
+        self._close_stream(stream)
+        stream.retry_at = time.time()
+
+    def _add(self, stream):
+        if not stream.watcher.watching:  # removed before it is added
+            stream.close()
+            return
+        self._streams[stream.watcher] = stream
+        self._selector.register(stream, selectors.EVENT_READ, stream)
+
+    def _remove(self, watcher):
+        stream = self._streams.pop(watcher, None)
+        if stream is None:
+            return
+        watcher._reactor = None
+        self._close_stream(stream)
+        if stream.coalescer:
+            stream.coalescer.flush()
+        log.debug("reactor: watch stream removed (key: %s)" % watcher.key)
+
+    def _close_stream(self, stream):
+        if stream.sock is not None:
+            try:
+                self._selector.unregister(stream)
+            except (KeyError, ValueError):
+                pass
+            stream.close()
+
+    def _run_commands(self):
+        with self._lock:
+            commands, self._commands = self._commands, []
+        for fn, arg in commands:
+            fn(arg)
+
+    def _on_error(self, stream, error):
+        self._close_stream(stream)
+        watcher = stream.watcher
+        if not watcher.watching:
+            return
+        retry = False
+        if isinstance(error, Etcd3WatchCanceled):
+            r = error.resp
+            if stream.created and 'compact_revision' in r and r.compact_revision > 0:
+                retry = stream.retries < watcher.max_retries
+                watcher.revision = r.compact_revision - 1  # next request start from compact_revision
+        elif isinstance(error, (socket.error, OSError, Etcd3StreamError)):
+            retry = stream.retries < watcher.max_retries
+        watcher.errors.append(error)
+        if retry:
+            log.debug("reactor: failed watching (times:%d) retrying %s" % (stream.retries, error))
+            stream.retries += 1
+            watcher.metrics.reconnects += 1
+            stream.retry_at = time.time() + RETRY_INTERVAL
+            return
+        log.error("reactor: watch on '%s' failed: %r" % (watcher.key, error))
+        watcher.watching = False
+        self._remove(watcher)
+
+    def _on_connecting(self, stream):
+        try:
+            events = stream.on_connecting()
+        except Exception as e:
+            self._on_error(stream, e)
+            return
+        self._selector.modify(stream, events, stream)
+
+    def _retry_due(self):
+        now = time.time()
+        timeout = 1.0
+        for stream in list(self._streams.values()):
+            if stream.connecting:
+                if stream.connect_deadline <= now:
+                    self._on_error(stream, socket.timeout("timed out connecting the watch stream"))
+                else:
+                    timeout = min(timeout, stream.connect_deadline - now)
+                continue
+            if stream.sock is not None or stream.retry_at is None:
+                continue
+            if stream.retry_at > now:
+                timeout = min(timeout, stream.retry_at - now)
+                continue
+            stream.retry_at = None
+            try:
+                stream.start_connect()
+            except Exception as e:
+                self._on_error(stream, e)
+                continue
+            self._selector.register(stream, selectors.EVENT_WRITE, stream)
+            timeout = min(timeout, stream.connect_deadline - now)
+        return max(timeout, 0)
+
+    def run(self):
+        """
+        Run the reactor loop until stop() is called
+        """
+        self.running = True
+        self._ident = get_ident()
+        try:
+            timeout = 1.0
+            while self.running:
+                for key, _ in self._selector.select(timeout):
+                    stream = key.data
+                    if stream is None:
+                        try:
+                            while self._waker_r.recv(4096):
+                                pass
+                        except socket.error:
+                            pass
+                        continue
+                    if stream.sock is None:  # closed by a previous callback
+                        continue
+                    if stream.connecting:
+                        self._on_connecting(stream)
+                        continue
+                    try:
+                        stream.on_readable()
+                    except Exception as e:
+                        self._on_error(stream, e)
+                self._run_commands()
+                timeout = self._retry_due()
+        finally:
+            self.running = False
+            self._ident = None
+            for watcher in list(self._streams):
+                watcher.watching = False
+                self._remove(watcher)
+
+    def runDaemon(self):
+        """
+        Run the reactor in a daemon thread
+        """
+        if self.running:
+            raise RuntimeError("already running")
+        t = self._thread = threading.Thread(target=self.run, name='etcd3-watch-reactor')
+        t.setDaemon(True)
+        t.start()
+
+    def stop(self):
+        """
+        Stop the reactor and close all the watch streams
+        """
+        self.running = False
+        self._wake()
+        if self._thread and self._thread.is_alive() and self._thread.ident != get_ident():
+            self._thread.join()
+
+    def close(self):
+        """
+        Stop the reactor and release its resources
+        """
+        self.stop()
+        self._selector.close()
+        self._waker_r.close()
+        self._waker_w.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,232 @@
+"""
+Ring buffer of the recent events of a watched range, so new subscribers can start from it
+"""
+import threading
+from collections import deque
+
+from .watch import Watcher
+from ..utils import check_param
+from ..utils import get_ident
+from ..utils import log
+
+
+class Subscription(object):
+    """
+    A subscriber of a ReplayBuffer
+    """
+
+    def __init__(self, buffer, callback, filter=None, start_revision=None):
+        self.buffer = buffer
+        self.callback = callback
+        self.filter = Watcher.get_filter(filter)
+        self.min_revision = start_revision or 0
+        self.next_seq = 0
+        self.active = True
+        self.lock = threading.Lock()  # keeps replayed and live events in order
+
+    def feed(self, items):
+        """
+        Deliver the (seq, event) items that are not delivered yet
+        """
+        for seq, event in items:
+            if not self.active:
+                return
+            if seq < self.next_seq:
+                continue
+            self.next_seq = seq + 1
+            if event.mod_revision < self.min_revision or not self.filter(event):
+                continue
+            try:
+                self.callback(event)
+            except Exception:
+                log.exception("replay buffer subscriber raised an error")
+
+    def stop(self):
+        """
+        Stop receiving events
+        """
+        self.active = False
+        self.buffer.unsubscribe(self)
+
+    cancel = stop
+
+
+class ReplayBuffer(object):
+    """
+    Keep the recent events of a range in memory, fed by one long-lived watch
+
+    A subscriber whose start_revision is covered by the buffer is replayed the buffered events locally,
+    then receives the live events in order without gap or duplicate. Only a start_revision older than
+    the buffer makes a watch request of its own to the server.
+
+    Usage:
+
+    >>> buf = client.ReplayBuffer(key='/config', prefix=True, maxlen=10000)
+    >>> buf.runDaemon()
+    >>> sub = buf.subscribe(on_event, start_revision=rev)  # served from the buffer if possible
+    >>> sub.stop()
+    >>> buf.stop()
+    """
+
+    @check_param(at_least_one_of=['key', 'all'], at_most_one_of=['range_end', 'prefix', 'all'])
+    def __init__(self, client, key=None, range_end=None, prefix=None, all=None, maxlen=10000, max_retries=-1):
+        """
+        :type client: BaseClient
+        :param client: client instance of etcd3
+        :type key: str or bytes
+        :param key: the key or the start of the range to buffer
+        :type range_end: str or bytes
+        :param range_end: the end of the range [key, range_end) to buffer
+        :type prefix: bool
+        :param prefix: if the key is a prefix [default: False]
+        :type all: bool
+        :param all: all the keys [default: False]
+        :type maxlen: int
+        :param maxlen: max events kept in the buffer [default: 10000]
+        :type max_retries: int
+        :param max_retries: max retries of the feeding watch, -1 means no limit [default: -1]
+        """
+        self.client = client
+        self.range = dict(key=key, range_end=range_end, prefix=prefix, all=all)
+        self.maxlen = maxlen
+        self.watcher = Watcher(client, max_retries=max_retries, **self.range)
+        self.revision = None  # the latest revision seen by the feeding watch
+        self.hits = 0
+        self.fallbacks = 0
+        self._floor = None  # every event after this revision is in the buffer
+        self._events = deque(maxlen=maxlen)  # (seq, Event)
+        self._next_seq = 0
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def floor(self):
+        """
+        the revision after which all the events are in the buffer, None if the feed is not created yet
+        """
+        return self._floor
+
+    def covers(self, start_revision):
+        """
+        :return: whether a subscriber starts from start_revision can be served from the buffer
+        """
+        if start_revision is None:
+            return True
+        floor = self._floor
+        return floor is not None and start_revision > floor
+
+    def on_response(self, r):
+        """
+        Feed a watch response of the range to the buffer and the subscribers
+
+        :param r: WatchResponse
+        """
+        with self._lock:
+            self.revision = r.header.revision
+            if 'created' in r and self._floor is None:
+                self._floor = r.header.revision
+            if 'compact_revision' in r and r.compact_revision > 0:
+                # the feed is re-created from the compact revision, events before it are lost
+                log.warning("replay buffer missed the events before compacted revision %d" % r.compact_revision)
+                self._events.clear()
+                self._floor = r.compact_revision - 1
+            items = []
+            for event in r.events:
+                if len(self._events) == self.maxlen:
+                    self._floor = self._events[0][1].mod_revision
+                item = (self._next_seq, event)
+                self._next_seq += 1
+                self._events.append(item)
+                items.append(item)
+            subscribers = list(self._subscribers) if items else ()
+        for sub in subscribers:
+            with sub.lock:
+                sub.feed(items)
+
+    def subscribe(self, callback, start_revision=None, filter=None):
+        """
+        Subscribe the events of the range
+
+        :type callback: callable
+        :param callback: called with every Event
+        :type start_revision: int
+        :param start_revision: replay the events from this revision (inclusive), None means from now
+        :type filter: callable or regex string or EventType
+        :param filter: only the events match the filter are delivered
+        :return: Subscription, or a running Watcher if start_revision is older than the buffer
+        """
+        if not callable(callback):
+            raise TypeError('callback should be a callable')
+        if not self.covers(start_revision):
+            log.debug("start revision %s is older than the replay buffer, watching from the server" % start_revision)
+            self.fallbacks += 1
+            w = Watcher(self.client, start_revision=start_revision, **self.range)
+            if filter is None:
+                w.onEvent(callback)
+            else:
+                w.onEvent(filter, callback)
+            w.runDaemon()
+            return w
+        sub = Subscription(self, callback, filter, start_revision)
+        with sub.lock:
+            with self._lock:
+                if start_revision is None:
+                    replay = []
+                    sub.next_seq = self._next_seq
+                else:
+                    replay = [i for i in self._events if i[1].mod_revision >= start_revision]
+                    self.hits += 1
+                self._subscribers.append(sub)
+            sub.feed(replay)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+
+    def run(self):
+        """
+        Run the feeding watch
+        """
+        with self.watcher:
+            for r in self.watcher.iter_responses():
+                self.on_response(r)
+
+    def runDaemon(self):
+        """
+        Run the feeding watch in a daemon thread
+        """
+        t = self._thread = threading.Thread(target=self.run)
+        t.setDaemon(True)
+        t.start()
+
+    def stop(self):
+        """
+        Stop the feeding watch, the subscribers receive no more events
+        """
+        self.watcher.stop()
+        if self._thread and self._thread.is_alive() and self._thread.ident != get_ident():
+            self._thread.join()
+
+    def stats(self):
+        """
+        :return: dict of size, floor, revision, subscribers, hits and fallbacks
+        """
+        with self._lock:
+            return {
+                'size': len(self._events),
+                'floor': self._floor,
+                'revision': self.revision,
+                'subscribers': len(self._subscribers),
+                'hits': self.hits,
+                'fallbacks': self.fallbacks,
+            }
+
+    def __enter__(self):
+        self.runDaemon()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,136 @@
+"""
+Informer that persists its store to a local sqlite file, so a restart resumes watching instead of re-listing
+"""
+import sqlite3
+
+from .informer import Informer
+from .watch import KeyValue
+from ..utils import log
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS kv (key BLOB PRIMARY KEY, value BLOB, create_revision INTEGER, '
+    'mod_revision INTEGER, version INTEGER, lease INTEGER)',
+    'CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value BLOB)',
+)
+
+
+def _blob(b):
+    return None if b is None else sqlite3.Binary(b)
+
+
+def _kv_from_row(row):
+    kv = KeyValue({})
+    key, value, kv.create_revision, kv.mod_revision, kv.version, kv.lease = row
+    kv.key = bytes(key)
+    kv.value = None if value is None else bytes(value)
+    return kv
+
+
+class Replica(Informer):
+    """
+    An Informer whose store and last applied revision are persisted to a sqlite file
+
+    On start, the store is loaded from the file and the watch resumes from the stored revision + 1,
+    the prefix is fully listed only if the file is empty (or of another prefix) or the stored revision
+    has been compacted. The changes of every watch response are written in one sqlite transaction.
+
+    Usage:
+
+    >>> replica = client.Replica('/routes/', '/var/lib/myapp/routes.db')
+    >>> replica.runDaemon()
+    >>> replica.wait_synced()  # the routes of the last run are available right away
+    >>> replica.scan_prefix('/routes/api/')
+    >>> replica.stop()
+    """
+
+    def __init__(self, client, prefix, path, decode=None, indexers=None, max_retries=-1):
+        """
+        :type client: BaseClient
+        :param client: client instance of etcd3
+        :type prefix: str or bytes
+        :param prefix: the key prefix
+        :type path: str
+        :param path: the path of the sqlite file
+        :type decode: callable
+        :param decode: decode the value (bytes) to the object kept in the store [default: keep the bytes]
+        :type indexers: dict
+        :param indexers: {index name: callable(key, obj)} returns the index value (or a list of them) of the object
+        :type max_retries: int
+        :param max_retries: max retries of the watch, and of the re-lists in a row when the watch is canceled
+            for a reason other than compaction, -1 means no limit [default: -1]
+        """
+        super(Replica, self).__init__(client, prefix, decode=decode, indexers=indexers, max_retries=max_retries)
+        self.path = path
+        self._dirty = {}  # key -> KeyValue, None if deleted
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        for sql in _SCHEMA:
+            self._db.execute(sql)
+        self._db.commit()
+
+    def _set(self, kv):
+        self._dirty[kv.key] = kv
+        return super(Replica, self)._set(kv)
+
+    def _delete(self, key):
+        self._dirty[key] = None
+        return super(Replica, self)._delete(key)
+
+    def _persist(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            db = self._db
+            db.executemany('DELETE FROM kv WHERE key = ?', [(_blob(k),) for k, kv in dirty.items() if kv is None])
+            db.executemany('INSERT OR REPLACE INTO kv VALUES (?, ?, ?, ?, ?, ?)', [
+                (_blob(k), _blob(kv.value), kv.create_revision, kv.mod_revision, kv.version, kv.lease)
+                for k, kv in dirty.items() if kv is not None])
+            db.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)', [
+                ('prefix', _blob(self.prefix)), ('revision', self.revision)])
+            db.commit()
+
+    def load(self):
+        """
+        Load the store from the file
+
+        :return: the stored revision, None if the file has nothing of the prefix
+        """
+        meta = dict(self._db.execute('SELECT name, value FROM meta'))
+        if meta.get('prefix') is None or bytes(meta['prefix']) != self.prefix or meta.get('revision') is None:
+            return
+        changes = []
+        with self._lock:
+            for row in self._db.execute('SELECT * FROM kv ORDER BY key'):
+                kv = _kv_from_row(row)
+                super(Replica, self)._set(kv)
+                changes.append((0, (kv.key, self._items[kv.key][1])))
+            self.revision = int(meta['revision'])
+        log.debug("loaded %d keys of '%s' at revision %d from %s" % (len(changes), self.prefix, self.revision,
+                                                                     self.path))
+        self._notify(changes)
+        self._synced.set()
+        return self.revision
+
+    def _initial_sync(self):
+        if self.revision is None and self.load() is None:
+            with self._lock:
+                self._db.execute('DELETE FROM kv')  # of another prefix
+            self.relist()
+
+    def relist(self):
+        super(Replica, self).relist()
+        self._persist()
+
+    def on_response(self, r):
+        super(Replica, self).on_response(r)
+        self._persist()
+
+    def close(self):
+        """
+        Stop watching and close the file
+        """
+        self.stop()
+        self._db.close()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,89 @@
+"""
+Read-write lock recipe, the readers and writers are queued by the create revision of their keys
+"""
+from .mutex import Mutex
+
+
+class _RWMutex(Mutex):
+    """
+    A side of the RWLock, a writer is blocked by any earlier key, a reader only by an earlier writer
+    """
+
+    def __init__(self, client, name, ttl, session, lock_prefix, write):
+        super(_RWMutex, self).__init__(client, name, ttl=ttl, session=session, lock_prefix=lock_prefix)
+        self.write = write
+        self._key_prefix = self.prefix + ('write/' if write else 'read/')
+        self._wait_prefix = self.prefix if write else self.prefix + 'write/'
+
+
+class RWLock(object):
+    """
+    Read-write lock recipe like the RWMutex of etcd's recipes package
+
+    Every reader or writer puts its own key under the read/ or write/ sub-prefix of the lock, attached
+    to the lease of its session. A writer waits for the keys of the earlier readers and writers to be
+    deleted, a reader only waits for the earlier writers. The readers queued after a writer wait for it,
+    so the writer is not starved by the readers coming later.
+
+    A RWLock object holds at most one read and one write key, use a RWLock object per thread.
+
+    Usage:
+
+    >>> rw = client.RWLock('config')
+    >>> with rw.read_lock:
+    ...     read_the_config()
+    >>> with rw.write_lock:
+    ...     write_the_config()
+    """
+
+    DEFAULT_TTL = 60
+
+    def __init__(self, client, name, ttl=DEFAULT_TTL, session=None, lock_prefix='_rwlock'):
+        """
+        :type client: BaseClient
+        :param client: instance of etcd.Client
+        :type name: str
+        :param name: the name of the lock
+        :type ttl: int
+        :param ttl: the TTL of the shared session of the client, ignored if session is given [default: 60]
+        :type session: Session
+        :param session: the session to attach the keys to, None means the shared session of the client
+            with the ttl [default: None]
+        :type lock_prefix: str
+        :param lock_prefix: the prefix of the lock keys [default: '_rwlock']
+        """
+        self.client = client
+        self.name = name
+        self.read_lock = _RWMutex(client, name, ttl, session, lock_prefix, write=False)
+        self.write_lock = _RWMutex(client, name, ttl, session, lock_prefix, write=True)
+        self.prefix = self.read_lock.prefix
+
+    def acquire_read(self, block=True, timeout=None):
+        """
+        Acquire the lock shared with the other readers, see Mutex.acquire
+        """
+        return self.read_lock.acquire(block=block, timeout=timeout)
+
+    def release_read(self):
+        self.read_lock.release()
+
+    def acquire_write(self, block=True, timeout=None):
+        """
+        Acquire the lock exclusively, see Mutex.acquire
+        """
+        return self.write_lock.acquire(block=block, timeout=timeout)
+
+    def release_write(self):
+        self.write_lock.release()
+
+    def readers(self):
+        """
+        :return: int, the number of the readers holding or waiting for the lock
+        """
+        return int(self.client.range(self.prefix + 'read/', prefix=True, count_only=True).count or 0)
+
+    def writers(self):
+        """
+        :return: int, the number of the writers holding or waiting for the lock
+        """
+        return int(self.client.range(self.prefix + 'write/', prefix=True, count_only=True).count or 0)
@@ -0,0 +1,129 @@
+"""
+Counting semaphore recipe, the waiters are queued by the create revision of their keys
+"""
+import time
+
+from .lock import EtcdLockAcquireTimeout
+from .lock import EtcdLockError
+from .mutex import Mutex
+from ..models import RangeRequestSortOrder
+from ..models import RangeRequestSortTarget
+from ..utils import log
+
+HELD = b'held'
+
+
+class Semaphore(Mutex):
+    """
+    Fair counting semaphore recipe, holds by at most `limit` waiters at the same time
+
+    Every waiter puts its own key under the prefix of the semaphore, attached to the lease of its session,
+    the first `limit` keys by create revision hold the semaphore. An uncontended acquire takes one txn.
+
+    A waiter doesn't watch the whole prefix, only the key whose change could admit it:
+    the first waiter (exactly `limit` keys ahead) watches the deletions under the prefix, which releases
+    a holder, the other waiters watch the key right before their own, which is either deleted or marked
+    held when it's admitted. So a release wakes up the first waiter, and the admission of a waiter wakes
+    up only the next one.
+
+    Usage:
+
+    >>> with client.Semaphore('downstream', limit=10):
+    ...     call_the_downstream()
+    """
+
+    def __init__(self, client, name, limit, ttl=Mutex.DEFAULT_TTL, session=None, lock_prefix='_semaphore'):
+        """
+        :type client: BaseClient
+        :param client: instance of etcd.Client
+        :type name: str
+        :param name: the name of the semaphore
+        :type limit: int
+        :param limit: the max number of the holders at the same time
+        :type ttl: int
+        :param ttl: the TTL of the shared session of the client, ignored if session is given [default: 60]
+        :type session: Session
+        :param session: the session to attach the key to, None means the shared session of the client
+            with the ttl [default: None]
+        :type lock_prefix: str
+        :param lock_prefix: the prefix of the semaphore keys [default: '_semaphore']
+        """
+        if limit < 1:
+            raise ValueError("limit should be at least 1")
+        super(Semaphore, self).__init__(client, name, ttl=ttl, session=session, lock_prefix=lock_prefix)
+        self.limit = limit
+
+    def _position(self):
+        """
+        :return: (number of the keys before the waiter's, kv of the key right before the waiter's,
+            if the waiter's key exists, revision of the response)
+        """
+        txn = self.client.Txn()
+        txn.Then(txn.range(self.key, count_only=True))
+        txn.Then(txn.range(self._wait_prefix, prefix=True, count_only=True, max_create_revision=self.revision - 1))
+        txn.Then(self._first_range(txn, sort_order=RangeRequestSortOrder.DESCEND, keys_only=True,
+                                   max_create_revision=self.revision - 1))
+        r = txn.commit()
+        return (int(r.responses[1].response_range.count or 0), self._first_kv(r.responses[2]),
+                bool(r.responses[0].response_range.count), r.header.revision)
+
+    def _mark_held(self):
+        """
+        Put a value to the key of the admitted waiter to wake up the next waiter watching it
+        """
+        txn = self.client.Txn()
+        txn.If(txn.key(self.key).create == self.revision)
+        txn.Then(txn.put(self.key, HELD, ignore_lease=True))
+        if not txn.commit().succeeded:
+            raise EtcdLockError("the key of the waiter is gone, the session may be expired")
+
+    def _wait_change(self, kv, revision, timeout):
+        if kv is None:  # the first waiter, any deletion may release a holder
+            self._watcher = watcher = self.client.Watcher(key=self._wait_prefix, prefix=True, no_put=True,
+                                                          max_retries=0, start_revision=revision + 1)
+        else:
+            self._watcher = watcher = self.client.Watcher(key=kv.key, max_retries=0, start_revision=revision + 1)
+        return watcher.watch_once(timeout=timeout)
+
+    def _wait(self, deadline):
+        while True:
+            ahead, pred, exists, revision = self._position()
+            if not exists:
+                raise EtcdLockError("the key of the waiter is gone, the session may be expired")
+            if ahead < self.limit:
+                self._mark_held()
+                return
+            if ahead == self.limit:
+                pred = None
+                log.debug("waiting for a holder of %s to release" % self.prefix)
+            else:
+                log.debug("waiting for %s to be admitted or deleted" % pred.key)
+            remaining = None if deadline is None else deadline - time.time()
+            if (remaining is not None and remaining <= 0) or not self._wait_change(pred, revision, remaining):
+                raise EtcdLockAcquireTimeout
+
+    @property
+    def is_acquired(self):
+        """
+        if the semaphore is held by this waiter
+        """
+        if self.key is None:
+            return False
+        ahead, _, exists, _ = self._position()
+        return exists and ahead < self.limit
+
+    def holders(self):
+        """
+        :return: list of the keys holding the semaphore
+        """
+        txn = self.client.Txn()
+        txn.Then(txn.range(self.prefix, prefix=True, limit=self.limit, keys_only=True,
+                           sort_target=RangeRequestSortTarget.CREATE, sort_order=RangeRequestSortOrder.ASCEND))
+        return [kv.key for kv in txn.commit().responses[0].response_range.kvs or []]
+
+    def owner(self):
+        """
+        :return: the earliest key holding the semaphore, None if not held
+        """
+        holders = self.holders()
+        return holders[0] if holders else None
@@ -0,0 +1,153 @@
+"""
+A lease shared by the ephemeral keys of a process
+"""
+import threading
+
+from ..errors import ErrLeaseNotFound
+from ..utils import log
+
+
+class Session(object):
+    """
+    A lease granted on the first use and kept alive by a LeaseKeeper, shared by the locks of a client
+
+    If the lease is found expired, the next use grants a new one, the keys attached to the old lease
+    are gone with it.
+
+    Usage:
+
+    >>> session = client.shared_session(ttl=10)
+    >>> client.put('/services/node1', 'addr', lease=session.ID)
+    """
+
+    DEFAULT_TTL = 60
+
+    def __init__(self, client, ttl=DEFAULT_TTL, keeper=None):
+        """
+        :type client: Client
+        :param client: client instance of etcd3
+        :type ttl: int
+        :param ttl: the TTL of the lease [default: 60]
+        :type keeper: LeaseKeeper
+        :param keeper: keep the lease alive by this keeper, None means a keeper of the session [default: None]
+        """
+        self.client = client
+        self.grantedTTL = max(2, ttl)
+        self._own_keeper = keeper is None
+        self.keeper = client.LeaseKeeper() if keeper is None else keeper
+        self.closed = False
+        self._ID = None
+        self._kept = {}  # ID -> count of the other leases kept alive with the session
+        self._lock = threading.Lock()
+
+    @property
+    def ID(self):
+        """
+        Property: the id of the lease, granted if not granted yet
+
+        :return: int
+        """
+        with self._lock:
+            if self.closed:
+                raise RuntimeError("session is closed")
+            if self._ID is None:
+                r = self.client.lease_grant(self.grantedTTL)
+                self._ID = r.ID
+                log.debug("granted lease %d for the session" % r.ID)
+                self.keeper.add(r.ID, r.TTL, on_expire=self._expired)
+                self.keeper.start()
+            return self._ID
+
+    @property
+    def keeping(self):
+        """
+        Property: if the lease is granted and kept alive
+
+        :return: bool
+        """
+        ID = self._ID
+        return ID is not None and ID in self.keeper
+
+    def _expired(self, ID):
+        with self._lock:
+            if self._ID != ID:
+                return
+            self._ID = None
+        log.warning("lease %d of the session expired" % ID)
+
+    def lost(self, ID):
+        """
+        Drop the lease found not existing, the next use grants a new one
+        """
+        self.keeper.remove(ID)
+        self._expired(ID)
+
+    def alive(self):
+        """
+        Tell if the lease is granted and still alive
+
+        :return: bool
+        """
+        ID = self._ID
+        if ID is None:
+            return False
+        r = self.client.lease_time_to_live(ID)
+        return 'TTL' in r and r.TTL > 0
+
+    def keep(self, ID, ttl):
+        """
+        Keep another lease alive with the session until unkeep is called as many times
+        """
+        with self._lock:
+            self._kept[ID] = self._kept.get(ID, 0) + 1
+            if self._kept[ID] == 1:
+                self.keeper.add(ID, ttl)
+                self.keeper.start()
+
+    def unkeep(self, ID):
+        with self._lock:
+            n = self._kept.pop(ID, 0) - 1
+            if n > 0:
+                self._kept[ID] = n
+            elif ID != self._ID:
+                self.keeper.remove(ID)
+
+    def revoke(self):
+        """
+        Revoke the lease, which deletes the keys attached to it, the next use grants a new one
+        """
+        with self._lock:
+            ID, self._ID = self._ID, None
+        if ID is None:
+            return
+        self.keeper.remove(ID)
+        log.debug("revoking lease %d of the session" % ID)
+        try:
+            self.client.lease_revoke(ID)
+        except ErrLeaseNotFound:
+            pass
+
+    def close(self, revoke=True):
+        """
+        Stop keeping the leases alive
+
+        :type revoke: bool
+        :param revoke: revoke the lease of the session [default: True]
+        """
+        if revoke:
+            self.revoke()
+        with self._lock:
+            self.closed = True
+            ID, self._ID = self._ID, None
+            kept, self._kept = self._kept, {}
+        for i in [ID] + list(kept):
+            if i is not None:
+                self.keeper.remove(i)
+        if self._own_keeper:
+            self.keeper.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,139 @@
+"""
+Read several ranges as one consistent view at a single revision
+"""
+from multiprocessing.pool import ThreadPool
+
+import six
+
+from .planner import key_range
+from ..errors import ErrCompacted
+from ..utils import log
+
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_MAX_WORKERS = 8
+
+
+class Snapshot(object):
+    """
+    The key-values of the ranges at the same revision, in the order of the requested ranges
+    """
+
+    def __init__(self, revision, results):
+        """
+        :type revision: int
+        :param revision: the revision all the ranges are read at
+        :type results: list
+        :param results: list of the key-values of each range
+        """
+        self.revision = revision
+        self.results = results
+
+    def __getitem__(self, item):
+        return self.results[item]
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+    def __repr__(self):
+        return "<Snapshot of %d ranges at revision %s>" % (len(self.results), self.revision)
+
+
+def _range_params(r):
+    """
+    :return: the kwargs of KVAPI.range with the key range in key and range_end
+    """
+    params = {'key': r, 'prefix': True} if isinstance(r, (six.string_types, six.binary_type)) else dict(r)
+    key, range_end = key_range(params)
+    for k in ('prefix', 'all', 'revision', 'range_end'):
+        params.pop(k, None)
+    params['key'] = key
+    if range_end is not None:
+        params['range_end'] = range_end
+    return params
+
+
+def iter_pages(client, params, revision=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Read a range page by page at one revision
+
+    :type params: dict
+    :param params: the kwargs of KVAPI.range with the key range in key and range_end
+    :type revision: int
+    :param revision: the revision to read at, None means the revision of the first page
+    :type page_size: int
+    :param page_size: keys per page, 0 means no paging
+    :return: generator of range responses
+    """
+    params = dict(params)
+    paged = page_size and 'range_end' in params and not params.get('limit') and not params.get('sort_order') \
+        and not params.get('count_only')
+    if paged:
+        params['limit'] = page_size
+    while True:
+        r = client.range(revision=revision, **params)
+        if revision is None:  # the header revision is the current one even if reading an older revision
+            revision = r.header.revision
+        yield r
+        if not (paged and r.more and r.kvs):
+            return
+        params['key'] = r.kvs[-1].key + b'\0'
+
+
+def _read_range(client, params, revision, page_size):
+    """
+    Read all the pages of a range
+
+    :return: (list of key-values, the revision of the response)
+    """
+    kvs = []
+    for r in iter_pages(client, params, revision, page_size):
+        if revision is None:
+            revision = r.header.revision
+        kvs.extend(r.kvs or ())
+    return kvs, revision
+
+
+def snapshot_read(client, ranges, page_size=DEFAULT_PAGE_SIZE, max_workers=DEFAULT_MAX_WORKERS, max_retries=3):
+    """
+    Read the ranges at one revision
+
+    The first range is read at the current revision, the others are read concurrently at the revision
+    of the first response. If the revision is compacted during the read, the snapshot is read again
+    at a newer revision.
+
+    :type client: Client
+    :param client: client instance of etcd3
+    :type ranges: list
+    :param ranges: a key prefix (str or bytes), or the kwargs of KVAPI.range (dict) of each range
+    :type page_size: int
+    :param page_size: read a range in pages of page_size keys, 0 means no paging [default: 1000]
+    :type max_workers: int
+    :param max_workers: max concurrent range requests [default: 8]
+    :type max_retries: int
+    :param max_retries: max retries on compaction [default: 3]
+    :return: Snapshot
+    """
+    params = [_range_params(r) for r in ranges]
+    if not params:
+        return Snapshot(None, [])
+    retries = 0
+    while True:
+        try:
+            first, revision = _read_range(client, params[0], None, page_size)
+            results = [first]
+            if len(params) > 1:
+                pool = ThreadPool(min(max_workers, len(params) - 1))
+                try:
+                    results.extend(kvs for kvs, _ in pool.map(
+                        lambda p: _read_range(client, p, revision, page_size), params[1:]))
+                finally:
+                    pool.close()
+            return Snapshot(revision, results)
+        except ErrCompacted:
+            if retries >= max_retries:
+                raise
+            retries += 1
+            log.debug("the revision is compacted during the snapshot read, retrying (times:%d)" % retries)
@@ -3,13 +3,18 @@ import re
 import socket
 import threading
 import time
+from collections import OrderedDict
+from base64 import b64decode
 from collections import deque
 
 import six
 from requests import ConnectionError
 from requests.exceptions import ChunkedEncodingError
 
+from .metrics import WatchMetrics
+from .planner import plan_request
 from ..errors import Etcd3WatchCanceled
+from ..errors import Etcd3WatchCompacted
 from ..models import EventEventType
 from ..utils import check_param
 from ..utils import get_ident
@@ -25,62 +30,219 @@ class OnceTimeout(IOError):
     pass
 
 
-class KeyValue(object):  # pragma: no cover
+def _int(v):
+    return int(v) if v is not None else None
+
+
+def _bytes(v):
+    return b64decode(v) if v is not None else None
+
+
+class _SlotsMapping(object):
     """
-    Model of the key-value of the event
+    dict-like read access to the set fields of a __slots__ object
     """
-
-    def __init__(self, data):
-        self._data = data
-        self.key = data.get('key')
-        self.create_revision = data.get('create_revision')
-        self.mod_revision = data.get('mod_revision')
-        self.value = data.get('value')
-        self.lease = data.get('lease')
+    __slots__ = ()
+    _fields = ()
 
     def get(self, key, default=None):
-        return self._data.get(key, default)
+        if key not in self._fields:
+            return default
+        v = getattr(self, key)
+        return default if v is None else v
 
     def __getitem__(self, item):
-        return self._data.get(item)
+        return self.get(item)
 
     def __iter__(self):
-        return iter(self._data)
+        return (f for f in self._fields if getattr(self, f) is not None)
 
     def __contains__(self, item):
-        return item in self._data
+        return self.get(item) is not None
+
+
+class ResponseHeader(_SlotsMapping):
+    """
+    Model of the header of the watch response
+    """
+    __slots__ = _fields = ('cluster_id', 'member_id', 'revision', 'raft_term')
+
+    def __init__(self, data):
+        """
+        :param data: dict decoded from the json of etcdserverpbResponseHeader
+        """
+        self.cluster_id = int(data.get('cluster_id', 0))
+        self.member_id = int(data.get('member_id', 0))
+        self.revision = int(data.get('revision', 0))
+        self.raft_term = int(data.get('raft_term', 0))
+
+    def __repr__(self):
+        return "<ResponseHeader at revision %s>" % self.revision
+
+
+class KeyValue(_SlotsMapping):  # pragma: no cover
+    """
+    Model of the key-value of the event
+    """
+    __slots__ = _fields = ('key', 'create_revision', 'mod_revision', 'version', 'value', 'lease')
+
+    def __init__(self, data):
+        """
+        :param data: dict decoded from the json of mvccpbKeyValue (bytes in base64 and int64 in string)
+        """
+        get = data.get
+        self.key = _bytes(get('key'))
+        self.create_revision = _int(get('create_revision'))
+        self.mod_revision = _int(get('mod_revision'))
+        self.version = _int(get('version'))
+        self.value = _bytes(get('value'))
+        self.lease = _int(get('lease'))
 
     def __repr__(self):
         return "<KeyValue of '%s'>" % self.key
 
 
+_EVENT_TYPES = {'PUT': EventType.PUT, 'DELETE': EventType.DELETE}
+
+
 class Event(KeyValue):
     """
     Watch event
     """
+    __slots__ = ('type', 'prev_kv', 'header')
+    _fields = KeyValue._fields + ('type', 'prev_kv')
 
     def __init__(self, data, header=None):
         """
-        :param data: dict data of a etcdserverpbWatchResponse.events[<mvccpbEvent>]
+        :param data: dict decoded from the json of a etcdserverpbWatchResponse.events[<mvccpbEvent>]
         :param header: the header of etcdserverpbWatchResponse
         """
-        super(Event, self).__init__(data.kv._data)
+        super(Event, self).__init__(data.get('kv') or {})
         self.header = header
-        self.type = data.type or EventType.PUT  # default is PUT
-        self._data['type'] = self.type
-        self.prev_kv = None
-        if 'prev_kv' in data:
-            self.prev_kv = KeyValue(data.prev_kv._data)
-        self._data['prev_kv'] = self.prev_kv
+        self.type = _EVENT_TYPES[data.get('type', 'PUT')]  # default is PUT
+        prev_kv = data.get('prev_kv')
+        self.prev_kv = KeyValue(prev_kv) if prev_kv is not None else None
 
     def __repr__(self):
         return "<WatchEvent %s '%s'>" % (self.type.value, self.key)
 
 
+class WatchResponse(_SlotsMapping):
+    """
+    Model of the watch response, built from the json frame of the stream without the generic swagger model
+    """
+    __slots__ = ('_keys', 'header', 'watch_id', 'created', 'canceled', 'compact_revision', 'cancel_reason',
+                 'events')
+    _fields = ('header', 'watch_id', 'created', 'canceled', 'compact_revision', 'cancel_reason', 'events')
+
+    def __init__(self, data):
+        """
+        :param data: dict decoded from the json of etcdserverpbWatchResponse, or the stream frame wraps it in 'result'
+        """
+        if 'result' in data:
+            data = data['result']
+        self._keys = frozenset(data)
+        self.header = header = ResponseHeader(data.get('header') or {})
+        self.watch_id = int(data.get('watch_id', 0))
+        self.created = data.get('created', False)
+        self.canceled = data.get('canceled', False)
+        self.compact_revision = int(data.get('compact_revision', 0))
+        self.cancel_reason = data.get('cancel_reason', '')
+        self.events = [Event(e, header) for e in data.get('events', ())]
+
+    def __contains__(self, item):
+        return item in self._keys
+
+    def __repr__(self):
+        return "<WatchResponse of %d events at revision %s>" % (len(self.events), self.header.revision)
+
+
+class EventBatch(list):
+    """
+    Events delivered together to the callbacks added by Watcher.onBatch,
+    either all the events of one watch response or the coalesced events of one window
+    """
+
+    def __init__(self, events, header=None):
+        """
+        :type events: list of Event
+        :param events: the events
+        :param header: the header of the (latest) etcdserverpbWatchResponse
+        """
+        super(EventBatch, self).__init__(events)
+        self.header = header
+
+    @property
+    def revision(self):
+        """
+        the revision of the header
+        """
+        if self.header is None:
+            return
+        return self.header.revision
+
+    def __repr__(self):
+        return "<EventBatch of %d events at revision %s>" % (len(self), self.revision)
+
+
+class _Coalescer(object):
+    """
+    Buffer the events for a time window, only deliver the newest event of each key
+    """
+
+    def __init__(self, window, deliver):
+        """
+        :type window: float
+        :param window: the time window in seconds
+        :type deliver: callable
+        :param deliver: called with an EventBatch when the window ends
+        """
+        self.window = window
+        self.deliver = deliver
+        self._events = OrderedDict()
+        self._header = None
+        self._timer = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def add(self, batch):
+        with self._lock:
+            for event in batch:
+                self._events.pop(event.key, None)  # keep the keys ordered by their newest event
+                self._events[event.key] = event
+            self._header = batch.header
+            if self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush_in_timer)
+                self._timer.setDaemon(True)
+                self._timer.start()
+
+    def _flush_in_timer(self):
+        try:
+            self.flush()
+        except Exception:
+            log.exception("error occurred while delivering coalesced events")
+
+    def flush(self):
+        """
+        Deliver the buffered events now
+        """
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                events = list(self._events.values())
+                self._events = OrderedDict()
+                header = self._header
+            if events:
+                self.deliver(EventBatch(events, header))
+
+
 class Watcher(object):
     @check_param(at_least_one_of=['key', 'all'], at_most_one_of=['range_end', 'prefix', 'all'])
     def __init__(self, client, max_retries=-1, key=None, range_end=None, start_revision=None, progress_notify=None,
-                 prev_kv=None, prefix=None, all=None, no_put=False, no_delete=False):
+                 prev_kv=None, prefix=None, all=None, no_put=False, no_delete=False, executor=None,
+                 coalesce_ms=None, pushdown=False, probe_interval=None):
         """
         Initialize a watcher
 
@@ -114,6 +276,18 @@ class Watcher(object):
         :param no_put: filter out the put events at server side before it sends back to the watcher. [default: False]
         :type no_delete: bool
         :param no_delete: filter out the delete events at server side before it sends back to the watcher. [default: False]
+        :type executor: CallbackExecutor
+        :param executor: run the callbacks in the thread pool of the executor instead of the stream-reading thread,
+            the executor can be shared by multiple watchers [default: None]
+        :type coalesce_ms: int
+        :param coalesce_ms: if set, events are buffered for a window of this milliseconds
+            and only the newest event of each key in the window is delivered to the callbacks [default: None]
+        :type pushdown: bool
+        :param pushdown: narrow the watch request by the filters of the callbacks, so the server doesn't send
+            the events that no callback wants, the request is re-created when the callbacks change [default: False]
+        :type probe_interval: float
+        :param probe_interval: if set, read the head revision by a status request in every this seconds
+            to measure the delivery lag in stats() [default: None]
         """
         self.client = client
         self.revision = None
@@ -124,6 +298,7 @@ class Watcher(object):
             max_retries = 9223372036854775807  # maxint
         self.max_retries = max_retries
         self.callbacks = []
+        self.batch_callbacks = []
         self.callbacks_lock = threading.Lock()
         self.watching = False
         self.timeout = None  # only meaningful for watch_once
@@ -131,6 +306,10 @@ class Watcher(object):
         self._thread = None
         self._resp = None
         self._once = False
+        self._reactor = None  # the WatchReactor that the watcher is running on
+        self._plan = None  # the key range and filters of the running watch request
+        self._replanning = False
+        self._once_filter = None
 
         self.key = key
         self.range_end = range_end
@@ -141,6 +320,12 @@ class Watcher(object):
         self.all = all
         self.no_put = no_put
         self.no_delete = no_delete
+        self.executor = executor
+        self.coalesce_ms = coalesce_ms
+        self.pushdown = pushdown
+        self.probe_interval = probe_interval
+        self.metrics = WatchMetrics()
+        self._probe_thread = None
 
     def set_default_timeout(self, timeout):
         """
@@ -164,19 +349,64 @@ class Watcher(object):
         """
         with self.callbacks_lock:
             self.callbacks = []
+            self.batch_callbacks = []
+        self._replan()
 
-    def request_create(self):
+    def _filters(self):
+        if self._once:
+            return [(self._once_filter, None)]
+        with self.callbacks_lock:
+            return [(raw_filter, prev_kv) for _, raw_filter, _, prev_kv in self.callbacks + self.batch_callbacks]
+
+    def plan(self):
         """
-        Start a watch request
+        Get the key range and the filters of the watch create request,
+        narrowed by the filters of the callbacks if pushdown is enabled
+
+        :return: dict
+        """
+        params = dict(
+            key=self.key, range_end=self.range_end, prefix=self.prefix, all=self.all,
+            prev_kv=self.prev_kv, no_put=self.no_put, no_delete=self.no_delete
+        )
+        if self.pushdown:
+            params = plan_request(params, self._filters())
+        return params
+
+    def _replan(self):
+        """
+        Re-create the running watch request if the callbacks changed its plan
+        """
+        if not (self.pushdown and self.watching) or self._once or self._plan is None:
+            return
+        if self.plan() == self._plan:
+            return
+        log.debug("watch plan changed, re-watching")
+        self.metrics.replans += 1
+        if self._reactor is not None:
+            self._reactor.rewatch(self)
+        else:
+            self._replanning = True
+            self._kill_response_stream()
+
+    def request_params(self):
+        """
+        Get the params of the watch create request, continue from the last watched revision if there is one
+
+        :return: dict
         """
         if self.revision is not None:  # continue last watch
             self.start_revision = self.revision + 1
-        return self.client.watch_create(
-            key=self.key, range_end=self.range_end, start_revision=self.start_revision,
-            progress_notify=self.progress_notify, prev_kv=self.prev_kv,
-            prefix=self.prefix, all=self.all, no_put=self.no_put, no_delete=self.no_delete,
-            timeout=self.timeout
-        )
+        params = self.plan()
+        self._plan = dict(params)
+        params.update(start_revision=self.start_revision, progress_notify=self.progress_notify)
+        return params
+
+    def request_create(self):
+        """
+        Start a watch request
+        """
+        return self.client.watch_create(timeout=self.timeout, **self.request_params())
 
     def request_cancel(self):  # pragma: no cover
         """
@@ -222,7 +452,7 @@ class Watcher(object):
             raise TypeError('expect filter to be one of string, EventType, callable got %s' % type(filter))
         return filter_func
 
-    def onEvent(self, filter_or_cb, cb=None):
+    def onEvent(self, filter_or_cb, cb=None, prev_kv=None):
         """
         Add a callback to a event that matches the filter
 
@@ -232,6 +462,9 @@ class Watcher(object):
         :type filter_or_cb: callable or regex string or EventType
         :param filter_or_cb: filter or callback function
         :param cb: the callback function
+        :type prev_kv: bool
+        :param prev_kv: whether the callback uses event.prev_kv, only used by pushdown,
+            None means as the prev_kv of the watcher [default: None]
         """
         if cb:
             filter = filter_or_cb
@@ -242,7 +475,8 @@ class Watcher(object):
             raise TypeError('callback should be a callable')
         filter_func = self.get_filter(filter)
         with self.callbacks_lock:
-            self.callbacks.append((filter_func, filter, cb))
+            self.callbacks.append((filter_func, filter, cb, prev_kv))
+        self._replan()
 
     @check_param(at_least_one_of=['filter', 'cb'])
     def unEvent(self, filter=None, cb=None): # noqa # ignore redefinition of filter
@@ -256,12 +490,65 @@ class Watcher(object):
         """
         with self.callbacks_lock:
             for i in reversed(range(len(self.callbacks))):
-                efilter, eraw_filter, ecb = self.callbacks[i]
+                efilter, eraw_filter, ecb, _ = self.callbacks[i]
                 if cb is not None and ecb != cb:
                         continue
                 if filter is not None and filter not in (efilter, eraw_filter):
                         continue
                 del self.callbacks[i]
+        self._replan()
+
+    def onBatch(self, cb, filter=None, prev_kv=None):
+        """
+        Add a callback that receives all the events of a watch response (or of a coalesce window) together
+
+        The callback is called with an EventBatch, which is a list of Event with the header of the response.
+        It's useful for consumers that rebuild states, so they rebuild once per burst instead of once per event.
+
+        :param cb: the callback function
+        :type filter: callable or regex string or EventType
+        :param filter: only the events match the filter will be in the batch,
+            the callback won't be called if none of the events matches
+        :type prev_kv: bool
+        :param prev_kv: whether the callback uses event.prev_kv, only used by pushdown [default: None]
+        """
+        if not callable(cb):
+            raise TypeError('callback should be a callable')
+        filter_func = self.get_filter(filter)
+        with self.callbacks_lock:
+            self.batch_callbacks.append((filter_func, filter, cb, prev_kv))
+        self._replan()
+
+    def unBatch(self, cb):
+        """
+        remove a callback that's been previously added via onBatch()
+
+        :param cb: the callback funtion
+        """
+        with self.callbacks_lock:
+            self.batch_callbacks = [i for i in self.batch_callbacks if i[2] != cb]
+        self._replan()
+
+    def dispatch_batch(self, batch):
+        """
+        Dispatch every event of the batch to the callbacks, then the batch to the batch callbacks
+
+        :param batch: EventBatch
+        """
+        for event in batch:
+            self.dispatch_event(event)
+        with self.callbacks_lock:
+            batch_callbacks = list(self.batch_callbacks)
+        for filtr, raw_filter, cb, _ in batch_callbacks:
+            if raw_filter is None:
+                events = batch
+            else:
+                events = EventBatch([e for e in batch if filtr(e)], batch.header)
+            if events:
+                start = time.time()
+                cb(events)
+                self.metrics.callback_latency.observe(time.time() - start)
+        self.metrics.on_events(batch)
 
     def dispatch_event(self, event):
         """
@@ -271,12 +558,19 @@ class Watcher(object):
         """
         log.debug("dispatching event '%s'" % event)
         with self.callbacks_lock:
-            callbacks = list( cb for filtr, _, cb in self.callbacks if filtr(event) )
+            callbacks = list( cb for filtr, _, cb, _ in self.callbacks if filtr(event) )
+        if not callbacks:
+            return
+        if self.executor is not None:
+            self.executor.submit(event, callbacks)
+            return
         for cb in callbacks:
+            start = time.time()
             cb(event)
+            self.metrics.callback_latency.observe(time.time() - start)
 
     def _ensure_callbacks(self):
-        if not self.callbacks:
+        if not (self.callbacks or self.batch_callbacks):
             raise TypeError("haven't watch on any event yet, use onEvent to watch a event")
 
     def _ensure_not_watching(self):
@@ -307,13 +601,21 @@ class Watcher(object):
         self._ensure_callbacks()
         self._ensure_not_watching()
         self.errors.clear()
+        coalescer = None
+        deliver = self.dispatch_batch
+        if self.coalesce_ms:
+            coalescer = _Coalescer(self.coalesce_ms / 1000.0, self.dispatch_batch)
+            deliver = coalescer.add
         try:
             with self:
-                for event in self:
-                    self.dispatch_event(event)
+                for r in self.iter_responses():
+                    if r.events:
+                        deliver(EventBatch(r.events, r.header))
         finally:
             self._kill_response_stream()
             self.watching = False
+            if coalescer:
+                coalescer.flush()
 
     def stop(self):
         """
@@ -321,6 +623,8 @@ class Watcher(object):
         """
         log.debug("stop watching")
         self.watching = False
+        if self._reactor is not None:
+            self._reactor.remove(self)
         self._kill_response_stream()
         if self._thread and self._thread.is_alive() and self._thread.ident != get_ident():
             self._thread.join()
@@ -342,6 +646,7 @@ class Watcher(object):
         watch the filtered event, once have event, return it
         if timed out, return None
         """
+        self._once_filter = filter
         filter = self.get_filter(filter)
         old_timeout = self.timeout
         self.timeout = timeout
@@ -356,6 +661,7 @@ class Watcher(object):
         finally:
             self.stop()
             self._once = False
+            self._once_filter = None
             self.timeout = old_timeout
 
     def __enter__(self):
@@ -370,6 +676,75 @@ class Watcher(object):
         self.stop()
 
     def __iter__(self):
+        for r in self.iter_responses():
+            for event in r.events:
+                yield event
+
+    def stats(self):
+        """
+        Snapshot of the metrics of the watcher: events and bytes (total and rate per second),
+        revision_lag, delivery_lag (needs probe_interval), callback_latency, reconnects and replans
+
+        :return: dict
+        """
+        rt = self.metrics.snapshot()
+        rt['watching'] = self.watching
+        rt['revision'] = self.revision
+        if self.executor is not None:
+            rt['executor'] = self.executor.stats()
+        return rt
+
+    def _probe(self):
+        while self.watching:
+            time.sleep(self.probe_interval)
+            if not self.watching:
+                return
+            probed_at = time.time()
+            try:
+                revision = self.client.status().header.revision
+            except Exception:
+                log.debug("failed probing the head revision", exc_info=True)
+                continue
+            self.metrics.on_probe(revision, probed_at)
+
+    def _ensure_probe(self):
+        if not self.probe_interval or (self._probe_thread and self._probe_thread.is_alive()):
+            return
+        t = self._probe_thread = threading.Thread(target=self._probe)
+        t.setDaemon(True)
+        t.start()
+
+    def check_response(self, r, size=0):
+        """
+        Update the state of the watcher by a watch response
+
+        :param r: WatchResponse
+        :type size: int
+        :param size: bytes of the response, for the metrics
+        :return: Etcd3WatchCanceled if the watch is canceled by the server, else None
+        """
+        self.revision = r.header.revision
+        self.metrics.on_response(r, size)
+        if 'created' in r:
+            log.debug("watch request created")
+            self.start_revision = r.header.revision
+            self.watch_id = r.watch_id
+            self._ensure_probe()
+        if ('canceled' in r and r.canceled) or ('compact_revision' in r and r.compact_revision):
+            # etcd version < 3.3 returns compact_revision without canceled
+            if 'compact_revision' in r and r.compact_revision > 0:
+                return Etcd3WatchCompacted("watch on compacted revision: %d" % self.start_revision, r,
+                                           r.compact_revision)
+            return Etcd3WatchCanceled(r.cancel_reason, r)
+
+    def iter_responses(self, raise_timeout=False):
+        """
+        Iterate over the watch responses (including the ones without events, like progress notifications),
+        retry and re-watch as __iter__ does
+
+        :type raise_timeout: bool
+        :param raise_timeout: raise OnceTimeout instead of re-watching if no response in the timeout of the watcher
+        """
         self.errors.clear()
         retries = 0
         while True:
@@ -385,50 +760,43 @@ class Watcher(object):
                 if not self._resp or self._resp.raw.closed:
                     self._resp = self.request_create()
                 with self._resp as w:
-                    event_stream = iter(w)
+                    event_stream = w.iter_data()
+                    received = w.received_bytes
                     while self.watching:
                         if self._resp.raw._fp.fp is None:
                             raise ConnectionError("response connection closed")
-                        r = next(event_stream)
+                        r = WatchResponse(next(event_stream))
                         log.debug("got a watch response")
-                        self.revision = r.header.revision
-                        if 'created' in r:
-                            log.debug("watch request created")
-                            self.start_revision = r.header.revision
-                            self.watch_id = r.watch_id
-                        if ('canceled' in r and r.canceled) or ('compact_revision' in r and r.compact_revision):
-                            # etcd version < 3.3 returns compact_revision without canceled
-                            compacted = False
-                            if 'compact_revision' in r and r.compact_revision > 0:
-                                compacted = True
-                                err = Etcd3WatchCanceled("watch on compacted revision: %d" % self.start_revision, r)
-                            else:
-                                err = Etcd3WatchCanceled(r.cancel_reason, r)
+                        err = self.check_response(r, w.received_bytes - received)
+                        received = w.received_bytes
+                        if err:
                             if retries == 0 or retries >= self.max_retries:  # first request raise error to caller
                                 raise err
                             else:
                                 self.errors.append(err)
                                 log.debug("failed watching (times:%d) retrying %s" % (retries, err))
-                                if compacted:
+                                if 'compact_revision' in r and r.compact_revision > 0:
                                     self.revision = r.compact_revision - 1  # next request start from compact_revision
                                 self._kill_response_stream()  # close connection and throw Connection error
-                        if 'events' in r:
-                            for event in r.events:
-                                yield Event(event, r.header)
+                        yield r
             except (ConnectionError, ChunkedEncodingError) as e:
                 # ConnectionError(MaxRetryError) means cannot reach the server
                 if 'Max retries exceeded with url' in str(e):
                     raise  # no need to retry
-                elif 'Read timed out.' in str(e) and self._once:  # if timed out and doing watch_once
+                elif 'Read timed out.' in str(e) and (self._once or raise_timeout):  # if timed out and doing watch_once
                     raise OnceTimeout
                 # ChunkedEncodingError usually means we lost the connection, could cause by watcher.stop()
                 elif not self.watching:
                     # raise StopIteration  # watch stopped by user
                     return
+                elif self._replanning:  # closed by _replan, re-watch with the new plan right now
+                    self._replanning = False
+                    continue
                 if retries < self.max_retries:  # connection unexpectedly or just reached the timeout
                     self.errors.append(e)
                     log.debug("failed watching (times:%d) retrying %s" % (retries, e))
                     retries += 1
+                    self.metrics.reconnects += 1
                 else:
                     # self.watching = False # no need the stop() always called in a with context
                     self.stop()
@@ -5,6 +5,7 @@ import functools
 import itertools
 import logging
 import os
+import re
 import shlex
 import sys
 import time
@@ -313,9 +314,13 @@ class cached_property(object):  # pragma: no cover
 
 _lb = b'{'
 _rb = b'}'
+_qt = b'"'
+_bs = b'\\'
 if six.PY3:  # pragma: no cover
     _lb = ord(_lb)
     _rb = ord(_rb)
+    _qt = ord(_qt)
+    _bs = ord(_bs)
 
 
 def iter_json_string(chunk, start=0, lb=_lb, rb=_rb, resp=None, err_cls=ValueError):
@@ -340,6 +345,82 @@ def iter_json_string(chunk, start=0, lb=_lb, rb=_rb, resp=None, err_cls=ValueErr
     yield False, chunk[last_i:], last_i - 1
 
 
+class JSONFramer(object):
+    """
+    Incrementally split a byte stream of concatenated json objects into frames of single objects
+
+    Unlike iter_json_string, it keeps the scanning state between feeds, so every byte is scanned only once,
+    and it does not break on braces inside json strings.
+
+    >>> framer = JSONFramer()
+    >>> framer.feed(b'{"a": 1}{"b"')
+    [b'{"a": 1}']
+    >>> framer.feed(b': "}"}')
+    [b'{"b": "}"}']
+    """
+    _special = re.compile(br'[{}"\\]')
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.pos = 0  # where the next scan starts
+        self.start = 0  # start of the current frame
+        self.depth = 0
+        self.in_string = False
+
+    def __len__(self):
+        return len(self.buf)
+
+    def feed(self, data):
+        """
+        :type data: bytes
+        :param data: the next piece of the stream
+        :return: list of complete json objects in bytes
+        """
+        buf = self.buf
+        buf.extend(data)
+        frames = []
+        pos = self.pos
+        search = self._special.search
+        while True:
+            m = search(buf, pos)
+            if not m:
+                break
+            i = m.start()
+            c = buf[i]
+            pos = i + 1
+            if self.in_string:
+                if c == _bs:
+                    if pos >= len(buf):  # the escaped char has not arrived yet
+                        pos = i
+                        break
+                    pos += 1
+                elif c == _qt:
+                    self.in_string = False
+            elif c == _qt:
+                self.in_string = True
+            elif c == _lb:
+                if self.depth == 0:
+                    self.start = i
+                self.depth += 1
+            elif c == _rb:
+                self.depth -= 1
+                if self.depth == 0:
+                    frames.append(bytes(buf[self.start:pos]))
+                    self.start = pos
+                elif self.depth < 0:
+                    raise ValueError("Stream decode error: unexpected '}'")
+        if self.depth == 0 and not self.in_string:
+            # nothing but delimiters left before pos
+            del buf[:pos]
+            self.start = pos = 0
+        elif self.start:
+            del buf[:self.start]
+            pos -= self.start
+            self.start = 0
+        self.pos = pos
+        return frames
+
+
 def enum_value(e):  # pragma: no cover
     if isinstance(e, enum.Enum):
         return e.value
@@ -0,0 +1,96 @@
+"""
+Benchmark the latency and the requests of acquiring and releasing an uncontended Lock
+
+usage: python scripts/bench_lock.py [--host 127.0.0.1] [--port 2379] [--rounds 200] [--lock-ttl 60]
+
+The `lease-per-acquire` row runs the uncontended path of the recipe before the session lease:
+range the lock key, grant a lease, put the key by a txn, keep the lease alive, and revoke it on release.
+"""
+import argparse
+import time
+import uuid
+
+from etcd3 import Client
+from etcd3 import Lock
+
+
+class CountingClient(Client):
+    """
+    Client counting the requests by method
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(CountingClient, self).__init__(*args, **kwargs)
+        self.requests = {}
+
+    def call_rpc(self, method, data=None, stream=False, encode=True, raw=False, **kwargs):
+        self.requests[method] = self.requests.get(method, 0) + 1
+        return super(CountingClient, self).call_rpc(method, data=data, stream=stream, encode=encode, raw=raw,
+                                                    **kwargs)
+
+
+class LeasePerAcquireLock(object):
+    """
+    The uncontended acquire and release of a lock granting a lease per acquire
+    """
+
+    def __init__(self, client, lock_name, lock_ttl):
+        self.client = client
+        self.lock_key = '_locks/%s' % lock_name
+        self.lock_ttl = lock_ttl
+        self.uuid = uuid.uuid4().hex
+        self.lease = None
+
+    def acquire(self):
+        if self.client.range(self.lock_key).kvs:
+            raise RuntimeError("the lock is contended")
+        self.lease = self.client.Lease(self.lock_ttl)
+        self.lease.grant()
+        txn = self.client.Txn()
+        txn.If(txn.key(self.lock_key).value == self.uuid)
+        txn.Else(txn.put(self.lock_key, self.uuid, lease=self.lease.ID))
+        txn.commit()
+        self.lease.keepalive()
+
+    def release(self):
+        lease, self.lease = self.lease, None
+        lease.revoke()
+
+
+def bench(client, name, rounds, lock_ttl, reentrant=None, lock=None):
+    lock = lock or client.Lock('bench-lock', lock_ttl=lock_ttl, reentrant=reentrant)
+    lock.acquire()  # warm up the connection and the session
+    lock.release()
+    client.requests.clear()
+    acquire = release = 0.0
+    for _ in range(rounds):
+        start = time.time()
+        lock.acquire()
+        acquire += time.time() - start
+        start = time.time()
+        lock.release()
+        release += time.time() - start
+    requests = dict(client.requests)
+    print("%-17s acquire %6.2fms  release %6.2fms  requests/round %5.2f  %s" % (
+        name, acquire * 1000 / rounds, release * 1000 / rounds, sum(requests.values()) / float(rounds),
+        ', '.join('%s:%d' % kv for kv in sorted(requests.items()))))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2379)
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--lock-ttl', type=int, default=60)
+    args = parser.parse_args()
+
+    client = CountingClient(args.host, args.port)
+    bench(client, 'lease-per-acquire', args.rounds, args.lock_ttl,
+          lock=LeasePerAcquireLock(client, 'bench-lock', args.lock_ttl))
+    bench(client, 'lock', args.rounds, args.lock_ttl)
+    bench(client, 'reentrant', args.rounds, args.lock_ttl, reentrant=Lock.PROCESS)
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Example and benchmark of ProcessDispatcher: fan CPU-bound event handlers out to worker processes
+
+usage: python scripts/bench_process_dispatcher.py [--events 2000] [--max-processes <cpu count>]
+
+The events/sec should scale near linearly with the processes up to the number of cores,
+while the same handler called by Watcher callbacks in threads is bound by the GIL.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import multiprocessing
+import time
+
+from etcd3 import CallbackExecutor
+from etcd3 import ProcessDispatcher
+from etcd3.stateful.watch import Event
+
+
+def rebuild_route(event):
+    """
+    A CPU-bound handler: parse a big json value and hash every entry of it
+    """
+    table = json.loads(event.value.decode('utf-8'))
+    digest = hashlib.sha256()
+    for route in table:
+        for _ in range(20):
+            digest.update(json.dumps(route, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def make_events(n):
+    value = json.dumps([{'host': '10.0.%d.%d' % (i // 256, i % 256), 'weight': i} for i in range(50)])
+    value = base64.b64encode(value.encode('utf-8')).decode()
+    return [Event({'kv': {'key': base64.b64encode(('/routes/%d' % (i % 64)).encode()).decode(), 'value': value}})
+            for i in range(n)]
+
+
+def bench_threads(events, workers):
+    start = time.time()
+    with CallbackExecutor(workers=workers, maxsize=len(events)) as executor:
+        for e in events:
+            executor.submit(e, [rebuild_route])
+    return len(events) / (time.time() - start)
+
+
+def bench_processes(events, processes):
+    dispatcher = ProcessDispatcher(rebuild_route, processes=processes)
+    dispatcher.start()
+    start = time.time()
+    for e in events:
+        dispatcher(e)
+    dispatcher.join()
+    rate = len(events) / (time.time() - start)
+    dispatcher.shutdown()
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--max-processes', type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+
+    events = make_events(args.events)
+    n = 1
+    while n <= args.max_processes:
+        print("%2d workers: threads %8.0f events/sec, processes %8.0f events/sec" % (
+            n, bench_threads(events, n), bench_processes(events, n)))
+        n *= 2
+
+
+if __name__ == '__main__':
+    main()
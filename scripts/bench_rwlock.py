@@ -0,0 +1,78 @@
+"""
+Benchmark the RWLock against the Mutex under contention of many readers and a writer
+
+usage: python scripts/bench_rwlock.py [--host 127.0.0.1] [--port 2379] [--readers 8] [--duration 5] [--hold 0.01]
+
+The readers of the RWLock hold the lock concurrently, so their acquisitions/sec should scale with the
+readers, while the writer should still get the lock regularly (its max wait is bounded by one hold of
+the readers queued before it).
+"""
+import argparse
+import threading
+import time
+
+from etcd3 import Client
+
+
+def worker(acquire, release, hold, stop, stats):
+    while not stop.is_set():
+        start = time.time()
+        acquire()
+        wait = time.time() - start
+        time.sleep(hold)
+        release()
+        stats['ops'] += 1
+        stats['max_wait'] = max(stats['max_wait'], wait)
+
+
+def bench(client, name, readers, duration, hold, reader_lock, writer_lock):
+    stop = threading.Event()
+    reader_stats = [{'ops': 0, 'max_wait': 0.0} for _ in range(readers)]
+    writer_stats = {'ops': 0, 'max_wait': 0.0}
+    threads = []
+    for stats in reader_stats:
+        acquire, release = reader_lock()
+        threads.append(threading.Thread(target=worker, args=(acquire, release, hold, stop, stats)))
+    acquire, release = writer_lock()
+    threads.append(threading.Thread(target=worker, args=(acquire, release, hold, stop, writer_stats)))
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    print("%-8s readers %7.1f acquisitions/sec (max wait %6.3fs)  writer %6.1f acquisitions/sec (max wait %6.3fs)" % (
+        name, sum(s['ops'] for s in reader_stats) / duration, max(s['max_wait'] for s in reader_stats),
+        writer_stats['ops'] / duration, writer_stats['max_wait']))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2379)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--hold', type=float, default=0.01)
+    args = parser.parse_args()
+
+    client = Client(args.host, args.port)
+
+    def mutex():
+        m = client.Mutex('bench-rwlock')
+        return m.acquire, m.release
+
+    def rw_read():
+        rw = client.RWLock('bench-rwlock')
+        return rw.acquire_read, rw.release_read
+
+    def rw_write():
+        rw = client.RWLock('bench-rwlock')
+        return rw.acquire_write, rw.release_write
+
+    bench(client, 'Mutex', args.readers, args.duration, args.hold, mutex, mutex)
+    bench(client, 'RWLock', args.readers, args.duration, args.hold, rw_read, rw_write)
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark the events/sec and bytes/event of the Watcher pipeline
+
+usage: python scripts/bench_watch_events.py [--host 127.0.0.1] [--port 2379] [--events 20000] [--value-size 128]
+"""
+import argparse
+import base64
+import json
+import threading
+import time
+import tracemalloc
+
+from etcd3 import Client
+from etcd3.stateful.watch import Event
+from etcd3.stateful.watch import WatchResponse
+
+
+def watch_frame(n_events, value_size):
+    value = base64.b64encode(b'x' * value_size).decode()
+    events = []
+    for i in range(n_events):
+        key = base64.b64encode(('/bench/key%06d' % i).encode()).decode()
+        kv = {'key': key, 'create_revision': '100', 'mod_revision': str(1000 + i), 'version': '3', 'value': value}
+        events.append({'kv': kv, 'prev_kv': dict(kv, mod_revision='99')})
+    header = {'cluster_id': '14841639068965178418', 'member_id': '10276657743932975437',
+              'revision': str(1000 + n_events), 'raft_term': '2'}
+    return {'result': {'header': header, 'events': events}}
+
+
+def bench_decode(client, frame, rounds):
+    n_events = len(frame['result']['events'])
+
+    def generic():
+        r = client._modelizeResponseData('/watch', frame).result
+        return [(e, r.header) for e in r.events]
+
+    def compact():
+        return WatchResponse(frame).events
+
+    for name, fn in (('generic model', generic), ('WatchResponse', compact)):
+        start = time.time()
+        for _ in range(rounds):
+            fn()
+        elapsed = time.time() - start
+        print("decode %-14s %10.0f events/sec" % (name, rounds * n_events / elapsed))
+
+
+def bench_memory(frame):
+    raw_events = frame['result']['events']
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    events = [Event(e) for e in raw_events]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(s.size_diff for s in after.compare_to(before, 'filename'))
+    print("memory %-14s %10.0f bytes/event (with prev_kv)" % ('Event', float(size) / len(events)))
+
+
+def bench_watcher(client, n_events, value_size):
+    w = client.Watcher(key='/bench/', prefix=True)
+    done = threading.Event()
+    received = [0]
+
+    def on_event(e):
+        received[0] += 1
+        if received[0] >= n_events:
+            done.set()
+
+    w.onEvent(on_event)
+    w.runDaemon()
+    time.sleep(0.5)
+    value = 'x' * value_size
+    start = time.time()
+    for i in range(n_events):
+        client.put('/bench/key%06d' % (i % 1000), value)
+    put_done = time.time()
+    done.wait(60)
+    elapsed = time.time() - start
+    w.stop()
+    client.delete_range('/bench/', prefix=True)
+    print("watcher (puts %.0f/sec) %10.0f events/sec, %d/%d received" % (
+        n_events / (put_done - start), received[0] / elapsed, received[0], n_events))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2379)
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--value-size', type=int, default=128)
+    args = parser.parse_args()
+
+    client = Client(args.host, args.port)
+    frame = json.loads(json.dumps(watch_frame(100, args.value_size)))
+    bench_decode(client, frame, max(1, args.events // 100))
+    bench_memory(frame)
+    bench_watcher(client, args.events, args.value_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -89,6 +89,7 @@ setup(
         ],
         ':python_version < "3.4"': [
             'enum34>=1.1.6',
+            'selectors34>=1.2',
         ],
     },
 )
@@ -0,0 +1,56 @@
+import pytest
+
+from etcd3 import Client
+from etcd3.stateful.diff import Change, CREATED, MODIFIED, DELETED
+from tests.docker_cli import docker_run_etcd_main
+from .envs import protocol, host
+from .etcd_go_cli import NO_ETCD_SERVICE
+
+
+@pytest.fixture(scope='module')
+def client():
+    """
+    init Etcd3Client, close its connection-pool when teardown
+    """
+    _, p, _ = docker_run_etcd_main()
+    c = Client(host, p, protocol)
+    yield c
+    c.close()
+
+
+def test_change():
+    a, b = Change(CREATED, b'/a', None), Change(CREATED, b'/a', object())
+    assert a == b and hash(a) == hash(b)
+    assert len({a, b, Change(DELETED, b'/a', None)}) == 2
+
+
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_diff(client):
+    client.delete_range('/diff/', prefix=True)
+    for k in ('a', 'b', 'c', 'd'):
+        client.put('/diff/' + k, '1')
+    rev_a = client.put('/diff/e', '1').header.revision
+    assert list(client.diff('/diff/', rev_a)) == []
+
+    client.put('/diff/b', '2')
+    client.put('/diff/f', '1')
+    client.put('/other', '1')
+    rev_b = client.range('/diff/', prefix=True, count_only=True).header.revision
+    # no deletion, the counts shortcut the key comparison
+    changes = list(client.diff('/diff/', rev_a, page_size=1))
+    assert changes == [Change(MODIFIED, b'/diff/b', None), Change(CREATED, b'/diff/f', None)]
+    assert changes[0].kv.value is None
+
+    client.delete_range('/diff/c')
+    client.delete_range('/diff/d')
+    client.put('/diff/d', '2')  # re-created
+    client.put('/diff/g', '1')
+    changes = list(client.diff('/diff/', rev_a, values=True, page_size=2))
+    assert changes == [Change(MODIFIED, b'/diff/b', None), Change(DELETED, b'/diff/c', None),
+                       Change(MODIFIED, b'/diff/d', None), Change(CREATED, b'/diff/f', None),
+                       Change(CREATED, b'/diff/g', None)]
+    assert [c.kv.value for c in changes if c.type != DELETED] == [b'2', b'2', b'1', b'1']
+
+    assert list(client.diff('/diff/', rev_a, rev_b)) == [Change(MODIFIED, b'/diff/b', None),
+                                                        Change(CREATED, b'/diff/f', None)]
+    client.delete_range('/diff/', prefix=True)
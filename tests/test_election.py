@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+
+from etcd3 import Client
+from etcd3.errors import ErrElectionNoLeader
+from etcd3.errors import ErrElectionNotLeader
+from etcd3.stateful.lock import EtcdLockAcquireTimeout
+from tests.docker_cli import docker_run_etcd_main
+from .envs import protocol, host
+from .etcd_go_cli import NO_ETCD_SERVICE
+
+
+@pytest.fixture(scope='module')
+def client():
+    """
+    init Etcd3Client, close its connection-pool when teardown
+    """
+    _, p, _ = docker_run_etcd_main()
+    c = Client(host, p, protocol)
+    yield c
+    c.close()
+
+
+@pytest.mark.timeout(60)
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_election_apis(client):
+    client.delete_range('test-election-api/', prefix=True)
+    with pytest.raises(ErrElectionNoLeader):
+        client.leader('test-election-api')
+    lease = client.Lease(10)
+    lease.grant()
+    r = client.campaign('test-election-api', lease=lease.ID, value='v1')
+    assert r.leader.name == b'test-election-api'
+    assert r.leader.lease == lease.ID
+    assert client.leader('test-election-api').kv.value == b'v1'
+    leader = {'name': r.leader.name, 'key': r.leader.key, 'rev': r.leader.rev, 'lease': r.leader.lease}
+    client.proclaim(leader, 'v2')
+    assert client.leader('test-election-api').kv.value == b'v2'
+    client.resign(leader)
+    with pytest.raises(ErrElectionNoLeader):
+        client.leader('test-election-api')
+    with pytest.raises(ErrElectionNotLeader):
+        client.proclaim(leader, 'v3')
+    lease.revoke()
+
+
+@pytest.mark.timeout(60)
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_election(client):
+    client.delete_range('test-election/', prefix=True)
+    s1 = client.Session(ttl=10)
+    s2 = client.Session(ttl=10)
+    e1 = client.Election('test-election', session=s1)
+    e2 = client.Election('test-election', session=s2)
+    assert e1.leader() is None
+    assert not e1.is_leader
+    with pytest.raises(ErrElectionNotLeader):
+        e1.proclaim('v')
+
+    seen = []
+    observer = client.Election('test-election').observe()
+
+    def observe():
+        for kv in observer:
+            seen.append(kv.value)
+            if kv.value == b'e2':
+                break
+
+    t = threading.Thread(target=observe)
+    t.setDaemon(True)
+    t.start()
+
+    assert e1.campaign('e1') is e1
+    assert e1.is_leader
+    with pytest.raises(EtcdLockAcquireTimeout):
+        e2.campaign('e2', timeout=0.5)
+    assert client.range('test-election/', prefix=True, count_only=True).count == 1
+
+    e1.proclaim('e1-updated')
+    assert e1.leader().value == b'e1-updated'
+
+    elected = threading.Event()
+
+    def campaign():
+        e2.campaign('e2')
+        elected.set()
+
+    c = threading.Thread(target=campaign)
+    c.setDaemon(True)
+    c.start()
+    time.sleep(0.5)
+    assert not elected.is_set()
+    e1.resign()
+    assert not e1.is_leader
+    assert elected.wait(5)
+    assert e2.is_leader
+    t.join(5)
+    assert seen == [b'e1', b'e1-updated', b'e2']
+
+    s2.close()  # the leadership passes when the session is gone
+    assert e1.leader() is None
+    s1.close()
+
+    # the elections without a session don't share a candidate key
+    with client.Election('test-election') as e3, client.Election('test-election') as e4:
+        e3.campaign('e3')
+        with pytest.raises(EtcdLockAcquireTimeout):
+            e4.campaign('e4', timeout=0.5)
+        assert e3.is_leader and not e4.is_leader
+    assert e1.leader() is None
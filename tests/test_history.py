@@ -0,0 +1,98 @@
+import pytest
+
+from etcd3 import Client
+from etcd3.errors import ErrCompacted
+from etcd3.stateful.history import HistoryCache, RevisionView
+from tests.docker_cli import docker_run_etcd_main
+from .envs import protocol, host
+from .etcd_go_cli import NO_ETCD_SERVICE
+
+
+@pytest.fixture(scope='module')
+def client():
+    """
+    init Etcd3Client, close its connection-pool when teardown
+    """
+    _, p, _ = docker_run_etcd_main()
+    c = Client(host, p, protocol)
+    yield c
+    c.close()
+
+
+class FakeKV(object):
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+
+
+class FakeResponse(object):
+    def __init__(self, kvs):
+        self.kvs = kvs
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.calls = 0
+        self.compacted = 0
+
+    def range(self, key, revision=None, **kwargs):
+        self.calls += 1
+        if revision <= self.compacted:
+            raise ErrCompacted('etcdserver: mvcc: required revision has been compacted', 11, 400)
+        return FakeResponse([FakeKV(key.encode(), b'x' * 100)])
+
+
+def test_history_cache():
+    c = FakeClient()
+    cache = HistoryCache(max_entries=3, max_bytes=10000)
+    view = RevisionView(c, 5, cache)
+    assert view.get('/a') == b'x' * 100
+    assert view.get('/a') == b'x' * 100
+    assert view.range('/a') is view.range(u'/a')
+    assert c.calls == 1
+    RevisionView(c, 6, cache).get('/a')
+    view.range('/a', keys_only=True)
+    assert c.calls == 3
+    assert len(cache) == 3 and cache.bytes > 0
+
+    RevisionView(c, 7, cache).get('/b')  # evicts the least recently used
+    assert len(cache) == 3
+    assert cache.stats()['evictions'] == 1
+
+    cache.compacted(7)
+    assert len(cache) == 1
+    assert cache.bytes == cache.stats()['bytes'] > 0
+
+    c.compacted = 8
+    cache.put(cache.make_key(8, {'key': '/c'}), FakeResponse([]))
+    with pytest.raises(ErrCompacted):
+        RevisionView(c, 8, cache).get('/d')
+    assert len(cache) == 0 and cache.bytes == 0
+
+    with pytest.raises(TypeError):
+        view.range('/a', revision=1)
+    with pytest.raises(ValueError):
+        RevisionView(c, 0, cache)
+    stats = cache.stats()
+    assert stats['hits'] == 3
+    assert 0 < stats['hit_rate'] < 1
+
+
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_client_at(client):
+    client.delete_range('/history/', prefix=True)
+    rev = client.put('/history/a', '1').header.revision
+    client.put('/history/a', '2')
+    view = client.at(rev)
+    assert view.get('/history/a') == b'1'
+    assert view.get_prefix('/history/')[0].value == b'1'
+    hits = client.history_cache.stats()['hits']
+    assert view.get('/history/a') == b'1'
+    assert client.history_cache.stats()['hits'] == hits + 1
+    assert client.at(rev + 1).get('/history/a') == b'2'
+
+    client.compact(rev + 1)
+    assert all(k[0] >= rev + 1 for k in client.history_cache._entries)
+    with pytest.raises(ErrCompacted):
+        view.get('/history/a')
+    client.delete_range('/history/', prefix=True)
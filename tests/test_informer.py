@@ -0,0 +1,173 @@
+import base64
+import json
+import time
+
+import pytest
+
+from etcd3 import Client
+from etcd3.errors import Etcd3WatchCanceled
+from etcd3.stateful import informer
+from etcd3.stateful.informer import Informer
+from etcd3.stateful.watch import KeyValue, WatchResponse
+from tests.docker_cli import docker_run_etcd_main
+from .envs import protocol, host
+from .etcd_go_cli import NO_ETCD_SERVICE
+
+
+@pytest.fixture(scope='module')
+def client():
+    """
+    init Etcd3Client, close its connection-pool when teardown
+    """
+    _, p, _ = docker_run_etcd_main()
+    c = Client(host, p, protocol)
+    yield c
+    c.close()
+
+
+def kv(key, value, revision):
+    return KeyValue({'key': base64.b64encode(key).decode(), 'value': base64.b64encode(value).decode(),
+                     'mod_revision': str(revision)})
+
+
+def response(revision, *events):
+    data = {'header': {'revision': str(revision)}, 'events': []}
+    for key, value in events:
+        k = {'key': base64.b64encode(key).decode(), 'mod_revision': str(revision)}
+        if value is None:
+            data['events'].append({'type': 'DELETE', 'kv': k})
+        else:
+            k['value'] = base64.b64encode(value).decode()
+            data['events'].append({'kv': k})
+    return WatchResponse({'result': data})
+
+
+class FakeRangeResponse(object):
+    def __init__(self, kvs, revision):
+        self.kvs = kvs
+        self.header = type('Header', (object,), {'revision': revision})
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.data = {}
+        self.revision = 1
+
+    def range(self, key, prefix=None):
+        kvs = [kv(k, v, r) for k, (v, r) in sorted(self.data.items()) if k.startswith(key)]
+        return FakeRangeResponse(kvs, self.revision)
+
+
+def pod(node):
+    return json.dumps({'node': node}).encode()
+
+
+def test_informer():
+    c = FakeClient()
+    c.data[b'/pods/b'] = (pod('n1'), 1)
+    c.data[b'/pods/a'] = (pod('n2'), 1)
+    inf = Informer(c, '/pods/', decode=json.loads, indexers={'node': lambda key, p: p['node']})
+    changes = []
+    inf.add_handler(on_add=lambda k, p: changes.append(('add', k)),
+                    on_update=lambda k, old, new: changes.append(('update', k, old['node'], new['node'])),
+                    on_delete=lambda k, p: changes.append(('delete', k)))
+    inf.relist()
+    assert inf.synced and inf.revision == 1
+    assert inf.keys() == [b'/pods/a', b'/pods/b']
+    assert changes == [('add', b'/pods/a'), ('add', b'/pods/b')]
+    assert inf.get('/pods/a') == {'node': 'n2'}
+    assert [k for k, _ in inf.by_index('node', 'n1')] == [b'/pods/b']
+
+    del changes[:]
+    inf.on_response(response(2, (b'/pods/c', pod('n1')), (b'/pods/a', pod('n1'))))
+    inf.on_response(response(3, (b'/pods/b', None)))
+    assert changes == [('add', b'/pods/c'), ('update', b'/pods/a', 'n2', 'n1'), ('delete', b'/pods/b')]
+    assert inf.revision == 3
+    assert inf.keys() == [b'/pods/a', b'/pods/c']
+    assert [k for k, _ in inf.by_index('node', 'n1')] == [b'/pods/a', b'/pods/c']
+    assert inf.index_values('node') == ['n1']
+    assert inf.scan('/pods/b', '/pods/d') == [(b'/pods/c', {'node': 'n1'})]
+    assert [k for k, _ in inf.scan_prefix('/pods/a')] == [b'/pods/a']
+    assert '/pods/c' in inf and len(inf) == 2
+
+    # an event not newer than the store is ignored
+    del changes[:]
+    inf.on_response(response(2, (b'/pods/a', pod('n2'))))
+    assert changes == [] and inf.get('/pods/a') == {'node': 'n1'}
+
+    # re-list delivers the differences
+    c.data = {b'/pods/a': (pod('n1'), 2), b'/pods/c': (pod('n3'), 5), b'/pods/d': (pod('n3'), 6)}
+    c.revision = 6
+    inf.relist()
+    assert changes == [('update', b'/pods/c', 'n1', 'n3'), ('add', b'/pods/d')]
+    assert [k for k, _ in inf.by_index('node', 'n3')] == [b'/pods/c', b'/pods/d']
+    assert inf.relists == 2
+
+
+def test_informer_revision():
+    c = FakeClient()
+    inf = Informer(c, '/pods/')
+    inf.relist()
+    # catching up, the header is ahead of the events still pending
+    r = response(3, (b'/pods/a', b'1'))
+    r.header.revision = 9
+    inf.on_response(r)
+    assert inf.revision == 3
+    # a progress notify means nothing is pending before the header
+    inf.on_response(WatchResponse({'result': {'header': {'revision': '9'}}}))
+    assert inf.revision == 9
+    # the response of the watch creation doesn't
+    inf.on_response(WatchResponse({'result': {'header': {'revision': '12'}, 'created': True}}))
+    assert inf.revision == 9
+
+def test_informer_relist_backoff(monkeypatch):
+    cancels = [WatchResponse({'result': {'header': {'revision': '5'}, 'compact_revision': '3'}})]
+    cancels += [WatchResponse({'result': {
+        'header': {'revision': '5'}, 'canceled': True, 'cancel_reason': 'permission denied'}})] * 3
+
+    class FakeWatcher(object):
+        def __init__(self, client, **kwargs):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc_val, exc_tb):
+            pass
+
+        def iter_responses(self):
+            r = cancels.pop(0)
+            if r.canceled:
+                raise Etcd3WatchCanceled(r.cancel_reason, r)
+            yield r
+
+        def stop(self):
+            pass
+
+    waits = []
+    monkeypatch.setattr(informer, 'Watcher', FakeWatcher)
+    inf = Informer(FakeClient(), '/pods/', max_retries=2)
+    monkeypatch.setattr(inf._stopping, 'wait', waits.append)
+    with pytest.raises(Etcd3WatchCanceled):
+        inf.run()
+    # re-listed right away on compaction, then backed off until max_retries
+    assert inf.relists == 4
+    assert waits == [0.2, 0.4]
+
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_informer_with_etcd(client):
+    client.delete_range('/informer/', prefix=True)
+    client.put('/informer/a', 'x')
+    added = []
+    with client.Informer('/informer/', indexers={'value': lambda key, v: v}) as inf:
+        inf.add_handler(on_add=lambda k, v: added.append(k))
+        assert inf.wait_synced(5)
+        client.put('/informer/b', 'x')
+        for _ in range(50):
+            if len(inf) == 2:
+                break
+            time.sleep(0.1)
+        assert inf.keys() == [b'/informer/a', b'/informer/b']
+        assert len(inf.by_index('value', b'x')) == 2
+        assert added == [b'/informer/a', b'/informer/b']
+    client.delete_range('/informer/', prefix=True)
@@ -65,6 +65,18 @@ def test_range_count(client, request):
     assert r.count == 0
 
 
+def test_ls(client, request):
+    clear()
+    request.addfinalizer(clear)
+    for key in ('/a', '/a/b/c', '/a/b/d/e', '/a/c', '/a/d/', '/a/e/f', '/a0'):
+        client.put(key, 'v')
+    assert list(client.ls('/a/')) == [(b'/a/b/', 2), (b'/a/c', 1), (b'/a/d/', 1), (b'/a/e/', 1)]
+    assert list(client.ls('/a/b/')) == [(b'/a/b/c', 1), (b'/a/b/d/', 1)]
+    assert list(client.ls('/')) == [(b'/a', 1), (b'/a/', 5), (b'/a0', 1)]
+    assert list(client.ls('/a/b', delimiter='/d')) == [(b'/a/b/c', 1), (b'/a/b/d', 1)]
+    assert list(client.ls('/x/')) == []
+
+
 def test_put(client, request):
     clear()
     request.addfinalizer(clear)
@@ -0,0 +1,179 @@
+import base64
+import time
+
+import pytest
+
+from etcd3 import Client
+from etcd3.stateful.cache import KVCache
+from etcd3.stateful.watch import KeyValue, WatchResponse
+from tests.docker_cli import docker_run_etcd_main
+from .envs import protocol, host
+from .etcd_go_cli import NO_ETCD_SERVICE
+
+
+@pytest.fixture(scope='module')
+def client():
+    """
+    init Etcd3Client, close its connection-pool when teardown
+    """
+    _, p, _ = docker_run_etcd_main()
+    c = Client(host, p, protocol)
+    yield c
+    c.close()
+
+
+def kv(key, value, revision):
+    return KeyValue({'key': base64.b64encode(key).decode(), 'value': base64.b64encode(value).decode(),
+                     'mod_revision': str(revision)})
+
+
+def response(revision, *events, **kwargs):
+    data = {'header': {'revision': str(revision)}, 'events': []}
+    for key, value in events:
+        k = {'key': base64.b64encode(key).decode(), 'mod_revision': str(revision)}
+        if value is None:
+            data['events'].append({'type': 'DELETE', 'kv': k})
+        else:
+            k['value'] = base64.b64encode(value).decode()
+            data['events'].append({'kv': k})
+    data.update(kwargs)
+    return WatchResponse({'result': data})
+
+
+class FakeRangeResponse(object):
+    def __init__(self, kvs, revision):
+        self.kvs = kvs
+        self.header = type('Header', (object,), {'revision': revision})
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.data = {}
+        self.revision = 1
+        self.calls = []
+
+    def range(self, key, prefix=None, serializable=None):
+        self.calls.append((key, prefix, serializable))
+        if prefix:
+            kvs = [kv(k, v, r) for k, (v, r) in sorted(self.data.items()) if k.startswith(key)]
+        else:
+            kvs = [kv(key, *self.data[key])] if key in self.data else []
+        return FakeRangeResponse(kvs, self.revision)
+
+
+def test_kv_cache():
+    c = FakeClient()
+    cache = KVCache(c, key='/cfg/', prefix=True, maxsize=3)
+    c.data[b'/cfg/a'] = (b'1', 1)
+
+    r = cache.get('/cfg/a')  # the watch is not created yet
+    assert r.value == b'1' and not r.hit
+    assert len(cache) == 0
+
+    cache.on_response(response(1, created=True))
+    assert not cache.get('/cfg/a').hit
+    r = cache.get('/cfg/a')
+    assert r.hit and r.value == b'1' and r.revision == 1
+
+    # negative caching
+    assert cache.get('/cfg/b').kv is None
+    r = cache.get('/cfg/b')
+    assert r.hit and r.kv is None
+    assert len(c.calls) == 3
+
+    # events update the single keys and drop the prefixes
+    assert [x.key for x in cache.get_prefix('/cfg/').kvs] == [b'/cfg/a']
+    assert cache.get_prefix('/cfg/').hit
+    c.data[b'/cfg/b'] = (b'2', 2)
+    c.revision = 2
+    cache.on_response(response(2, (b'/cfg/b', b'2')))
+    r = cache.get('/cfg/b')
+    assert r.hit and r.value == b'2' and r.revision == 2
+    assert not cache.get_prefix('/cfg/').hit
+    cache.on_response(response(3, (b'/cfg/a', None)))
+    r = cache.get('/cfg/a')
+    assert r.hit and r.kv is None and r.revision == 3
+
+    # an event at or below the revision of the entry is already reflected
+    c.data[b'/cfg/c'] = (b'4', 4)
+    c.revision = 4
+    assert cache.get('/cfg/c').value == b'4'
+    cache.on_response(response(4, (b'/cfg/c', b'4')))
+    assert cache.get('/cfg/c').hit
+
+    # a read older than the applied watch revision is not cached
+    cache.invalidate('/cfg/c')
+    cache.on_response(response(5))
+    assert not cache.get('/cfg/c').hit
+    assert not cache.get('/cfg/c').hit
+
+    # bypasses
+    calls = len(c.calls)
+    assert not cache.get('/cfg/b', linearizable=True).hit
+    assert not cache.get('/other').hit
+    assert len(c.calls) == calls + 2
+    assert c.calls[-2][2] is None
+
+    # lru eviction
+    c.revision = 5
+    for k in ('/cfg/x', '/cfg/y', '/cfg/z'):
+        cache.get(k)
+    assert len(cache) == 3
+    assert not cache.get('/cfg/b').hit
+
+    stats = cache.stats()
+    assert stats['evictions'] >= 1
+    assert stats['bypasses'] == 3
+    assert stats['revision'] == 5
+    assert 0 < stats['hit_rate'] < 1
+
+    cache.on_response(response(6, compact_revision=5))
+    assert len(cache) == 0
+
+
+def test_kv_cache_revision():
+    c = FakeClient()
+    cache = KVCache(c, key='/cfg/', prefix=True)
+    cache.on_response(response(3, created=True))
+    assert cache.revision == 3
+    # catching up after a reconnect, the header is ahead of the events still pending
+    cache.on_response(response(9, created=True))
+    assert cache.revision == 3
+    r = response(4, (b'/cfg/a', b'1'))
+    r.header.revision = 9
+    cache.on_response(r)
+    assert cache.revision == 4
+    c.data[b'/cfg/b'] = (b'2', 2)
+    c.revision = 4
+    cache.get('/cfg/b')
+    assert cache.get('/cfg/b').revision == 4
+    # a progress notify means nothing is pending before the header
+    cache.on_response(response(9))
+    assert cache.revision == 9
+
+
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_kv_cache_with_etcd(client):
+    client.delete_range('/cache/', prefix=True)
+    client.put('/cache/a', 'a')
+    with client.KVCache(key='/cache/', prefix=True) as cache:
+        for _ in range(50):
+            if cache.revision is not None:
+                break
+            time.sleep(0.1)
+        assert cache.get('/cache/a').value == b'a'
+        assert cache.get('/cache/a').hit
+        assert cache.get('/cache/missing').kv is None
+        assert cache.get('/cache/missing').hit
+
+        put = client.put('/cache/missing', 'b')
+        for _ in range(50):
+            r = cache.get('/cache/missing')
+            if r.kv is not None:
+                break
+            time.sleep(0.1)
+        assert r.hit and r.value == b'b'
+        assert r.revision >= put.header.revision
+        assert cache.stats()['hits'] >= 3
+    assert cache.revision is None
+    client.delete_range('/cache/', prefix=True)
@@ -0,0 +1,108 @@
+import time
+
+import pytest
+
+from etcd3 import Client
+from etcd3.stateful.keeper import KeepSchedule, keepalive_body, parse_keepalive
+from tests.docker_cli import docker_run_etcd_main
+from .envs import protocol, host
+from .etcd_go_cli import NO_ETCD_SERVICE
+
+
+@pytest.fixture(scope='module')
+def client():
+    """
+    init Etcd3Client, close its connection-pool when teardown
+    """
+    _, p, _ = docker_run_etcd_main()
+    c = Client(host, p, protocol)
+    yield c
+    c.close()
+
+
+def test_keep_schedule():
+    s = KeepSchedule(fraction=0.5, jitter=0.1)
+    s.add(1, 10, now=0)
+    s.add(2, 4, now=0)
+    s.add(3, 20, now=0)
+    assert len(s) == 3 and 2 in s
+    assert 1.8 <= s.next_deadline() <= 2  # the jitter only makes the refresh earlier
+    assert [l.ID for l in s.pop_due(2, 10)] == [2]
+    assert [l.ID for l in s.pop_due(5, 10)] == [1]
+
+    s.remove(3)
+    assert s.next_deadline() is None
+    assert s.pop_due(100, 10) == []
+
+    for ID in range(10, 20):
+        s.add(ID, 2, now=0)
+    popped = set(l.ID for l in s.pop_due(1, 4))
+    assert len(popped) == 4
+    s.remove(min(set(range(10, 20)) - popped))  # removed leases are skipped lazily
+    assert len(s.pop_due(1, 10)) == 5
+
+    lease = s.leases[19]
+    s.schedule(lease, 100, ttl=60)
+    assert lease.ttl == 60
+    s.retry(lease, 100, 0.5)
+    assert s.next_deadline() == 100.5  # the earlier deadline replaces the scheduled one
+    assert [l.ID for l in s.pop_due(200, 10)] == [19]
+
+    with pytest.raises(ValueError):
+        KeepSchedule(fraction=1)
+
+
+def test_keepalive_body():
+    s = KeepSchedule()
+    s.add(1, 10)
+    s.add(20, 100)
+    assert keepalive_body(s.pop_due(time.time() + 100, 10)) == b'{"ID":1}\n{"ID":20}\n'
+    assert parse_keepalive({'result': {'ID': '20', 'TTL': '10'}}) == (20, 10)
+    assert parse_keepalive({'result': {'ID': '20'}}) == (20, 0)
+
+
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_lease_keeper(client):
+    expired = []
+    kept = []
+    keeper = client.LeaseKeeper(fraction=0.25, on_expire=expired.append)
+    leases = [client.lease_grant(2) for _ in range(5)]
+    gone = client.lease_grant(2)
+    with keeper:
+        for r in leases:
+            keeper.add(r.ID, r.TTL, on_keep=kept.append)
+        keeper.add(gone.ID, gone.TTL)
+        client.lease_revoke(ID=gone.ID)
+        time.sleep(3)
+        for r in leases:
+            assert client.lease_time_to_live(r.ID).TTL > 0
+        assert expired == [gone.ID]
+        assert gone.ID not in keeper
+        assert kept and set(kept) == {2}
+        stats = keeper.stats()
+        assert stats['leases'] == 5
+        assert stats['expired'] == 1
+        assert stats['batches'] < stats['refreshed']  # refreshed in batches
+
+        keeper.remove(leases[0].ID)
+        time.sleep(3)
+        assert client.lease_time_to_live(leases[0].ID).TTL == -1
+    for r in leases[1:]:
+        client.lease_revoke(ID=r.ID)
+
+
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_lease_keepalive_by_keeper(client):
+    keeper = client.LeaseKeeper()
+    with keeper:
+        lease = client.Lease(ttl=2)
+        lease.grant()
+        lease.keepalive(keeper=keeper)
+        assert lease.ID in keeper
+        time.sleep(3)
+        assert lease.alive()
+        assert not lease.jammed()
+        lease.cancel_keepalive()
+        assert lease.ID not in keeper
+        assert not lease.keeping
+        lease.revoke()
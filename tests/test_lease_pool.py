@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from etcd3 import Client
+from etcd3.stateful.keeper import LeaseKeeper
+from etcd3.stateful.leasepool import LeasePool
+from tests.docker_cli import docker_run_etcd_main
+from .envs import protocol, host
+from .etcd_go_cli import NO_ETCD_SERVICE
+
+
+@pytest.fixture(scope='module')
+def client():
+    """
+    init Etcd3Client, close its connection-pool when teardown
+    """
+    _, p, _ = docker_run_etcd_main()
+    c = Client(host, p, protocol)
+    yield c
+    c.close()
+
+
+def test_bucket_for():
+    pool = LeasePool(None, buckets=(30, 5, 10, 1), keeper=LeaseKeeper(None))
+    assert pool.buckets == [2, 5, 10, 30]
+    assert pool.bucket_for(1) == 2
+    assert pool.bucket_for(5) == 5
+    assert pool.bucket_for(9) == 5  # never longer than requested
+    assert pool.bucket_for(3600) == 30
+    with pytest.raises(ValueError):
+        LeasePool(None, buckets=(), keeper=LeaseKeeper(None))
+
+
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_lease_pool(client):
+    lost = []
+    client.delete_range('/pool/', prefix=True)
+    with client.LeasePool(buckets=(2, 10), on_lost=lost.append) as pool:
+        for i in range(10):
+            pool.put('/pool/short/%d' % i, 'v', ttl=3)
+        pool.put('/pool/long', 'v', ttl=20)
+        assert pool.stats() == {'keys': 11, 'leases': 2, 'buckets': {2: 10, 10: 1}}
+        short = pool.lease(2)
+        assert pool.lease(4) == short
+        kvs = client.range('/pool/short/', prefix=True).kvs
+        assert len(kvs) == 10 and set(int(kv.lease) for kv in kvs) == {short}
+
+        time.sleep(3)  # kept alive
+        assert client.range('/pool/short/', prefix=True, count_only=True).count == 10
+
+        pool.move('/pool/long', ttl=2)
+        assert client.range('/pool/long').kvs[0].value == b'v'
+        assert int(client.range('/pool/long').kvs[0].lease) == short
+        assert pool.stats()['leases'] == 1  # the empty bucket is revoked
+
+        pool.delete('/pool/short/0')
+        assert '/pool/short/0' not in pool
+        assert len(pool) == 10
+
+        client.lease_revoke(ID=short)
+        time.sleep(1.5)
+        assert len(lost) == 1 and len(lost[0]) == 10
+        assert len(pool) == 0
+
+        pool.put('/pool/short/0', 'v', ttl=2)
+        assert pool.lease(2) != short
+    assert client.range('/pool/', prefix=True, count_only=True).count == 0
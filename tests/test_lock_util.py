@@ -5,6 +5,7 @@ from threading import Thread
 import pytest
 
 from etcd3 import Client, Lock
+from etcd3.stateful.lock import EtcdLockAcquireTimeout
 from .envs import protocol, host, port
 from .etcd_go_cli import NO_ETCD_SERVICE, etcdctl
 
@@ -205,3 +206,51 @@ def test_reentrant_lock(client):
     assert holds['User2'] is None
     assert l1.holders() == 0
     assert l2.holders() == 0
+
+
+@pytest.mark.timeout(60)
+def test_lock_session(client):
+    clear()
+    session = client.shared_session(2)
+    assert client.shared_session(2) is session
+    l1 = client.Lock('lock-session', lock_ttl=2)
+    l2 = client.Lock('lock-session-2', lock_ttl=2)
+    l3 = client.Lock('lock-session', lock_ttl=2)
+    with l1, l2:
+        assert l1.lease is l2.lease is session  # the locks share the lease of the session
+        assert int(client.range(l1.lock_key).kvs[0].lease) == session.ID
+        assert int(client.range(l2.lock_key).kvs[0].lease) == session.ID
+        assert l3.acquire(block=False) is None
+        assert l3.is_taken and not l3.is_acquired
+        with pytest.raises(EtcdLockAcquireTimeout):
+            l3.acquire(timeout=0.5)
+        time.sleep(3)  # kept alive by the keeper of the session
+        assert l1.is_acquired and l2.is_acquired
+    assert not l1.is_acquired
+    assert session.alive()  # released by deleting the lock key
+    assert l3.acquire(timeout=1) is l3
+    l3.release()
+
+    with client.Session(ttl=2) as own:
+        lock = client.Lock('lock-session', session=own)
+        with lock:
+            assert int(client.range(lock.lock_key).kvs[0].lease) == own.ID
+        ID = own.ID
+    assert client.lease_time_to_live(ID).TTL == -1  # revoked when the session is closed
+
+
+@pytest.mark.timeout(60)
+def test_lock_session_lost(client):
+    clear()
+    session = client.shared_session(2)
+    lock = client.Lock('lock-lost', lock_ttl=2, reentrant=Lock.PROCESS)
+    lock.acquire()
+    assert lock.holders() == 1
+    session.revoke()  # the lock is gone with the lease
+    assert not lock.is_acquired
+    assert lock.holders() == 0
+    lock.release()
+    with lock:  # a new lease is granted on the next use
+        assert lock.is_acquired
+        assert int(client.range(lock.lock_key).kvs[0].lease) == session.ID
+    assert lock.holders() == 0
@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+from etcd3 import Client
+from etcd3.stateful.lock import EtcdLockAcquireTimeout, EtcdLockError
+from tests.docker_cli import docker_run_etcd_main
+from .envs import protocol, host
+from .etcd_go_cli import NO_ETCD_SERVICE
+
+
+@pytest.fixture(scope='module')
+def client():
+    """
+    init Etcd3Client, close its connection-pool when teardown
+    """
+    _, p, _ = docker_run_etcd_main()
+    c = Client(host, p, protocol)
+    yield c
+    c.close()
+
+
+@pytest.mark.timeout(60)
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_mutex_fifo(client):
+    client.delete_range('_mutex/', prefix=True)
+    order = []
+    first = client.Mutex('fifo', ttl=5)
+    first.acquire()
+    assert first.is_acquired
+    assert first.owner() == first.key.encode()
+
+    def wait(i):
+        with client.Mutex('fifo', ttl=5):
+            order.append(i)
+            time.sleep(0.1)
+
+    threads = []
+    for i in range(5):
+        t = threading.Thread(target=wait, args=(i,))
+        t.setDaemon(True)
+        t.start()
+        threads.append(t)
+        time.sleep(0.2)  # queue the waiters in order
+    assert first.waiters() == 6
+    assert order == []
+    first.release()
+    assert not first.is_acquired
+    for t in threads:
+        t.join(10)
+    assert order == list(range(5))
+    assert first.waiters() == 0
+
+
+@pytest.mark.timeout(60)
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_mutex_timeout(client):
+    client.delete_range('_mutex/', prefix=True)
+    m1 = client.Mutex('timeout', ttl=5)
+    m2 = client.Mutex('timeout', ttl=5)
+    with m1:
+        with pytest.raises(EtcdLockError):
+            m1.acquire()
+        assert m2.acquire(block=False) is None
+        assert m2.waiters() == 1  # left the queue
+        with pytest.raises(EtcdLockAcquireTimeout):
+            m2.acquire(timeout=0.5)
+        assert m2.waiters() == 1
+        assert m2.key is None and not m2.is_acquired
+    assert m2.acquire(timeout=1) is m2
+    m2.release()
@@ -4,6 +4,8 @@ import time
 import pytest
 
 from etcd3 import AioClient
+from etcd3.errors import ErrElectionNotLeader
+from etcd3.stateful.lock import EtcdLockAcquireTimeout
 from ..docker_cli import docker_rm_etcd_ssl, docker_run_etcd_ssl, CERT_PATH, KEY_PATH, CA_PATH, NO_DOCKER_SERVICE, \
     docker_run_etcd_main
 from ..envs import protocol, host
@@ -53,6 +55,18 @@ async def test_async_request_and_model(aio_client):
     etcdctl('del test_key')
 
 
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+@pytest.mark.asyncio
+async def test_async_ls(aio_client):
+    for key in ('/ls/a/b', '/ls/a/c', '/ls/d'):
+        await aio_client.put(key, 'v')
+    children = []
+    async for child in aio_client.ls('/ls/'):
+        children.append(child)
+    assert children == [(b'/ls/a/', 2), (b'/ls/d', 1)]
+    await aio_client.delete_range('/ls/', prefix=True)
+
+
 @pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
 @pytest.mark.asyncio
 async def test_async_stream(aio_client):
@@ -82,3 +96,179 @@ async def test_aio_client_ssl():
     aio_client = AioClient(host, port, cert=(CERT_PATH, KEY_PATH), verify=CA_PATH)
     assert await aio_client.call_rpc('/kv/range', {'key': 'test_key'})
     docker_rm_etcd_ssl()
+
+
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+@pytest.mark.asyncio
+async def test_aio_lease_keeper(aio_client):
+    expired = []
+    leases = [await aio_client.lease_grant(2) for _ in range(3)]
+    gone = await aio_client.lease_grant(2)
+    async with aio_client.LeaseKeeper(fraction=0.25, on_expire=expired.append) as keeper:
+        for r in leases:
+            keeper.add(r.ID, r.TTL)
+        keeper.add(gone.ID, gone.TTL)
+        await aio_client.lease_revoke(ID=gone.ID)
+        await asyncio.sleep(3)
+        for r in leases:
+            assert (await aio_client.lease_time_to_live(r.ID)).TTL > 0
+        assert expired == [gone.ID]
+        assert keeper.stats()['leases'] == 3
+
+        session = aio_client.Session(ttl=2, keeper=keeper)
+        ID = await session.lease_id()
+        assert ID in keeper
+        await asyncio.sleep(3)
+        assert (await aio_client.lease_time_to_live(ID)).TTL > 0
+        await session.close()
+        assert ID not in keeper
+    for r in leases:
+        await aio_client.lease_revoke(ID=r.ID)
+
+
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+@pytest.mark.asyncio
+async def test_aio_lease(aio_client):
+    kept = []
+    canceled = []
+
+    async def keep_cb():
+        kept.append(time.time())
+
+    lease = aio_client.Lease(ttl=2)
+    await lease.grant()
+    assert await lease.alive()
+    lease.keepalive(keep_cb=keep_cb, cancel_cb=lambda: canceled.append(True))
+    with pytest.raises(RuntimeError):
+        lease.keepalive()
+    await asyncio.sleep(3)
+    assert lease.keeping and not lease.jammed()
+    assert len(kept) >= 3
+    assert await lease.ttl() > 0
+    await lease.cancel_keepalive()
+    assert canceled == [True]
+    assert not lease.keeping
+    await lease.revoke()
+    assert not await lease.alive()
+
+    async with aio_client.Lease(ttl=2) as lease:
+        assert lease.keeping
+        await aio_client.lease_revoke(ID=lease.ID)  # the keepalive task stops when the lease is gone
+        await asyncio.sleep(1)
+        assert not lease.keeping
+        assert await lease.keepalive_once() <= 0
+
+
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+@pytest.mark.asyncio
+async def test_aio_lock(aio_client):
+    await aio_client.delete_range('_mutex/', prefix=True)
+    order = []
+
+    async def hold(i):
+        async with aio_client.Lock('aio-lock', lock_ttl=5):
+            order.append(i)
+            await asyncio.sleep(0.05)
+
+    first = aio_client.Lock('aio-lock', lock_ttl=5)
+    await first.acquire()
+    assert await first.is_acquired()
+    tasks = []
+    for i in range(20):
+        tasks.append(asyncio.ensure_future(hold(i)))
+        await asyncio.sleep(0.05)  # queue the waiters in order
+    assert await first.waiters() == 21
+    await first.release()
+    await asyncio.wait_for(asyncio.gather(*tasks), 30)
+    assert order == list(range(20))  # FIFO
+    assert aio_client.shared_session(5).keeping  # one lease for all the locks
+
+    async with aio_client.Lock('aio-lock', lock_ttl=5) as lock:
+        other = aio_client.Lock('aio-lock', lock_ttl=5)
+        assert await other.acquire(block=False) is None
+        with pytest.raises(EtcdLockAcquireTimeout):
+            await other.acquire(timeout=0.3)
+        task = asyncio.ensure_future(other.acquire())
+        await asyncio.sleep(0.3)
+        task.cancel()  # the canceled waiter leaves the queue
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert await lock.waiters() == 1
+    assert await other.waiters() == 0
+
+
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+@pytest.mark.asyncio
+async def test_aio_rwlock(aio_client):
+    await aio_client.delete_range('_rwlock/', prefix=True)
+    events = []
+
+    async def read(i, hold):
+        async with aio_client.RWLock('aio-rw', ttl=5).read_lock:
+            events.append(('read', i))
+            await asyncio.sleep(hold)
+
+    async def write():
+        async with aio_client.RWLock('aio-rw', ttl=5, timeout=10).write_lock:
+            events.append(('write', 0))
+            await asyncio.sleep(0.2)
+
+    tasks = [asyncio.ensure_future(read(i, 0.5)) for i in range(10)]
+    await asyncio.sleep(0.2)
+    assert len(events) == 10  # the readers hold the lock concurrently
+    tasks.append(asyncio.ensure_future(write()))
+    await asyncio.sleep(0.1)
+    tasks.append(asyncio.ensure_future(read(10, 0)))
+    await asyncio.wait_for(asyncio.gather(*tasks), 30)
+    assert events[10:] == [('write', 0), ('read', 10)]
+    rw = aio_client.RWLock('aio-rw')
+    assert await rw.readers() == await rw.writers() == 0
+
+
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+@pytest.mark.asyncio
+async def test_aio_election(aio_client):
+    await aio_client.delete_range('aio-election/', prefix=True)
+    s1 = aio_client.Session(ttl=10)
+    s2 = aio_client.Session(ttl=10)
+    e1 = aio_client.Election('aio-election', session=s1)
+    e2 = aio_client.Election('aio-election', session=s2)
+    assert await e1.leader() is None
+    with pytest.raises(ErrElectionNotLeader):
+        await e1.proclaim('v')
+    seen = []
+
+    async def observe():
+        async with aio_client.Election('aio-election').observe() as observer:
+            async for kv in observer:
+                seen.append(kv.value)
+                if kv.value == b'e2':
+                    return
+
+    observing = asyncio.ensure_future(observe())
+    assert await e1.campaign('e1') is e1
+    assert await e1.is_leader()
+    with pytest.raises(EtcdLockAcquireTimeout):
+        await e2.campaign('e2', timeout=0.5)
+    assert (await aio_client.range('aio-election/', prefix=True, count_only=True)).count == 1
+    await e1.proclaim('e1-updated')
+    assert (await e1.leader()).value == b'e1-updated'
+    campaign = asyncio.ensure_future(e2.campaign('e2'))
+    await asyncio.sleep(0.5)
+    assert not campaign.done()
+    await e1.resign()
+    await asyncio.wait_for(campaign, 5)
+    assert await e2.is_leader()
+    await asyncio.wait_for(observing, 5)
+    assert seen == [b'e1', b'e1-updated', b'e2']
+    await s2.close()
+    await s1.close()
+    assert await e1.leader() is None
+
+    # the elections without a session don't share a candidate key
+    async with aio_client.Election('aio-election') as e3, aio_client.Election('aio-election') as e4:
+        await e3.campaign('e3')
+        with pytest.raises(EtcdLockAcquireTimeout):
+            await e4.campaign('e4', timeout=0.5)
+        assert await e3.is_leader() and not await e4.is_leader()
+    assert await e1.leader() is None
@@ -0,0 +1,87 @@
+import os
+import time
+
+import pytest
+
+from etcd3 import Client
+from etcd3.stateful.replica import Replica
+from tests.docker_cli import docker_run_etcd_main
+from .envs import protocol, host
+from .etcd_go_cli import NO_ETCD_SERVICE
+from .test_informer import FakeClient, response
+
+
+@pytest.fixture(scope='module')
+def client():
+    """
+    init Etcd3Client, close its connection-pool when teardown
+    """
+    _, p, _ = docker_run_etcd_main()
+    c = Client(host, p, protocol)
+    yield c
+    c.close()
+
+
+def test_replica(tmpdir):
+    path = str(tmpdir.join('replica.db'))
+    c = FakeClient()
+    c.data = {b'/r/a': (b'1', 1), b'/r/b': (b'2', 1)}
+    replica = Replica(c, '/r/', path)
+    assert replica.load() is None
+    replica.relist()
+    replica.on_response(response(2, (b'/r/c', b'3'), (b'/r/a', None)))
+    replica.close()
+
+    c.data = {}  # the restarted replica should not list
+    added = []
+    replica = Replica(c, '/r/', path)
+    replica.add_handler(on_add=lambda k, v: added.append(k))
+    assert replica.load() == 2
+    assert replica.synced
+    assert replica.scan() == [(b'/r/b', b'2'), (b'/r/c', b'3')]
+    assert replica.get_kv('/r/c').mod_revision == 2
+    assert added == [b'/r/b', b'/r/c']
+    replica.close()
+
+    # a file of another prefix is not loaded
+    replica = Replica(c, '/other/', path)
+    assert replica.load() is None
+    replica.close()
+
+
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_replica_with_etcd(client, tmpdir):
+    path = str(tmpdir.join('replica.db'))
+    client.delete_range('/replica/', prefix=True)
+    client.put('/replica/a', '1')
+    with client.Replica('/replica/', path) as replica:
+        assert replica.wait_synced(5)
+        assert replica.relists == 1
+        client.put('/replica/b', '2')
+        for _ in range(50):
+            if len(replica) == 2:
+                break
+            time.sleep(0.1)
+    assert os.path.exists(path)
+
+    client.put('/replica/c', '3')
+    client.delete_range('/replica/a')
+    with client.Replica('/replica/', path) as replica:
+        for _ in range(50):
+            if replica.keys() == [b'/replica/b', b'/replica/c']:
+                break
+            time.sleep(0.1)
+        assert replica.keys() == [b'/replica/b', b'/replica/c']
+        assert replica.relists == 0  # resumed from the file
+
+    # re-list if the stored revision has been compacted
+    client.put('/replica/d', '4')
+    client.compact(client.put('/replica/d', '5').header.revision)
+    with client.Replica('/replica/', path) as replica:
+        for _ in range(50):
+            if replica.get('/replica/d') == b'5':
+                break
+            time.sleep(0.1)
+        assert replica.get('/replica/d') == b'5'
+        assert replica.relists == 1
+    client.delete_range('/replica/', prefix=True)
@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+
+from etcd3 import Client
+from tests.docker_cli import docker_run_etcd_main
+from .envs import protocol, host
+from .etcd_go_cli import NO_ETCD_SERVICE
+
+
+@pytest.fixture(scope='module')
+def client():
+    """
+    init Etcd3Client, close its connection-pool when teardown
+    """
+    _, p, _ = docker_run_etcd_main()
+    c = Client(host, p, protocol)
+    yield c
+    c.close()
+
+
+def run(fn):
+    t = threading.Thread(target=fn)
+    t.setDaemon(True)
+    t.start()
+    return t
+
+
+@pytest.mark.timeout(60)
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_rwlock(client):
+    client.delete_range('_rwlock/', prefix=True)
+    r1 = client.RWLock('rw', ttl=5)
+    r2 = client.RWLock('rw', ttl=5)
+    assert r1.acquire_read(block=False) is r1.read_lock
+    assert r2.acquire_read(block=False) is r2.read_lock  # the readers share the lock
+    assert r1.readers() == 2
+
+    w = client.RWLock('rw', ttl=5)
+    assert w.acquire_write(block=False) is None
+    assert w.writers() == 0
+
+    events = []
+
+    def write():
+        with w.write_lock:
+            events.append('write')
+            time.sleep(0.3)
+        events.append('write released')
+
+    def read():
+        with client.RWLock('rw', ttl=5).read_lock:
+            events.append('read')
+
+    tw = run(write)
+    time.sleep(0.3)
+    tr = run(read)  # queued after the writer
+    time.sleep(0.3)
+    assert events == []  # the writer waits for the earlier readers, the later reader for the writer
+    assert r1.writers() == 1 and r1.readers() == 3
+    r1.release_read()
+    time.sleep(0.3)
+    assert events == []
+    r2.release_read()
+    tw.join(10)
+    tr.join(10)
+    assert events == ['write', 'write released', 'read']
+    assert r1.readers() == r1.writers() == 0
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from etcd3 import Client
+from etcd3.stateful.lock import EtcdLockAcquireTimeout
+from tests.docker_cli import docker_run_etcd_main
+from .envs import protocol, host
+from .etcd_go_cli import NO_ETCD_SERVICE
+
+
+@pytest.fixture(scope='module')
+def client():
+    """
+    init Etcd3Client, close its connection-pool when teardown
+    """
+    _, p, _ = docker_run_etcd_main()
+    c = Client(host, p, protocol)
+    yield c
+    c.close()
+
+
+@pytest.mark.timeout(60)
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_semaphore_limit(client):
+    client.delete_range('_semaphore/', prefix=True)
+    holders = [client.Semaphore('limit', 2, ttl=5) for _ in range(2)]
+    for s in holders:
+        assert s.acquire(block=False) is s
+        assert s.is_acquired
+    assert holders[0].holders() == [s.key.encode() for s in holders]
+    assert holders[0].owner() == holders[0].key.encode()
+    third = client.Semaphore('limit', 2, ttl=5)
+    assert third.acquire(block=False) is None
+    with pytest.raises(EtcdLockAcquireTimeout):
+        third.acquire(timeout=0.5)
+    assert third.waiters() == 2
+    holders[1].release()  # any holder admits the first waiter
+    assert third.acquire(timeout=5) is third
+    assert third.is_acquired
+    third.release()
+    holders[0].release()
+    assert third.waiters() == 0
+
+    with pytest.raises(ValueError):
+        client.Semaphore('limit', 0)
+
+
+@pytest.mark.timeout(60)
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_semaphore_fifo(client):
+    client.delete_range('_semaphore/', prefix=True)
+    holders = [client.Semaphore('fifo', 2, ttl=5) for _ in range(2)]
+    for s in holders:
+        s.acquire()
+    order = []
+    running = []
+    lock = threading.Lock()
+
+    def wait(i):
+        with client.Semaphore('fifo', 2, ttl=5):
+            with lock:
+                order.append(i)
+                running.append(i)
+                assert len(running) <= 2
+            time.sleep(0.2)
+            with lock:
+                running.remove(i)
+
+    threads = []
+    for i in range(5):
+        t = threading.Thread(target=wait, args=(i,))
+        t.setDaemon(True)
+        t.start()
+        threads.append(t)
+        time.sleep(0.2)  # queue the waiters in order
+    assert holders[0].waiters() == 7
+    assert order == []
+    holders[0].release()
+    time.sleep(0.5)
+    holders[1].release()
+    for t in threads:
+        t.join(10)
+    assert order == list(range(5))
+    assert holders[0].waiters() == 0
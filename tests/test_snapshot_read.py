@@ -0,0 +1,67 @@
+import pytest
+
+from etcd3 import Client
+from etcd3.errors import ErrCompacted
+from etcd3.stateful.snapshot import snapshot_read
+from tests.docker_cli import docker_run_etcd_main
+from .envs import protocol, host
+from .etcd_go_cli import NO_ETCD_SERVICE
+
+
+@pytest.fixture(scope='module')
+def client():
+    """
+    init Etcd3Client, close its connection-pool when teardown
+    """
+    _, p, _ = docker_run_etcd_main()
+    c = Client(host, p, protocol)
+    yield c
+    c.close()
+
+
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_snapshot_read(client):
+    client.delete_range('/snap/', prefix=True)
+    for i in range(25):
+        client.put('/snap/a/%02d' % i, str(i))
+    client.put('/snap/b/x', 'x')
+    client.put('/snap/c', 'c')
+    snap = client.snapshot_read(['/snap/a/', {'key': '/snap/b/', 'prefix': True}, {'key': '/snap/c'},
+                                 {'key': '/snap/missing'}], page_size=10)
+    assert len(snap) == 4
+    assert [kv.key for kv in snap[0]] == [('/snap/a/%02d' % i).encode() for i in range(25)]
+    assert [kv.value for kv in snap[1]] == [b'x']
+    assert snap[2][0].value == b'c'
+    assert snap[3] == []
+    assert snap.revision == client.range('/snap/c').header.revision
+
+    client.put('/snap/c', 'c2')
+    snap2 = client.snapshot_read(['/snap/c', '/snap/b/'])
+    assert snap2.revision > snap.revision
+    assert snap2[0][0].value == b'c2'
+    client.delete_range('/snap/', prefix=True)
+
+
+def test_snapshot_read_retry_on_compaction():
+    class FakeHeader(object):
+        revision = 10
+
+    class FakeResponse(object):
+        header = FakeHeader()
+        kvs = []
+        more = False
+
+    class FakeClient(object):
+        calls = []
+
+        def range(self, revision=None, **kwargs):
+            self.calls.append(revision)
+            if revision is not None and len(self.calls) == 2:
+                raise ErrCompacted('etcdserver: mvcc: required revision has been compacted', 11, 400)
+            return FakeResponse()
+
+    c = FakeClient()
+    snap = snapshot_read(c, ['/a/', '/b/'])
+    assert snap.revision == 10
+    assert c.calls == [None, 10, None, 10]
+    assert snapshot_read(c, []).results == []
@@ -0,0 +1,109 @@
+import threading
+import time
+
+import pytest
+import six
+
+from etcd3 import Client, CallbackExecutor, Overflow
+from tests.docker_cli import docker_run_etcd_main
+from .envs import protocol, host
+from .etcd_go_cli import etcdctl, NO_ETCD_SERVICE
+
+
+@pytest.fixture(scope='module')
+def client():
+    """
+    init Etcd3Client, close its connection-pool when teardown
+    """
+    _, p, _ = docker_run_etcd_main()
+    c = Client(host, p, protocol)
+    yield c
+    c.close()
+
+
+class FakeEvent(object):
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+
+
+def test_executor_keeps_order_per_key():
+    got = {}
+    lock = threading.Lock()
+
+    def cb(e):
+        with lock:
+            got.setdefault(e.key, []).append(e.value)
+
+    with CallbackExecutor(workers=4, maxsize=10) as executor:
+        for i in range(100):
+            for key in (b'foo', b'bar', b'fizz'):
+                executor.submit(FakeEvent(key, i), [cb])
+    assert got[b'foo'] == list(range(100))
+    assert got[b'bar'] == list(range(100))
+    assert got[b'fizz'] == list(range(100))
+    stats = executor.stats()
+    assert stats['submitted'] == stats['completed'] == 300
+    assert stats['callback_latency']['count'] == 300
+    assert stats['max_queue_depth'] <= 4 * 10
+
+
+def test_executor_overflow():
+    gate = threading.Event()
+    got = []
+
+    def cb(e):
+        gate.wait()
+        got.append(e.value)
+
+    executor = CallbackExecutor(workers=1, maxsize=2, overflow=Overflow.DROP_OLDEST)
+    executor.submit(FakeEvent(b'foo', 0), [cb])  # taken by the worker, blocked on the gate
+    time.sleep(0.2)
+    for i in range(1, 6):
+        executor.submit(FakeEvent(b'foo', i), [cb])
+    gate.set()
+    executor.shutdown()
+    assert got == [0, 4, 5]
+    assert executor.stats()['dropped'] == 3
+
+    gate.clear()
+    got = []
+    executor = CallbackExecutor(workers=1, maxsize=2, overflow=Overflow.COALESCE)
+    executor.submit(FakeEvent(b'foo', 0), [cb])
+    time.sleep(0.2)
+    executor.submit(FakeEvent(b'foo', 1), [cb])
+    executor.submit(FakeEvent(b'bar', 2), [cb])
+    for i in range(3, 6):
+        executor.submit(FakeEvent(b'foo', i), [cb])
+    gate.set()
+    executor.shutdown()
+    assert got == [0, 5, 2]
+    assert executor.stats()['coalesced'] == 3
+
+
+def test_executor_callback_error():
+    def cb(e):
+        raise ValueError(e.value)
+
+    with CallbackExecutor(workers=1) as executor:
+        executor.submit(FakeEvent(b'foo', 0), [cb, cb])
+    assert executor.stats()['errors'] == 2
+
+
+@pytest.mark.timeout(60)
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_watcher_with_executor(client):
+    executor = CallbackExecutor(workers=2)
+    w = client.Watcher(all=True, executor=executor)
+    threads = set()
+    values = []
+    w.onEvent('foo', lambda e: (threads.add(threading.current_thread().name), values.append(e.value)))
+    w.runDaemon()
+    time.sleep(0.2)
+    for i in range(10):
+        etcdctl('put foo %s' % i)
+    time.sleep(1)
+    w.stop()
+    executor.shutdown()
+    assert values == [six.b(str(i)) for i in range(10)]
+    assert all(t.startswith('etcd3-callback-') for t in threads)
@@ -0,0 +1,108 @@
+import base64
+import functools
+import multiprocessing
+import os
+import signal
+import time
+
+import pytest
+
+from etcd3 import Client, ProcessDispatcher
+from etcd3.stateful.watch import Event
+from tests.docker_cli import docker_run_etcd_main
+from .envs import protocol, host
+from .etcd_go_cli import etcdctl, NO_ETCD_SERVICE
+
+
+@pytest.fixture(scope='module')
+def client():
+    """
+    init Etcd3Client, close its connection-pool when teardown
+    """
+    _, p, _ = docker_run_etcd_main()
+    c = Client(host, p, protocol)
+    yield c
+    c.close()
+
+
+def record(queue, event):
+    queue.put((os.getpid(), event.key, event.value))
+
+
+def fail(event):
+    raise ValueError(event.key)
+
+
+def make_event(key, value):
+    return Event({'kv': {'key': base64.b64encode(key).decode(), 'value': base64.b64encode(value).decode()}})
+
+
+def drain(queue, n):
+    got = []
+    while len(got) < n:
+        got.append(queue.get(timeout=10))
+    return got
+
+
+@pytest.mark.timeout(60)
+def test_process_dispatcher_order():
+    queue = multiprocessing.Queue()
+    with ProcessDispatcher(functools.partial(record, queue), processes=2, batch_size=10) as dispatcher:
+        for i in range(200):
+            dispatcher(make_event(('key%d' % (i % 5)).encode(), str(i).encode()))
+        assert dispatcher.join(10)
+    got = drain(queue, 200)
+    per_key = {}
+    pids = {}
+    for pid, key, value in got:
+        per_key.setdefault(key, []).append(int(value))
+        pids.setdefault(key, set()).add(pid)
+    for i in range(5):
+        key = ('key%d' % i).encode()
+        assert per_key[key] == list(range(i, 200, 5))
+        assert len(pids[key]) == 1
+    stats = dispatcher.stats()
+    assert stats['dispatched'] == stats['acked'] == 200
+    assert stats['pending'] == 0
+
+
+@pytest.mark.timeout(60)
+def test_process_dispatcher_restart():
+    queue = multiprocessing.Queue()
+    dispatcher = ProcessDispatcher(functools.partial(record, queue), processes=1, batch_size=5, batch_ms=1000)
+    dispatcher.start()
+    os.kill(dispatcher._workers[0].process.pid, signal.SIGKILL)
+    for i in range(20):
+        dispatcher(make_event(b'foo', str(i).encode()))
+    assert dispatcher.join(10)
+    dispatcher.shutdown()
+    values = [int(v) for _, _, v in drain(queue, 20)]
+    assert values == list(range(20))
+    assert dispatcher.stats()['restarts'] >= 1
+
+
+@pytest.mark.timeout(60)
+def test_process_dispatcher_errors():
+    with ProcessDispatcher(fail, processes=1) as dispatcher:
+        dispatcher(make_event(b'foo', b'1'))
+        dispatcher(make_event(b'bar', b'1'))
+        assert dispatcher.join(10)
+    assert dispatcher.stats()['errors'] == 2
+
+
+@pytest.mark.timeout(60)
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_watcher_with_process_dispatcher(client):
+    queue = multiprocessing.Queue()
+    dispatcher = ProcessDispatcher(functools.partial(record, queue), processes=2)
+    w = client.Watcher(key='fanout', prefix=True)
+    w.onEvent(dispatcher)
+    w.runDaemon()
+    time.sleep(0.2)
+    for i in range(10):
+        etcdctl('put fanout%s %s' % (i % 2, i))
+    got = drain(queue, 10)
+    w.stop()
+    dispatcher.shutdown()
+    assert sorted(int(v) for _, _, v in got) == list(range(10))
+    assert len(set(pid for pid, _, _ in got)) <= 2
@@ -0,0 +1,87 @@
+import json
+import time
+
+import pytest
+import six
+
+from etcd3 import Client, CallbackExecutor
+from etcd3.utils import JSONFramer
+from tests.docker_cli import docker_run_etcd_main
+from .envs import protocol, host
+from .etcd_go_cli import etcdctl, NO_ETCD_SERVICE
+
+
+@pytest.fixture(scope='module')
+def client():
+    """
+    init Etcd3Client, close its connection-pool when teardown
+    """
+    _, p, _ = docker_run_etcd_main()
+    c = Client(host, p, protocol)
+    yield c
+    c.close()
+
+
+def test_json_framer():
+    framer = JSONFramer()
+    assert framer.feed(b'{"a": 1}{"b"') == [b'{"a": 1}']
+    assert framer.feed(b': "}\\""}\n{') == [b'{"b": "}\\""}']
+    assert framer.feed(b'"c":{"d":2}}') == [b'{"c":{"d":2}}']
+    assert len(framer) == 0
+
+    objs = [{'i': i, 's': '{}\\"' * i, 'o': {'l': [i]}} for i in range(100)]
+    data = b''.join(json.dumps(o).encode('utf-8') for o in objs)
+    framer = JSONFramer()
+    frames = []
+    for i in range(0, len(data), 7):
+        frames.extend(framer.feed(data[i:i + 7]))
+    assert [json.loads(f.decode('utf-8')) for f in frames] == objs
+
+    with pytest.raises(ValueError):
+        JSONFramer().feed(b'{}}')
+
+
+@pytest.mark.timeout(60)
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_watch_reactor(client):
+    reactor = client.WatchReactor(executor=CallbackExecutor(workers=2))
+    got = {}
+    watchers = []
+    for i in range(20):
+        w = client.Watcher(key='reactor%d' % i)
+        w.onEvent(lambda e: got.setdefault(e.key, []).append(e.value))
+        reactor.add(w)
+        watchers.append(w)
+    assert len(reactor.watchers) == 20
+    reactor.runDaemon()
+    time.sleep(0.2)
+    for i in range(20):
+        etcdctl('put reactor%d %d' % (i, i))
+    time.sleep(1)
+    assert len(got) == 20
+    assert got[b'reactor3'] == [b'3']
+
+    watchers[3].stop()
+    reactor.remove(watchers[4])
+    time.sleep(0.2)
+    assert len(reactor.watchers) == 18
+    etcdctl('put reactor3 x')
+    etcdctl('put reactor4 x')
+    etcdctl('put reactor5 x')
+    time.sleep(1)
+    assert got[b'reactor3'] == [b'3']
+    assert got[b'reactor4'] == [b'4']
+    assert got[b'reactor5'] == [b'5', b'x']
+
+    # re-created on the reactor thread without blocking, continues from the last revision
+    reactor.rewatch(watchers[6])
+    time.sleep(0.2)
+    etcdctl('put reactor6 x')
+    time.sleep(1)
+    assert got[b'reactor6'] == [b'6', b'x']
+
+    reactor.close()
+    assert not reactor.running
+    assert not reactor.watchers
+    assert not any(w.watching for w in watchers)
+    assert six.b('reactor0') in got
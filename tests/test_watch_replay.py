@@ -0,0 +1,98 @@
+import base64
+import time
+
+import pytest
+
+from etcd3 import Client, EventType
+from etcd3.stateful.replay import ReplayBuffer
+from etcd3.stateful.watch import Watcher, WatchResponse
+from tests.docker_cli import docker_run_etcd_main
+from .envs import protocol, host
+from .etcd_go_cli import etcdctl, NO_ETCD_SERVICE
+
+
+@pytest.fixture(scope='module')
+def client():
+    """
+    init Etcd3Client, close its connection-pool when teardown
+    """
+    _, p, _ = docker_run_etcd_main()
+    c = Client(host, p, protocol)
+    yield c
+    c.close()
+
+
+def response(revision, *events, **kwargs):
+    data = {'header': {'revision': str(revision)}, 'events': []}
+    for key, value in events:
+        kv = {'key': base64.b64encode(key).decode(), 'mod_revision': str(revision)}
+        if value is None:
+            data['events'].append({'type': 'DELETE', 'kv': kv})
+        else:
+            kv['value'] = base64.b64encode(value).decode()
+            data['events'].append({'kv': kv})
+    data.update(kwargs)
+    return WatchResponse({'result': data})
+
+
+def test_replay_buffer():
+    buf = ReplayBuffer(None, key='/cfg', prefix=True, maxlen=3)
+    assert not buf.covers(1)
+    buf.on_response(response(10, created=True))
+    assert buf.floor == 10
+    for rev in range(11, 15):
+        buf.on_response(response(rev, (b'/cfg/a', str(rev).encode())))
+    assert buf.floor == 11  # 11 is evicted
+    assert not buf.covers(11)
+    assert buf.covers(12)
+
+    got = []
+    sub = buf.subscribe(lambda e: got.append(e.mod_revision), start_revision=13)
+    assert got == [13, 14]
+    buf.on_response(response(15, (b'/cfg/a', b'15'), (b'/cfg/b', None)))
+    assert got == [13, 14, 15, 15]
+
+    live = []
+    buf.subscribe(lambda e: live.append(e.key), filter=EventType.DELETE)
+    future = []
+    buf.subscribe(lambda e: future.append(e.mod_revision), start_revision=17)
+    buf.on_response(response(16, (b'/cfg/c', None)))
+    buf.on_response(response(17, (b'/cfg/c', b'17')))
+    assert live == [b'/cfg/c']
+    assert future == [17]
+
+    sub.stop()
+    buf.on_response(response(18, (b'/cfg/a', b'18')))
+    assert got[-1] == 17
+
+    buf.on_response(response(30, compact_revision='25'))
+    assert buf.floor == 24
+    assert buf.stats()['size'] == 0
+    assert buf.stats()['hits'] == 2
+
+
+@pytest.mark.timeout(60)
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_replay_buffer_subscribe(client):
+    buf = client.ReplayBuffer(key='replay', prefix=True)
+    buf.runDaemon()
+    time.sleep(0.2)
+    for i in range(5):
+        etcdctl('put replay%s %s' % (i, i))
+    time.sleep(0.5)
+    start = buf.stats()['revision'] - 2
+
+    got = []
+    sub = buf.subscribe(lambda e: got.append(e.value), start_revision=start)
+    etcdctl('put replay5 5')
+    time.sleep(0.5)
+    assert got == [b'2', b'3', b'4', b'5']
+    sub.stop()
+
+    old = []
+    w = buf.subscribe(lambda e: old.append(e.value), start_revision=buf.floor - 1)
+    assert isinstance(w, Watcher)
+    time.sleep(0.5)
+    w.stop()
+    buf.stop()
+    assert buf.stats()['fallbacks'] == 1
@@ -4,7 +4,9 @@ import time
 import pytest
 
 from etcd3 import Client, EventType
-from etcd3.errors import Etcd3WatchCanceled
+from etcd3.errors import Etcd3WatchCanceled, Etcd3WatchCompacted
+from etcd3.stateful.planner import regex_literal_prefix
+from etcd3.stateful.watch import EventBatch, Watcher, WatchResponse, _Coalescer
 from tests.docker_cli import docker_run_etcd_main
 from .envs import protocol, host
 from .etcd_go_cli import etcdctl, NO_ETCD_SERVICE
@@ -297,3 +299,225 @@ def test_watcher_rewatch_on_compaction(client):
             # etcdctl("compaction --physical %s" % client.hash().header.revision)
             times -= 1
             w._kill_response_stream()  # trigger a re-watch
+
+
+class FakeEvent(object):
+    def __init__(self, key, value, type=EventType.PUT, mod_revision=None):
+        self.key = key
+        self.value = value
+        self.type = type
+        self.mod_revision = mod_revision
+
+
+def test_watch_response():
+    r = WatchResponse({'result': {
+        'header': {'cluster_id': '1', 'member_id': '2', 'revision': '10', 'raft_term': '3'},
+        'events': [
+            {'type': 'DELETE', 'kv': {'key': 'Zm9v', 'mod_revision': '10'}},
+            {'kv': {'key': 'YmFy', 'value': 'MQ==', 'create_revision': '9', 'mod_revision': '10', 'version': '1'},
+             'prev_kv': {'key': 'YmFy', 'value': 'MA=='}},
+        ]}})
+    assert r.header.revision == 10 and r.header.raft_term == 3
+    assert 'created' not in r and not r.created and not r.canceled
+    delete, put = r.events
+    assert delete.type == EventType.DELETE and delete.key == b'foo' and delete.value is None
+    assert delete.prev_kv is None and delete.header is r.header
+    assert put.type == EventType.PUT and (put.key, put.value, put.version) == (b'bar', b'1', 1)
+    assert put.prev_kv.value == b'0'
+    assert put['mod_revision'] == 10 and 'value' in put and 'lease' not in put
+    assert set(put) == {'key', 'create_revision', 'mod_revision', 'version', 'value', 'type', 'prev_kv'}
+    assert not hasattr(put, '__dict__')
+
+    r = WatchResponse({'result': {'header': {'revision': '5'}, 'created': True, 'watch_id': '1'}})
+    assert 'created' in r and r.created and r.watch_id == 1 and r.events == []
+
+
+def test_watcher_dispatch_batch():
+    w = Watcher(client=None, all=True)
+    events = []
+    batches = []
+    deletes = []
+    w.onEvent(lambda e: events.append(e))
+    w.onBatch(lambda b: batches.append(b))
+    w.onBatch(lambda b: deletes.append(b), filter=EventType.DELETE)
+    assert len(w.batch_callbacks) == 2
+
+    batch = EventBatch([FakeEvent(b'foo', b'1'), FakeEvent(b'bar', b'2')], header=None)
+    w.dispatch_batch(batch)
+    assert len(events) == 2
+    assert batches == [batch]
+    assert deletes == []
+
+    w.dispatch_batch(EventBatch([FakeEvent(b'foo', None, EventType.DELETE), FakeEvent(b'bar', b'3')]))
+    assert len(events) == 4
+    assert len(batches) == 2
+    assert len(deletes) == 1 and len(deletes[0]) == 1
+
+    w.unBatch(batches.append)
+    w.clear_callbacks()
+    assert not w.batch_callbacks
+
+
+def test_watcher_coalescer():
+    delivered = []
+    coalescer = _Coalescer(0.2, delivered.append)
+    coalescer.add(EventBatch([FakeEvent(b'foo', b'1'), FakeEvent(b'bar', b'1')]))
+    coalescer.add(EventBatch([FakeEvent(b'foo', b'2')]))
+    coalescer.add(EventBatch([FakeEvent(b'foo', b'3')]))
+    assert not delivered
+    time.sleep(0.5)
+    assert len(delivered) == 1
+    assert [(e.key, e.value) for e in delivered[0]] == [(b'bar', b'1'), (b'foo', b'3')]
+
+    coalescer.add(EventBatch([FakeEvent(b'foo', b'4')]))
+    coalescer.flush()
+    assert len(delivered) == 2
+    assert delivered[1][0].value == b'4'
+
+
+@pytest.mark.timeout(60)
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_watcher_on_batch(client):
+    w = client.Watcher(key='batch', prefix=True, coalesce_ms=300)
+    batches = []
+    w.onBatch(lambda b: batches.append(b))
+    w.runDaemon()
+    time.sleep(0.2)
+    for i in range(10):
+        etcdctl('put batch%s %s' % (i % 2, i))
+    time.sleep(1)
+    w.stop()
+    values = [(e.key, e.value) for b in batches for e in b]
+    assert (b'batch0', b'8') in values
+    assert (b'batch1', b'9') in values
+    assert len(values) < 10
+    assert batches[-1].revision
+
+
+def test_regex_literal_prefix():
+    assert regex_literal_prefix('/config/(db|cache)/.*') == b'/config/'
+    assert regex_literal_prefix(b'^/svc/dns') == b'/svc/dns'
+    assert regex_literal_prefix('/svc/db') == b'/svc/db'
+    assert regex_literal_prefix('(?i)/svc/db') == b''
+    assert regex_literal_prefix('/svc/(') == b''
+
+
+def test_watcher_plan():
+    w = Watcher(client=None, key='/svc', prefix=True, prev_kv=True, pushdown=True)
+    assert w.plan()['prefix'] is True  # no callbacks, no pushdown
+
+    w.onEvent(EventType.DELETE, lambda e: None, prev_kv=False)
+    plan = w.plan()
+    assert plan['no_put'] and not plan['no_delete']
+    assert plan['prev_kv'] is None
+
+    w.clear_callbacks()
+    w.onEvent(r'/svc/db/\d+', lambda e: None)
+    w.onEvent('^/svc/dns', lambda e: None)
+    plan = w.plan()
+    assert (plan['key'], plan['range_end'], plan['prefix']) == (b'/svc/d', b'/svc/e', None)
+    assert plan['prev_kv'] is True
+    assert not plan['no_put'] and not plan['no_delete']
+
+    w.onEvent(lambda e: True, lambda e: None)
+    assert w.plan()['key'] == '/svc'
+    w.unEvent(cb=None, filter=w.callbacks[-1][0])
+    assert w.plan()['key'] == b'/svc/d'
+
+    w = Watcher(client=None, key='/a', range_end='/b', pushdown=True)
+    w.onEvent('/b/.*', lambda e: None)  # no overlap
+    assert w.plan()['key'] == '/a'
+    w = Watcher(client=None, all=True, pushdown=True)
+    w.onBatch(lambda b: None, filter='(?i)/svc')
+    assert w.plan()['all'] is True
+
+
+@pytest.mark.timeout(60)
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_watcher_pushdown(client):
+    w = client.Watcher(all=True, pushdown=True)
+    events = []
+    w.onEvent('pushdown/a.*', lambda e: events.append(e))
+    w.runDaemon()
+    time.sleep(0.2)
+    assert w._plan['key'] == b'pushdown/a'
+    etcdctl('put pushdown/a1 1')
+    etcdctl('put pushdown/b1 1')
+    w.onEvent(EventType.DELETE, lambda e: events.append(e))
+    time.sleep(0.5)
+    assert w._plan['all'] is True
+    etcdctl('del pushdown/b1')
+    time.sleep(0.5)
+    w.stop()
+    assert [(e.type, e.key) for e in events] == [(EventType.PUT, b'pushdown/a1'), (EventType.DELETE, b'pushdown/b1')]
+
+
+@pytest.mark.timeout(60)
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_changes(client):
+    start = client.put('changes/0', '0').header.revision
+    for i in range(1, 6):
+        client.put('changes/%s' % (i % 2), str(i))
+    head = client.put('changes_other', 'x').header.revision
+    values = [e.value for b in client.changes('changes/', start) for e in b]
+    assert values == [b'0', b'1', b'2', b'3', b'4', b'5']
+    values = [e.value for b in client.changes('changes/', start + 1, start + 2) for e in b]
+    assert values == [b'1', b'2']
+    assert list(client.changes('changes/', head + 1)) == []
+
+    changes = client.changes('changes/', start)  # the head revision is read here
+    client.delete_range('changes/1')
+    values = [e.value for b in changes for e in b]
+    assert values == [b'0', b'1', b'2', b'3', b'4', b'5']
+    # the rest is replayed by watching all keys as soon as the prefix stream is idle
+    events = [e for b in client.changes('changes/', start, idle_timeout=0.01) for e in b]
+    assert [e.value for e in events[:-1]] == [b'0', b'1', b'2', b'3', b'4', b'5']
+    assert (events[-1].type, events[-1].key) == (EventType.DELETE, b'changes/1')
+    head = client.put('changes_other', 'y').header.revision
+
+    client.compact(head)
+    with pytest.raises(Etcd3WatchCompacted) as e:
+        list(client.changes('changes/', start))
+    assert e.value.compact_revision == head
+
+
+def test_watch_metrics():
+    from etcd3.stateful.metrics import WatchMetrics
+    m = WatchMetrics()
+    header = {'revision': '10'}
+    m.on_response(WatchResponse({'result': {'header': header, 'created': True}}), 50)
+    assert m.progress_notifies == 0 and m.revision_lag is None
+    m.on_probe(12, time.time() - 1)
+    r = WatchResponse({'result': {'header': {'revision': '11'}, 'events': [
+        {'kv': {'key': 'YQ==', 'mod_revision': '11'}}]}})
+    m.on_response(r, 100)
+    m.on_events(r.events)
+    assert m.revision_lag == 1
+    assert m.delivery_lag is None
+    m.on_response(WatchResponse({'result': {'header': {'revision': '12'}}}), 50)  # progress notify
+    assert m.progress_notifies == 1
+    assert m.revision_lag == 0
+    assert m.delivery_lag >= 1
+    stats = m.snapshot()
+    assert stats['events']['total'] == 1
+    assert stats['bytes']['total'] == 200
+    assert stats['undelivered_probe_age'] is None
+
+
+@pytest.mark.timeout(60)
+@pytest.mark.skipif(NO_ETCD_SERVICE, reason="no etcd service available")
+def test_watcher_stats(client):
+    w = client.Watcher(key='stats', prefix=True, probe_interval=0.1)
+    w.onEvent(lambda e: None)
+    w.runDaemon()
+    time.sleep(0.3)
+    for i in range(5):
+        etcdctl('put stats%s %s' % (i, i))
+    time.sleep(0.5)
+    stats = w.stats()
+    w.stop()
+    assert stats['events']['total'] == 5
+    assert stats['bytes']['total'] > 0
+    assert stats['callback_latency']['count'] == 5
+    assert stats['delivered_revision'] == stats['revision']
+    assert stats['delivery_lag'] is not None